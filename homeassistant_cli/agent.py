@@ -0,0 +1,421 @@
+"""Agent running hass-cli commands on behalf of other hass-cli processes.
+
+The agent keeps the HTTP and WebSocket connections open, the states of
+the server mirrored and the registries in memory. A hass-cli started
+while the agent runs hands its command line over a Unix socket and only
+writes out what comes back, thus skips connecting and authenticating.
+
+Both sides send one JSON object per line. The caller sends the command,
+the agent answers with `accepted` or `busy`, then sends `out` and `err`
+text and finally the `exit` code. Anything the agent does not take is
+run by the caller itself.
+"""
+import copy
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import homeassistant_cli.cache as cache
+import homeassistant_cli.const as const
+from homeassistant_cli.exceptions import HomeAssistantCliError
+import homeassistant_cli.mirror as mirror
+import homeassistant_cli.records as records
+
+_LOGGING = logging.getLogger(__name__)
+
+# commands needing the terminal, running until stopped or reading files
+# stay local
+LOCAL_COMMANDS = {
+    ('agent',),
+    ('batch',),
+    ('completion',),
+    ('event', 'watch'),
+    ('template',),
+}
+# commands opening an editor unless given --json
+EDITING_COMMANDS = {('event', 'fire'), ('state', 'edit')}
+
+
+def socket_path() -> str:
+    """Return the path of the socket of the agent."""
+    return os.environ.get('HASS_AGENT_SOCKET') or os.path.join(
+        cache.cache_dir(), 'agent.sock'
+    )
+
+
+def available() -> bool:
+    """Return True if commands may be handed to an agent."""
+    if os.environ.get('HASS_NO_AGENT') or os.environ.get(
+        '_HASS_CLI_COMPLETE'
+    ):
+        return False
+    return os.path.exists(socket_path())
+
+
+def _connect(path: str, timeout: float) -> socket.socket:
+    """Return a connection to the agent listening at path.
+
+    Connecting and receiving time out after timeout seconds.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _send(sock: socket.socket, message: Dict[str, Any]) -> None:
+    """Send a message."""
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _messages(sock: socket.socket) -> Iterator[Dict[str, Any]]:
+    """Yield the messages received until the other side hangs up."""
+    with sock.makefile('rb') as file:
+        for line in file:
+            yield json.loads(line)
+
+
+def _forwardable(words: List[str]) -> bool:
+    """Return True if the command may run in the agent."""
+    if not words:
+        # help or version of hass-cli itself
+        return False
+    if LOCAL_COMMANDS.intersection({tuple(words[:1]), tuple(words[:2])}):
+        return False
+    if tuple(words[:2]) in EDITING_COMMANDS and not any(
+        word == '--json' or word.startswith('--json=') for word in words
+    ):
+        return False
+    return '--watch' not in words
+
+
+def _relative_path(arg: str) -> bool:
+    """Return True if arg, or the value of an option, is a relative path.
+
+    The agent runs in a directory of its own, where such paths would
+    name other files or none.
+    """
+    value = arg.partition('=')[2] if arg.startswith('--') else arg
+    if not value or value == '-' or os.path.isabs(value):
+        return False
+    return value.startswith(('./', '../')) or os.path.exists(value)
+
+
+def forward(args: List[str], words: List[str]) -> Optional[int]:
+    """Run a command line in the agent and return its exit code.
+
+    `words` is the command line following the global options. Return
+    None if the agent did not take the command, the caller runs it then.
+    An agent not answering in time, like a stopped one, does not take it.
+    """
+    if not _forwardable(words) or any(_relative_path(a) for a in args):
+        return None
+    try:
+        sock = _connect(socket_path(), const.AGENT_ANSWER_TIMEOUT)
+    except OSError:
+        return None
+
+    accepted = False
+    stdout, stderr = sys.stdout, sys.stderr
+    with sock:
+        try:
+            _send(
+                sock,
+                {
+                    'command': 'run',
+                    'args': args,
+                    'env': {
+                        name: value
+                        for name, value in os.environ.items()
+                        if name.startswith(const.AGENT_ENV_PREFIXES)
+                    },
+                    # only read when asked for, it may be a terminal
+                    'stdin': sys.stdin.read() if '-' in words else '',
+                },
+            )
+            for message in _messages(sock):
+                if not accepted:
+                    if not message.get('accepted'):
+                        return None
+                    accepted = True
+                    # the command itself may take as long as it takes
+                    sock.settimeout(None)
+                elif 'out' in message:
+                    stdout.write(message['out'])
+                    stdout.flush()
+                elif 'err' in message:
+                    stderr.write(message['err'])
+                    stderr.flush()
+                elif 'exit' in message:
+                    return int(message['exit'])
+        except (OSError, ValueError) as ex:
+            _LOGGING.debug("Agent connection failed: %s", ex)
+
+    if not accepted:
+        return None
+    # the command may have had effects, running it again is not safe
+    stderr.write("Lost the connection to the hass-cli agent\n")
+    return 1
+
+
+def request(command: str) -> Dict[str, Any]:
+    """Send a command other than running a command line to the agent."""
+    try:
+        with _connect(socket_path(), const.AGENT_ANSWER_TIMEOUT) as sock:
+            _send(sock, {'command': command})
+            return next(_messages(sock))
+    except (OSError, ValueError, StopIteration):
+        raise HomeAssistantCliError("No hass-cli agent is running")
+
+
+def _same_user(sock: socket.socket) -> bool:
+    """Return True if the peer runs as our user, where that can be told.
+
+    Elsewhere the permissions of the socket keep other users out.
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return True
+    creds = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')
+    )
+    _, uid, _ = struct.unpack('3i', creds)
+    return bool(uid == os.getuid())
+
+
+class _Sender:  # pylint: disable=too-few-public-methods
+    """Send messages of one kind, from any thread."""
+
+    def __init__(
+        self, sock: socket.socket, lock: threading.Lock, kind: str
+    ) -> None:
+        """Initialize the sender."""
+        self._sock = sock
+        self._lock = lock
+        self._kind = kind
+
+    def __call__(self, text: str) -> None:
+        """Send the text."""
+        with self._lock:
+            _send(self._sock, {self._kind: text})
+
+
+class _LiveStates:
+    """States of a server kept up to date by the agent.
+
+    The states are kept as records, see records.State, and handed out
+    as dictionaries.
+    """
+
+    def __init__(self) -> None:
+        """Initialize without states."""
+        self._lock = threading.Lock()
+        self._mirror = mirror.StateMirror(project=records.State.from_dict)
+        self._ready = False
+
+    def update(self, events: List[Dict[str, Any]]) -> None:
+        """Apply updates of the states."""
+        with self._lock:
+            for event in events:
+                self._mirror.apply(event)
+
+    def ready(self) -> None:
+        """Start handing out the states, all of them are known now."""
+        with self._lock:
+            self._ready = True
+
+    def reset(self) -> None:
+        """Forget the states, they are no longer kept up to date."""
+        with self._lock:
+            self._mirror = mirror.StateMirror(project=records.State.from_dict)
+            self._ready = False
+
+    def snapshot(self) -> Optional[List[Dict[str, Any]]]:
+        """Return the states, None until they are all known."""
+        with self._lock:
+            if not self._ready:
+                return None
+            return [state.as_dict() for state in self._mirror.states.values()]
+
+
+class Agent:
+    """Serve the commands of other hass-cli processes over a Unix socket.
+
+    One command runs at a time. Callers finding the agent busy run their
+    command themselves.
+    """
+
+    def __init__(self, ctx: Any, path: Optional[str] = None) -> None:
+        """Initialize the agent for the settings of the context."""
+        from homeassistant_cli.config import Shared
+
+        self._ctx = ctx
+        self.path = path or socket_path()
+        # the states come from the mirror
+        self.shared = Shared(remember=const.SHARED_DATA)
+        self.served = 0
+        self._busy = threading.Lock()
+        self._stop = threading.Event()
+        self._states = _LiveStates()
+        self._follower = None  # type: Optional[Any]
+        self._follower_lock = threading.Lock()
+
+    def serve(self, ready: Optional[Callable[[], Any]] = None) -> None:
+        """Serve until stopped."""
+        server = self._listen()
+        threading.Thread(
+            target=self._follow_states, name='hass-cli-mirror', daemon=True
+        ).start()
+        if ready:
+            ready()
+        try:
+            server.settimeout(0.5)
+            while not self._stop.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                threading.Thread(
+                    target=self._handle, args=(conn,), daemon=True
+                ).start()
+        finally:
+            server.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.shared.close()
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self._stop.set()
+        self._close_follower()
+
+    def status(self) -> Dict[str, Any]:
+        """Return what the agent is up to."""
+        states = self._states.snapshot()
+        return {
+            'pid': os.getpid(),
+            'socket': self.path,
+            'served': self.served,
+            'busy': self._busy.locked(),
+            'states': None if states is None else len(states),
+        }
+
+    def _listen(self) -> socket.socket:
+        """Return the listening socket."""
+        if os.path.exists(self.path):
+            try:
+                _connect(self.path, const.AGENT_ANSWER_TIMEOUT).close()
+            except OSError:
+                # left behind by an agent that died
+                os.remove(self.path)
+            else:
+                raise HomeAssistantCliError(
+                    f"A hass-cli agent is already running at {self.path}"
+                )
+
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.path)
+        finally:
+            os.umask(umask)
+        server.listen()
+        _LOGGING.info("Agent listening at %s", self.path)
+        return server
+
+    def _handle(self, conn: socket.socket) -> None:
+        """Serve one connection."""
+        with conn:
+            if not _same_user(conn):
+                _LOGGING.warning("Refused a connection of another user")
+                return
+            try:
+                message = next(_messages(conn), None)
+                if message is None:
+                    return
+                command = message.get('command')
+                if command == 'run':
+                    self._run(conn, message)
+                elif command == 'status':
+                    _send(conn, self.status())
+                elif command == 'stop':
+                    _send(conn, {'stopping': True})
+                    self.stop()
+                else:
+                    _send(conn, {'error': f"Unknown command: {command}"})
+            except (OSError, ValueError) as ex:
+                _LOGGING.debug("Caller went away: %s", ex)
+
+    def _run(self, conn: socket.socket, message: Dict[str, Any]) -> None:
+        """Run a command line for the caller, unless busy."""
+        from homeassistant_cli import runner
+
+        if not self._busy.acquire(blocking=False):
+            _send(conn, {'busy': True})
+            return
+        try:
+            _send(conn, {'accepted': True})
+            lock = threading.Lock()
+            code = runner.run_command(
+                message.get('args') or [],
+                _Sender(conn, lock, 'out'),
+                _Sender(conn, lock, 'err'),
+                env=message.get('env') or {},
+                stdin=message.get('stdin') or '',
+                shared=self.shared,
+            )
+            self.served += 1
+            _send(conn, {'exit': code})
+        finally:
+            self._busy.release()
+
+    def _follow_states(self) -> None:
+        """Keep the states of the server mirrored until stopped."""
+        import homeassistant_cli.remote as api
+
+        # the subscription blocks its connection, it gets one of its own
+        ctx = copy.copy(self._ctx)
+        ctx.session = ctx.wsclient = ctx.shared = None
+
+        delay = 1.0
+        while not self._stop.is_set():
+            with self._follower_lock:
+                # threaded, thus stop() can close it from another thread
+                self._follower = ctx.wsclient = api.WebSocketClient(
+                    ctx, threaded=True
+                )
+            try:
+                self.shared.mirrors[self.shared.key(ctx)] = self._states
+                api.subscribe_states(
+                    ctx, self._states.update, self._states.ready
+                )
+                delay = 1.0
+            # pylint: disable=broad-except
+            # resolving the server may exit when none is found
+            except (Exception, SystemExit) as ex:
+                if not self._stop.is_set():
+                    _LOGGING.warning("Could not follow the states: %s", ex)
+            finally:
+                self._states.reset()
+                self._close_follower()
+            self._stop.wait(delay)
+            delay = min(delay * 2, const.AGENT_MAX_RECONNECT_DELAY)
+
+    def _close_follower(self) -> None:
+        """Close the connection following the states."""
+        with self._follower_lock:
+            if self._follower is not None:
+                self._follower.close()
+                self._follower = None
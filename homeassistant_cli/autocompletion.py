@@ -1,12 +1,27 @@
-"""Details for the auto-completion."""
-import os
-from typing import Any, Dict, List, Tuple  # NOQA
+"""Details for the auto-completion.
 
-from requests.exceptions import HTTPError
+Completions needing data from the server are served from an index kept
+on disk, thus pressing TAB does not wait for the network.
+"""
+import bisect
+import logging
+import os
+import subprocess
+import sys
+import time
+import types
+from typing import Any, Callable, Dict, List, Tuple, cast  # NOQA
 
 from homeassistant_cli import const, hassconst
-from homeassistant_cli.config import Configuration, resolve_server
-import homeassistant_cli.remote as api
+import homeassistant_cli.cache as cache
+from homeassistant_cli.config import Configuration
+from homeassistant_cli.exceptions import HomeAssistantCliError
+
+_LOGGING = logging.getLogger(__name__)
+
+_INDEX_PREFIX = 'completion_'
+# Seconds before another background refresh of the same index may start
+_REFRESH_TIMEOUT = 60
 
 
 def _init_ctx(ctx: Configuration) -> None:
@@ -38,86 +53,161 @@ def _init_ctx(ctx: Configuration) -> None:
     if not hasattr(ctx, 'cert'):
         ctx.cert = None
 
+    if not hasattr(ctx, 'state_source'):
+        ctx.state_source = os.environ.get(
+            'HASS_STATE_SOURCE', const.STATE_SOURCE_AUTO
+        )
+
+    # resolved lazily, only if the server needs to be contacted
     if not hasattr(ctx, 'resolved_server'):
-        ctx.resolved_server = resolve_server(ctx)
+        ctx.resolved_server = None
 
 
-def services(
-    ctx: Configuration, args: List, incomplete: str
-) -> List[Tuple[str, str]]:
-    """Services."""
-    _init_ctx(ctx)
-    try:
-        response = api.get_services(ctx)
-    except HTTPError:
-        response = []
+def _service_pairs(ctx: Configuration) -> List[Tuple[str, str]]:
+    """Return (service, description) pairs."""
+    import homeassistant_cli.remote as api
 
     completions = []  # type: List[Tuple[str, str]]
-    if response:
-        for domain in response:
-            domain_name = domain['domain']
-            servicesdict = domain['services']
-
-            for service in servicesdict:
-                completions.append(
-                    (
-                        "{}.{}".format(domain_name, service),
-                        servicesdict[service]['description'],
-                    )
+    for domain in api.get_services(ctx):
+        domain_name = domain['domain']
+        servicesdict = domain['services']
+
+        for service in servicesdict:
+            completions.append(
+                (
+                    "{}.{}".format(domain_name, service),
+                    servicesdict[service].get('description', ''),
                 )
+            )
+    return completions
 
-        completions.sort()
 
-        return [c for c in completions if incomplete in c[0]]
+def _entity_pairs(ctx: Configuration) -> List[Tuple[str, str]]:
+    """Return (entity id, friendly name) pairs."""
+    import homeassistant_cli.remote as api
 
-    return completions
+    return [
+        (entity['entity_id'], entity['attributes'].get('friendly_name', ''))
+        for entity in api.iter_states(
+            ctx, ['entity_id', 'attributes.friendly_name']
+        )
+    ]
 
 
-def entities(
-    ctx: Configuration, args: List, incomplete: str
-) -> List[Tuple[str, str]]:
-    """Entities."""
-    _init_ctx(ctx)
-    try:
-        response = api.get_states(ctx)
-    except HTTPError:
-        response = []
+def _event_pairs(ctx: Configuration) -> List[Tuple[str, str]]:
+    """Return (event, '') pairs."""
+    import homeassistant_cli.remote as api
 
-    completions = []  # type List[Tuple[str, str]]
+    return [(event['event'], '') for event in api.get_events(ctx)]
 
-    if response:
-        for entity in response:
-            friendly_name = entity['attributes'].get('friendly_name', '')
-            completions.append((entity['entity_id'], friendly_name))
 
-        completions.sort()
+def _area_pairs(ctx: Configuration) -> List[Tuple[str, str]]:
+    """Return (area name, area id) pairs."""
+    import homeassistant_cli.remote as api
 
-        return [c for c in completions if incomplete in c[0]]
+    return [(area['name'], area['area_id']) for area in api.get_areas(ctx)]
 
-    return completions
 
+_FETCHERS = {
+    'services': _service_pairs,
+    'entities': _entity_pairs,
+    'events': _event_pairs,
+    'areas': _area_pairs,
+}  # type: Dict[str, Callable[[Configuration], List[Tuple[str, str]]]]
 
-def events(
+
+def refresh_index(ctx: Configuration, kind: str) -> Dict[str, List[str]]:
+    """Fetch the completions for kind and store them as index on disk.
+
+    The index holds the sorted ids and their descriptions as two lists.
+    """
+    from requests.exceptions import HTTPError
+
+    try:
+        pairs = sorted(_FETCHERS[kind](ctx))
+    except (HTTPError, HomeAssistantCliError) as ex:
+        _LOGGING.debug("Could not refresh %s completions: %s", kind, ex)
+        return {'ids': [], 'names': []}
+
+    index = {
+        'ids': [pair[0] for pair in pairs],
+        'names': [pair[1] for pair in pairs],
+    }
+    cache.write(ctx.server, ctx, _INDEX_PREFIX + kind, index)
+    return index
+
+
+def _refresh_in_background(ctx: Configuration, kind: str) -> None:
+    """Refresh the index for kind from a detached process."""
+    if not cache.claim(
+        ctx.server, ctx, _INDEX_PREFIX + kind, _REFRESH_TIMEOUT
+    ):
+        return
+
+    subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, '-m', __name__, kind],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _index(ctx: Configuration, kind: str) -> Dict[str, List[str]]:
+    """Return the completion index for kind.
+
+    Only builds the index from the server when there is none yet. A
+    stale index is used as is while a fresh one is fetched in the
+    background.
+    """
+    entry = cache.read(
+        ctx.server, ctx, _INDEX_PREFIX + kind, ttl=float('inf')
+    )
+    if entry is None:
+        return refresh_index(ctx, kind)
+
+    if time.time() - entry['fetched'] > const.CACHE_TTL['completion']:
+        _refresh_in_background(ctx, kind)
+
+    return cast(Dict[str, List[str]], entry['data'])
+
+
+def _lookup(
+    index: Dict[str, List[str]], incomplete: str
+) -> List[Tuple[str, str]]:
+    """Return the entries of the index starting with incomplete."""
+    ids = index['ids']
+    start = bisect.bisect_left(ids, incomplete)
+    end = bisect.bisect_left(ids, incomplete + '\U0010ffff', start)
+
+    return list(zip(ids[start:end], index['names'][start:end]))
+
+
+def services(
     ctx: Configuration, args: List, incomplete: str
 ) -> List[Tuple[str, str]]:
-    """Events."""
+    """Services."""
     _init_ctx(ctx)
-    try:
-        response = api.get_events(ctx)
-    except HTTPError:
-        response = {}
 
-    completions = []
+    return _lookup(_index(ctx, 'services'), incomplete)
 
-    if response:
-        for entity in response:
-            completions.append((entity['event'], ''))  # type: ignore
 
-        completions.sort()
+def entities(
+    ctx: Configuration, args: List, incomplete: str
+) -> List[Tuple[str, str]]:
+    """Entities."""
+    _init_ctx(ctx)
 
-        return [c for c in completions if incomplete in c[0]]
+    return _lookup(_index(ctx, 'entities'), incomplete)
 
-    return completions
+
+def events(
+    ctx: Configuration, args: List, incomplete: str
+) -> List[Tuple[str, str]]:
+    """Events."""
+    _init_ctx(ctx)
+
+    return _lookup(_index(ctx, 'events'), incomplete)
 
 
 def table_formats(
@@ -205,16 +295,15 @@ def areas(
 ) -> List[Tuple[str, str]]:
     """Areas."""
     _init_ctx(ctx)
-    allareas = api.get_areas(ctx)
-
-    completions = []  # type List[Tuple[str, str]]
 
-    if allareas:
-        for area in allareas:
-            completions.append((_quoteifneeded(area['name']), area['area_id']))
-
-        completions.sort()
+    return [
+        (_quoteifneeded(name), area_id)
+        for name, area_id in _lookup(_index(ctx, 'areas'), incomplete)
+    ]
 
-        return [c for c in completions if incomplete in c[0]]
 
-    return completions
+if __name__ == '__main__':
+    # Refresh an index in the background, see _refresh_in_background
+    _CTX = cast(Configuration, types.SimpleNamespace())
+    _init_ctx(_CTX)
+    refresh_index(_CTX, sys.argv[1])
@@ -0,0 +1,193 @@
+"""On-disk cache of registry and state snapshots for hass-cli.
+
+Entries are kept per server and credentials, each with its own time to
+live. Commands changing data on the server invalidate the entries they
+affect, so the cache never outlives a change made through hass-cli.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar, cast
+
+import homeassistant_cli.const as const
+
+_LOGGING = logging.getLogger(__name__)
+
+T = TypeVar('T')  # pylint: disable=invalid-name
+
+
+def cache_dir() -> str:
+    """Return the directory holding the cache."""
+    if os.environ.get('HASS_CACHE_DIR'):
+        return os.environ['HASS_CACHE_DIR']
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(
+        os.path.join('~', '.cache')
+    )
+    return os.path.join(base, 'hass-cli')
+
+
+def _fingerprint(server: str, ctx: Any) -> str:
+    """Return the key for a server and the credentials used with it."""
+    secret = getattr(ctx, 'token', None) or getattr(ctx, 'password', None)
+    key = "{}\0{}".format(server, secret or '')
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _path(server: str, ctx: Any, name: str) -> str:
+    """Return the path of a cache entry."""
+    return os.path.join(
+        cache_dir(), _fingerprint(server, ctx), f'{name}.json'
+    )
+
+
+def enabled(ctx: Any) -> bool:
+    """Return True if the cache should be used for the context."""
+    return bool(
+        getattr(ctx, 'cache', False) or getattr(ctx, 'refresh', False)
+    )
+
+
+def read(
+    server: str, ctx: Any, name: str, ttl: Optional[float] = None
+) -> Optional[Dict[str, Any]]:
+    """Return the entry for name if present and younger than its TTL."""
+    if ttl is None:
+        ttl = const.CACHE_TTL[name]
+    try:
+        with open(_path(server, ctx, name)) as file:
+            entry = json.load(file)  # type: Dict[str, Any]
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get('fetched', 0) > ttl:
+        _LOGGING.debug("Cached %s expired", name)
+        return None
+
+    return entry
+
+
+def write(server: str, ctx: Any, name: str, data: Any) -> None:
+    """Store data for name."""
+    path = _path(server, ctx, name)
+    content = json.dumps(data, sort_keys=True)
+    entry = {
+        'fetched': time.time(),
+        'etag': hashlib.sha1(content.encode('utf-8')).hexdigest(),
+        'data': data,
+    }
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as file:
+            json.dump(entry, file)
+        os.replace(tmp, path)
+    except OSError as ex:
+        _LOGGING.debug("Could not write cache %s: %s", path, ex)
+
+
+def remove(server: str, ctx: Any, *names: str) -> None:
+    """Remove the entries for names."""
+    for name in names:
+        try:
+            os.remove(_path(server, ctx, name))
+        except OSError:
+            pass
+
+
+def claim(server: str, ctx: Any, name: str, ttl: float) -> bool:
+    """Return True if the caller may refresh name, at most once per ttl.
+
+    Used to avoid several processes refreshing the same entry at once.
+    """
+    lock = _path(server, ctx, name) + '.lock'
+    try:
+        if time.time() - os.path.getmtime(lock) < ttl:
+            return False
+        os.remove(lock)
+    except OSError:
+        pass
+
+    try:
+        os.makedirs(os.path.dirname(lock), mode=0o700, exist_ok=True)
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except OSError:
+        return False
+    return True
+
+
+def cached(ctx: Any, name: str, fetch: Callable[[], T]) -> T:
+    """Return data for name from the cache or else by calling fetch.
+
+    With `--refresh` the data is always fetched and the entry rewritten.
+    Processes running many commands also keep the data in memory.
+    """
+    shared = getattr(ctx, 'shared', None)
+    if shared is not None:
+        return cast(
+            T, shared.data(name, ctx, lambda: _on_disk(ctx, name, fetch))
+        )
+    return _on_disk(ctx, name, fetch)
+
+
+def _on_disk(ctx: Any, name: str, fetch: Callable[[], T]) -> T:
+    """Return data for name from the on-disk cache or by calling fetch."""
+    if not enabled(ctx):
+        return fetch()
+
+    from homeassistant_cli.config import resolve_server
+
+    server = resolve_server(ctx)
+    if not getattr(ctx, 'refresh', False):
+        entry = read(server, ctx, name)
+        if entry is not None:
+            _LOGGING.debug("Using cached %s (%s)", name, entry['etag'])
+            return entry['data']  # type: ignore
+
+    data = fetch()
+    write(server, ctx, name, data)
+    return data
+
+
+def invalidate(ctx: Any, *names: str) -> None:
+    """Drop the entries for names after a change on the server."""
+    shared = getattr(ctx, 'shared', None)
+    if shared is not None:
+        shared.forget(*names)
+    if enabled(ctx):
+        from homeassistant_cli.config import resolve_server
+
+        remove(resolve_server(ctx), ctx, *names)
+
+
+def memoize(name: str) -> Callable[[Callable[[Any], T]], Callable[[Any], T]]:
+    """Cache the result of a function taking only the context."""
+
+    def decorator(func: Callable[[Any], T]) -> Callable[[Any], T]:
+        @functools.wraps(func)
+        def wrapper(ctx: Any) -> T:
+            return cached(ctx, name, lambda: func(ctx))
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(*names: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Invalidate entries for names once the function returns."""
+
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(ctx: Any, *args: Any, **kwargs: Any) -> T:
+            try:
+                return func(ctx, *args, **kwargs)
+            finally:
+                invalidate(ctx, *names)
+
+        return cast(Callable[..., T], wrapper)
+
+    return decorator
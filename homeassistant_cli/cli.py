@@ -1,16 +1,22 @@
 """Home Assistant CLI (hass-cli)."""
+import importlib
 import logging
 import os
 import sys
-from typing import List, Optional, Union, cast
+from typing import Any, Dict, List, Optional, Union, cast
 
 import click
 from click.core import Command, Context, Group
+from click.formatting import HelpFormatter
+from click.shell_completion import CompletionItem
+from click.utils import make_default_short_help
 import click_log
 
+import homeassistant_cli.agent as agent
 import homeassistant_cli.autocompletion as autocompletion
 from homeassistant_cli.config import Configuration
 import homeassistant_cli.const as const
+import homeassistant_cli.manifest as manifest
 from homeassistant_cli.helper import debug_requests_on, to_tuples
 
 click_log.basic_config()
@@ -27,29 +33,53 @@ pass_context = click.make_pass_decorator(  # pylint: disable=invalid-name
 def run() -> None:
     """Run entry point.
 
+    Hands the command to the agent if one is running and takes it.
+    """
+    args = sys.argv[1:]
+    code = None  # type: Optional[int]
+    if agent.available():
+        code = agent.forward(args, _command_words(args))
+    if code is None:
+        code = main(args)
+    sys.exit(code)
+
+
+def main(
+    args: Optional[List[str]] = None,
+    obj: Optional[Configuration] = None,
+    defaults: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Run a command line and return its exit code.
+
     Wraps click for full control over exception handling in Click.
+    Global options not on the command line are taken from defaults.
     """
+    if args is None:
+        args = sys.argv[1:]
+
     # A hack to see if exception details should be printed.
     exceptionflags = ['-x']
-    verbose = [c for c in exceptionflags if c in sys.argv]
+    verbose = [c for c in exceptionflags if c in args]
 
     try:
         # Could use cli.invoke here to use the just created context
         # but then shell completion will not work. Thus calling
         # standalone mode to keep that working.
-        result = cli.main(standalone_mode=False)
+        result = cli.main(
+            args=args, obj=obj, default_map=defaults, standalone_mode=False
+        )
         if isinstance(result, int):
-            sys.exit(result)
+            return result
 
     # Exception handling below is done to use logger
     # and mimick as close as possible what click would
     # do normally in its main()
     except click.ClickException as ex:
         ex.show()  # let Click handle its own errors
-        sys.exit(ex.exit_code)
+        return ex.exit_code
     except click.Abort:
         _LOGGER.critical("Aborted!")
-        sys.exit(1)
+        return 1
     except Exception as ex:  # pylint: disable=broad-except
         if verbose:
             _LOGGER.exception(ex)
@@ -59,41 +89,73 @@ def run() -> None:
                 "Run with %s to see full exception information",
                 " or ".join(exceptionflags),
             )
-        sys.exit(1)
+        return 1
+    return 0
+
+
+def _command_words(args: List[str]) -> List[str]:
+    """Return the command line following the global options."""
+    try:
+        ctx = cli.make_context('hass-cli', list(args), resilient_parsing=True)
+    except click.ClickException:
+        return []
+    return list(ctx.protected_args) + list(ctx.args)
 
 
 class HomeAssistantCli(click.MultiCommand):
-    """The Home Assistant Command-line."""
+    """The Home Assistant Command-line.
+
+    Commands are listed from the manifest and only the plugin of the
+    command being invoked is imported.
+    """
 
     def list_commands(self, ctx: Context) -> List[str]:
         """List all command available as plugin."""
-        cmd_folder = os.path.abspath(
-            os.path.join(os.path.dirname(__file__), 'plugins')
-        )
-
-        commands = []
-        for filename in os.listdir(cmd_folder):
-            if filename.endswith('.py') and not filename.startswith('__'):
-                commands.append(filename[:-3])
-        commands.sort()
-
-        return commands
+        return sorted(manifest.commands())
 
     def get_command(
         self, ctx: Context, cmd_name: str
     ) -> Optional[Union[Group, Command]]:
-        """Import the commands of the plugins."""
+        """Import the command of a plugin."""
+        entry = manifest.commands(with_external=False).get(cmd_name)
+        if entry is None:
+            entry = manifest.commands().get(cmd_name)
+        if entry is None:
+            return None
+
         try:
-            mod = __import__(
-                '{}.plugins.{}'.format(const.PACKAGE_NAME, cmd_name),
-                {},
-                {},
-                ['cli'],
-            )
+            mod = importlib.import_module(entry['module'])
         except ImportError:
             # todo: print out issue of loading plugins?
             return None
-        return cast(Union[Group, Command], mod.cli)  # type: ignore
+        return cast(Union[Group, Command], getattr(mod, entry['attr']))
+
+    def format_commands(self, ctx: Context, formatter: HelpFormatter) -> None:
+        """List the commands with their help from the manifest."""
+        commands = manifest.commands()
+        if not commands:
+            return
+
+        limit = formatter.width - 6 - max(len(name) for name in commands)
+        rows = [
+            (name, make_default_short_help(commands[name]['help'], limit))
+            for name in sorted(commands)
+        ]
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
+
+    def shell_complete(
+        self, ctx: Context, incomplete: str
+    ) -> List[CompletionItem]:
+        """Complete command names from the manifest."""
+        results = [
+            CompletionItem(name, help=entry['help'])
+            for name, entry in sorted(manifest.commands().items())
+            if name.startswith(incomplete)
+        ]
+        # options of the group itself, skipping the plugin imports
+        results.extend(Command.shell_complete(self, ctx, incomplete))
+        return results
 
 
 def _default_token() -> Optional[str]:
@@ -139,6 +201,20 @@ def _default_token() -> Optional[str]:
     default=const.DEFAULT_TIMEOUT,
     show_default=True,
 )
+@click.option(
+    '--discovery-timeout',
+    help='Seconds to look for Home Assistant when the server is `auto`.',
+    type=float,
+    default=const.DEFAULT_DISCOVERY_TIMEOUT,
+    show_default=True,
+    envvar='HASS_DISCOVERY_TIMEOUT',
+)
+@click.option(
+    '--retries',
+    help='Number of retries for failed idempotent HTTP requests.',
+    default=const.DEFAULT_RETRIES,
+    show_default=True,
+)
 @click.option(
     '--output',
     '-o',
@@ -180,6 +256,35 @@ def _default_token() -> Optional[str]:
 @click.option(
     '--debug', is_flag=True, default=False, help='Enables debug mode.'
 )
+@click.option(
+    '--cache/--no-cache',
+    default=False,
+    envvar='HASS_CACHE',
+    help=(
+        'Keep registries, states and services in an on-disk cache. Can'
+        ' also be set with the environment variable HASS_CACHE.'
+    ),
+)
+@click.option(
+    '--refresh',
+    is_flag=True,
+    default=False,
+    help='Ignore and rewrite the cached data and discovered server.',
+)
+@click.option(
+    '--state-source',
+    type=click.Choice(const.STATE_SOURCES),
+    default=const.STATE_SOURCE_AUTO,
+    show_default=True,
+    envvar='HASS_STATE_SOURCE',
+    help=(
+        'Get states in the compact format of the WebSocket API (ws) or from'
+        ' the REST API (rest). `auto` uses the WebSocket API for states'
+        ' needed all at once unless it cannot serve them, and streams the'
+        ' REST response when listing. Can also be set with the environment'
+        ' variable HASS_STATE_SOURCE.'
+    ),
+)
 @click.option(
     '--columns',
     default=None,
@@ -214,7 +319,12 @@ def cli(
     password: Optional[str],
     output: str,
     timeout: int,
+    discovery_timeout: float,
+    retries: int,
     debug: bool,
+    cache: bool,
+    refresh: bool,
+    state_source: str,
     insecure: bool,
     showexceptions: bool,
     cert: str,
@@ -229,8 +339,13 @@ def cli(
     ctx.token = token
     ctx.password = password
     ctx.timeout = timeout
+    ctx.discovery_timeout = discovery_timeout
+    ctx.retries = retries
     ctx.output = output
     ctx.debug = debug
+    ctx.cache = cache
+    ctx.refresh = refresh
+    ctx.state_source = state_source
     ctx.insecure = insecure
     ctx.showexceptions = showexceptions
     ctx.cert = cert
@@ -241,5 +356,7 @@ def cli(
 
     _LOGGER.debug("Using settings: %s", ctx)
 
+    click.get_current_context().call_on_close(ctx.close)
+
     if debug:
         debug_requests_on()
@@ -1,17 +1,35 @@
 """Configuration for Home Assistant CLI (hass-cli)."""
 import logging
 import os
+import socket
 import sys
-from typing import Any, Dict, List, Optional, Tuple, cast  # noqa: F401
+import threading
+import time
+from typing import (  # noqa: F401
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
+import urllib.parse
 
 import click
-from requests import Session  # noqa: ignore
-from ruamel.yaml import YAML
-import zeroconf
 
+import homeassistant_cli.cache as cache
 import homeassistant_cli.const as const
+import homeassistant_cli.records as records
 import homeassistant_cli.yaml as yaml
 
+if TYPE_CHECKING:
+    # only loaded on the code paths needing them, see _locate_ha and remote
+    from requests import Session  # noqa: F401
+    from ruamel.yaml import YAML
+    import zeroconf
+
 _LOGGING = logging.getLogger(__name__)
 
 
@@ -21,49 +39,56 @@ class _ZeroconfListener:
     def __init__(self) -> None:
         """Initialize the listener."""
         self.services = {}  # type: Dict[str, zeroconf.ServiceInfo]
+        # set once a service with a base URL was resolved
+        self.found = threading.Event()
 
     def remove_service(
-        self, _zeroconf: zeroconf.Zeroconf, _type: str, name: str
+        self, _zeroconf: 'zeroconf.Zeroconf', _type: str, name: str
     ) -> None:
         """Remove service."""
-        self.services[name] = None
+        self.services.pop(name, None)
 
     def add_service(
-        self, _zeroconf: zeroconf.Zeroconf, _type: str, name: str
+        self, _zeroconf: 'zeroconf.Zeroconf', _type: str, name: str
     ) -> None:
         """Add service."""
-        self.services[name] = _zeroconf.get_service_info(_type, name)
+        info = _zeroconf.get_service_info(_type, name)
+        if info is not None and b'base_url' in (info.properties or {}):
+            self.services[name] = info
+            self.found.set()
+
+    def update_service(
+        self, _zeroconf: 'zeroconf.Zeroconf', _type: str, name: str
+    ) -> None:
+        """Update service."""
+        self.add_service(_zeroconf, _type, name)
 
 
-def _locate_ha() -> Optional[str]:
-    """Locate the HOme Assistant instance."""
+def _locate_ha(
+    timeout: float = const.DEFAULT_DISCOVERY_TIMEOUT,
+) -> Optional[str]:
+    """Locate the HOme Assistant instance.
+
+    Returns as soon as the first instance is resolved or after timeout,
+    thus with several instances the first to answer is used.
+    """
+    import zeroconf
+
+    _LOGGING.info("Trying to locate Home Assistant on local network...")
     _zeroconf = zeroconf.Zeroconf()
     listener = _ZeroconfListener()
-    zeroconf.ServiceBrowser(_zeroconf, "_home-assistant._tcp.local.", listener)
     try:
-        import time
-
-        retries = 0
-        while not listener.services and retries < 5:
-            _LOGGING.info(
-                "Trying to locate Home Assistant on local network..."
-            )
-            time.sleep(0.5)
-            retries = retries + 1
+        zeroconf.ServiceBrowser(
+            _zeroconf, "_home-assistant._tcp.local.", listener
+        )
+        listener.found.wait(timeout)
     finally:
         _zeroconf.close()
 
-    if listener.services:
-        if len(listener.services) > 1:
-            _LOGGING.warning(
-                "Found multiple Home Assistant instances at %s",
-                ", ".join(listener.services),
-            )
-            _LOGGING.warning("Use --server to explicitly specify one.")
-            return None
-
-        _, service = listener.services.popitem()
-        base_url = service.properties[b'base_url'].decode('utf-8')
+    services = list(listener.services.values())
+    if services:
+        # the first to answer, use --server to pick another one
+        base_url = services[0].properties[b'base_url'].decode('utf-8')
         _LOGGING.info("Found and using %s as server", base_url)
         return cast(str, base_url)
 
@@ -73,6 +98,161 @@ def _locate_ha() -> Optional[str]:
     return None
 
 
+def _server_answers(base_url: str, timeout: float) -> bool:
+    """Return True if a connection to the server can be opened."""
+    url = urllib.parse.urlsplit(base_url)
+    port = url.port or (443 if url.scheme == 'https' else 80)
+    try:
+        with socket.create_connection((url.hostname, port), timeout):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+def _cached_locate_ha(ctx: Any) -> Optional[str]:
+    """Locate Home Assistant, reusing an earlier result if it answers.
+
+    The discovered server is kept for a day, thus most runs skip mDNS.
+    """
+    if not getattr(ctx, 'refresh', False):
+        entry = cache.read(const.AUTO_SERVER, ctx, 'server')
+        if entry:
+            if _server_answers(entry['data'], const.DISCOVERY_PROBE_TIMEOUT):
+                _LOGGING.debug("Using cached server %s", entry['data'])
+                return cast(str, entry['data'])
+            _LOGGING.debug("Cached server %s is gone", entry['data'])
+            cache.remove(const.AUTO_SERVER, ctx, 'server')
+
+    base_url = _locate_ha(
+        getattr(ctx, 'discovery_timeout', const.DEFAULT_DISCOVERY_TIMEOUT)
+    )
+    if base_url:
+        cache.write(const.AUTO_SERVER, ctx, 'server', base_url)
+    else:
+        cache.remove(const.AUTO_SERVER, ctx, 'server')
+
+    return base_url
+
+
+class Shared:
+    """Connections and data kept across the commands run by one process.
+
+    The agent and batch mode run many commands, each with a fresh
+    Configuration. Connections are keyed by the settings they were made
+    with, thus commands using other servers or credentials get their own.
+    """
+
+    def __init__(
+        self,
+        remember: Iterable[str] = (),
+        pool_size: int = const.DEFAULT_POOL_SIZE,
+    ) -> None:
+        """Initialize, keeping the data of the named caches in memory.
+
+        Remembered data lives as long as it would in the on-disk cache.
+        `pool_size` is the least number of HTTP connections kept open.
+        """
+        self.remember = frozenset(remember)
+        self.pool_size = pool_size
+        self._lock = threading.RLock()
+        self._connections = {}  # type: Dict[Tuple, Any]
+        self._data = {}  # type: Dict[Tuple, Any]
+        self._servers = {}  # type: Dict[Tuple, str]
+        # connection key -> live states of the server, see states()
+        self.mirrors = {}  # type: Dict[Tuple, Any]
+
+    @staticmethod
+    def key(ctx: Any) -> Tuple:
+        """Return the settings making up a connection of the context."""
+        return (
+            resolve_server(ctx),
+            getattr(ctx, 'token', None),
+            getattr(ctx, 'password', None),
+            getattr(ctx, 'insecure', False),
+            getattr(ctx, 'cert', None),
+        )
+
+    def server(self, ctx: Any) -> Optional[str]:
+        """Return the server resolved earlier for the same settings."""
+        with self._lock:
+            return self._servers.get(_server_key(ctx))
+
+    def remember_server(self, ctx: Any, server: str) -> None:
+        """Keep the server resolved for the settings of the context."""
+        with self._lock:
+            self._servers[_server_key(ctx)] = server
+
+    def connection(self, kind: str, ctx: Any, create: Any) -> Any:
+        """Return the connection of a kind, creating it if needed."""
+        key = (kind,) + self.key(ctx)
+        with self._lock:
+            if key not in self._connections:
+                self._connections[key] = create()
+            return self._connections[key]
+
+    def data(self, name: str, ctx: Any, fetch: Any) -> Any:
+        """Return data remembered for name or else fetch and remember it.
+
+        Registries are remembered as records, see records.REGISTRIES, and
+        every caller gets dictionaries of its own.
+        """
+        if name not in self.remember:
+            return fetch()
+        key = (name,) + self.key(ctx)
+        with self._lock:
+            fetched, data = self._data.get(key, (0.0, None))
+        fresh = time.monotonic() - fetched < const.CACHE_TTL[name]
+        if fresh and not getattr(ctx, 'refresh', False):
+            _LOGGING.debug("Using remembered %s", name)
+            return _unpack(name, data)
+        data = fetch()
+        record = records.REGISTRIES.get(name)
+        kept = (
+            tuple(record.from_dict(entry) for entry in data)
+            if record is not None and isinstance(data, list)
+            else data
+        )
+        with self._lock:
+            self._data[key] = (time.monotonic(), kept)
+        return data
+
+    def states(self, ctx: Any) -> Optional[List[Dict[str, Any]]]:
+        """Return the mirrored states of the server, None if not mirrored."""
+        with self._lock:
+            mirror = self.mirrors.get(self.key(ctx))
+        return None if mirror is None else mirror.snapshot()
+
+    def forget(self, *names: str) -> None:
+        """Drop the data remembered for names, on any server."""
+        with self._lock:
+            for key in [k for k in self._data if k[0] in names]:
+                del self._data[key]
+
+    def close(self) -> None:
+        """Close all connections."""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+
+def _unpack(name: str, data: Any) -> Any:
+    """Return remembered data as it was fetched."""
+    if name in records.REGISTRIES and isinstance(data, tuple):
+        return [entry.as_dict() for entry in data]
+    return data
+
+
+def _server_key(ctx: Any) -> Tuple:
+    """Return what decides the server a context resolves to."""
+    return (
+        getattr(ctx, 'server', const.AUTO_SERVER),
+        getattr(ctx, 'token', None),
+        getattr(ctx, 'password', None),
+    )
+
+
 def resolve_server(ctx: Any) -> str:  # noqa: F821
     """Resolve server if not already done.
 
@@ -83,6 +263,10 @@ def resolve_server(ctx: Any) -> str:  # noqa: F821
     if not hasattr(ctx, "resolved_server"):
         ctx.resolved_server = None
 
+    shared = getattr(ctx, 'shared', None)
+    if not ctx.resolved_server and shared is not None:
+        ctx.resolved_server = shared.server(ctx)
+
     if not ctx.resolved_server:
 
         if ctx.server == "auto":
@@ -93,7 +277,7 @@ def resolve_server(ctx: Any) -> str:  # noqa: F821
                 if not ctx.resolved_server and "pytest" in sys.modules:
                     ctx.resolved_server = const.DEFAULT_SERVER
                 else:
-                    ctx.resolved_server = _locate_ha()
+                    ctx.resolved_server = _cached_locate_ha(ctx)
                     if not ctx.resolved_server:
                         sys.exit(3)
         else:
@@ -102,6 +286,9 @@ def resolve_server(ctx: Any) -> str:  # noqa: F821
         if not ctx.resolved_server:
             ctx.resolved_server = const.DEFAULT_SERVER
 
+        if shared is not None:
+            shared.remember_server(ctx, ctx.resolved_server)
+
     return cast(str, ctx.resolved_server)
 
 
@@ -118,14 +305,40 @@ class Configuration:
         self.password = None  # type: Optional[str]
         self.insecure = False  # type: bool
         self.timeout = const.DEFAULT_TIMEOUT  # type: int
+        self.retries = const.DEFAULT_RETRIES  # type: int
+        self.backoff = const.DEFAULT_BACKOFF  # type: float
+        self.pool_size = const.DEFAULT_POOL_SIZE  # type: int
         self.debug = False  # type: bool
         self.showexceptions = False  # type: bool
         self.session = None  # type: Optional[Session]
+        self.wsclient = None  # type: Optional[Any]
         self.cert = None  # type: Optional[str]
         self.columns = None  # type: Optional[List[Tuple[str, str]]]
         self.no_headers = False
         self.table_format = 'plain'
         self.sort_by = None
+        self.cache = False  # type: bool
+        self.refresh = False  # type: bool
+        self.discovery_timeout = const.DEFAULT_DISCOVERY_TIMEOUT
+        self.state_source = const.STATE_SOURCE_AUTO  # type: str
+        # connections kept across commands, see Shared
+        self.shared = None  # type: Optional[Shared]
+
+    def close(self) -> None:
+        """Close the connections held open by the configuration.
+
+        Shared connections are left open for the next command.
+        """
+        if self.shared is not None:
+            self.wsclient = None
+            self.session = None
+            return
+        if self.wsclient is not None:
+            self.wsclient.close()
+            self.wsclient = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
 
     def echo(self, msg: str, *args: Optional[Any]) -> None:
         """Put content message to stdout."""
@@ -170,10 +383,8 @@ class Configuration:
             self.output = auto_output
         return self.output
 
-    def yaml(self) -> YAML:
-        """Create default yaml parser."""
-        if self:
-            yaml.yaml()
+    def yaml(self) -> 'YAML':
+        """Return the default yaml parser."""
         return yaml.yaml()
 
     def yamlload(self, source: str) -> Any:
@@ -8,10 +8,49 @@ AUTO_SERVER = 'auto'
 DEFAULT_SERVER = 'http://localhost:8123'
 DEFAULT_SERVER_MDNS = 'http://homeassistant.local:8123'
 DEFAULT_TIMEOUT = 5
+# Seconds to look for Home Assistant on the local network
+DEFAULT_DISCOVERY_TIMEOUT = 2.5
+# Seconds to wait for a discovered server to accept a connection
+DISCOVERY_PROBE_TIMEOUT = 1.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.3
+DEFAULT_POOL_SIZE = 10
+DEFAULT_WS_WINDOW = 32
+# Where states come from: subscribe_entities over the WS API, or REST
+STATE_SOURCE_AUTO = 'auto'
+STATE_SOURCE_WS = 'ws'
+STATE_SOURCE_REST = 'rest'
+STATE_SOURCES = [STATE_SOURCE_AUTO, STATE_SOURCE_WS, STATE_SOURCE_REST]
+
+# Time to live in seconds of the cached data, see --cache
+CACHE_TTL = {
+    'areas': 3600,
+    'devices': 3600,
+    'entities': 3600,
+    'services': 3600,
+    'states': 10,
+    'server': 86400,
+    'completion': 600,
+}
 DEFAULT_OUTPUT = 'json'  # TODO: Have default be human table relevant output
 
 DEFAULT_DATAOUTPUT = 'yaml'
 
+# Rows rendered at once when streaming tables; also used for column widths
+TABLE_SAMPLE_SIZE = 1000
+# Messages buffered between receiving and writing them, see pipeline
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_SAMPLE_EVERY = 10
+# Environment variables a command run by the agent takes from its caller
+AGENT_ENV_PREFIXES = ('HASS', 'HOMEASSISTANT_')
+# Seconds the agent waits at most before following the states again
+AGENT_MAX_RECONNECT_DELAY = 60
+# Seconds a caller waits for the agent to take a command, else runs it itself
+AGENT_ANSWER_TIMEOUT = 2.0
+# Data the agent and batch mode keep in memory, for as long as in the cache
+SHARED_DATA = ('areas', 'devices', 'entities', 'services')
+
 COLUMNS_DEFAULT = [('ALL', '$')]
 COLUMNS_ENTITIES = [
     ('ENTITY', 'entity_id'),
@@ -1,18 +1,38 @@
 """Helpers used by Home Assistant CLI (hass-cli)."""
 import contextlib
-from http.client import HTTPConnection
+from datetime import timedelta
+import functools
+import itertools
 import json
 import logging
+import math
+import re
 import shlex
-from typing import Any, Dict, Generator, List, Optional, Tuple, Union, cast
-
-from ruamel.yaml import YAML
-from tabulate import tabulate
+import textwrap
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+import click
 
 from homeassistant_cli.config import Configuration
 import homeassistant_cli.const as const
 import homeassistant_cli.yaml as yaml
 
+if TYPE_CHECKING:
+    from ruamel.yaml import YAML
+
 _LOGGING = logging.getLogger(__name__)
 
 
@@ -46,10 +66,147 @@ def to_tuples(entry: str) -> List[Tuple[str, str]]:
     return attributes_list
 
 
+def split_entities(entities: List[str], parts: int) -> List[List[str]]:
+    """Split entity ids into groups to process concurrently.
+
+    Every group holds entities of a single domain and no more than
+    len(entities) / parts of them.
+    """
+    size = max(1, math.ceil(len(entities) / max(parts, 1)))
+
+    domains = {}  # type: Dict[str, List[str]]
+    for entity_id in entities:
+        domains.setdefault(entity_id.split('.', 1)[0], []).append(entity_id)
+
+    return [
+        ids[i : i + size]
+        for ids in domains.values()
+        for i in range(0, len(ids), size)
+    ]
+
+
+_DURATION = re.compile(r'^\s*(\d+)\s*([smhdw])\w*\s*$', re.IGNORECASE)
+_DURATION_UNITS = {
+    's': 'seconds',
+    'm': 'minutes',
+    'h': 'hours',
+    'd': 'days',
+    'w': 'weeks',
+}
+
+
+def to_timedelta(entry: str) -> timedelta:
+    """Convert a duration like `30m`, `6h` or `2 days` to a timedelta."""
+    match = _DURATION.match(entry)
+    if not match:
+        raise click.BadParameter(f"Not a duration: {entry}")
+
+    unit = _DURATION_UNITS[match.group(2).lower()]
+    return timedelta(**{unit: int(match.group(1))})
+
+
+_DOTTED_PATH = re.compile(r'^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$')
+# Words with a meaning of their own in jsonpath expressions
+_JSONPATH_RESERVED = {'where', 'wherenot'}
+
+
+@functools.lru_cache(maxsize=256)
+def compile_path(expr: str) -> Callable[[Any], List[Any]]:
+    """Compile a jsonpath expression to a function returning its matches.
+
+    Plain dotted paths like `attributes.friendly_name` are resolved with
+    dict lookups instead of going through jsonpath.
+    """
+    keys = expr.split('.')
+    if _DOTTED_PATH.match(expr) and not _JSONPATH_RESERVED.intersection(
+        keys
+    ):
+
+        def lookup(data: Any) -> List[Any]:
+            for key in keys:
+                if not isinstance(data, dict) or key not in data:
+                    return []
+                data = data[key]
+            return [data]
+
+        return lookup
+
+    from jsonpath_ng import parse
+
+    parsed = parse(expr)
+
+    return lambda data: [match.value for match in parsed.find(data)]
+
+
+_LEADING_KEY = re.compile(r'^([A-Za-z_]\w*)[.\[]')
+
+
+def required_fields(
+    columns: Optional[List] = None,
+    sort_by: Optional[str] = None,
+    extra: Iterable[str] = (),
+) -> Optional[List[str]]:
+    """Return the paths of the fields a table needs, None for all.
+
+    Dotted paths are kept as they are. Other jsonpath expressions need
+    the whole top-level field they start with, or everything if they do
+    not start with one.
+    """
+    exprs = [v[1] if len(v) > 1 else v[0] for v in columns or []]
+    exprs.extend(extra)
+    if sort_by:
+        exprs.append(sort_by)
+
+    fields = []  # type: List[str]
+    for expr in exprs:
+        keys = expr.split('.')
+        if _DOTTED_PATH.match(expr) and not _JSONPATH_RESERVED.intersection(
+            keys
+        ):
+            fields.append(expr)
+            continue
+        match = _LEADING_KEY.match(expr)
+        if not match or match.group(1) in _JSONPATH_RESERVED:
+            return None
+        fields.append(match.group(1))
+    return fields
+
+
+def projection(fields: Iterable[str]) -> Callable[[Any], Any]:
+    """Return a function copying only the fields at the paths from data.
+
+    A path holding a dict keeps all of it, unless only some of its own
+    fields are asked for.
+    """
+    tree = {}  # type: Dict[str, Any]
+    for path in sorted(set(fields), key=lambda path: path.count('.')):
+        node = tree
+        keys = path.split('.')
+        for key in keys[:-1]:
+            if node.get(key) is True:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = True
+
+    def project(data: Any, node: Dict[str, Any]) -> Any:
+        if not isinstance(data, dict):
+            return data
+        result = {}
+        for key, sub in node.items():
+            if key in data:
+                result[key] = (
+                    data[key] if sub is True else project(data[key], sub)
+                )
+        return result
+
+    return lambda data: project(data, tree)
+
+
 def raw_format_output(
     output: str,
     data: Union[Dict[str, Any], List[Dict[str, Any]]],
-    yamlparser: YAML,
+    yamlparser: 'YAML',
     columns: Optional[List] = None,
     no_headers: bool = False,
     table_format: str = 'plain',
@@ -70,6 +227,8 @@ def raw_format_output(
             return str(data)
     elif output == 'ndjson':
         try:
+            if isinstance(data, List):
+                return "\n".join(json.dumps(item) for item in data)
             return json.dumps(data)
         except ValueError:
             return str(data)
@@ -79,14 +238,12 @@ def raw_format_output(
         except ValueError:
             return str(data)
     elif output == 'table':
-        from jsonpath_ng import parse
-
         if not columns:
             columns = const.COLUMNS_DEFAULT
 
-        fmt = [(v[0], parse(v[1] if len(v) > 1 else v[0])) for v in columns]
-
-        result = []
+        fmt = [
+            (v[0], compile_path(v[1] if len(v) > 1 else v[0])) for v in columns
+        ]
 
         if no_headers:
             headers = []  # type: List[str]
@@ -98,12 +255,9 @@ def raw_format_output(
         if not isinstance(data, List):
             data = [data]
 
-        for item in data:
-            row = []
-            for fmtpair in fmt:
-                val = [match.value for match in fmtpair[1].find(item)]
-                row.append(", ".join(map(str, val)))
-            result.append(row)
+        result = list(_table_rows(data, fmt))
+
+        from tabulate import tabulate
 
         res = tabulate(
             result, headers=headers, tablefmt=table_format
@@ -117,14 +271,203 @@ def raw_format_output(
         )
 
 
+def _table_rows(
+    data: Iterable[Any], fmt: List[Tuple[str, Callable[[Any], List[Any]]]]
+) -> Iterator[List[str]]:
+    """Yield the table cells for every item."""
+    for item in data:
+        yield [", ".join(map(str, fmtpair[1](item))) for fmtpair in fmt]
+
+
+def _echo(text: str) -> None:
+    """Write text to stdout as is."""
+    click.echo(text, nl=False)
+
+
+class _Writer:  # pylint: disable=too-few-public-methods
+    """File-like adapter for a write function."""
+
+    encoding = None  # makes ruamel write str rather than bytes
+
+    def __init__(self, write: Callable[[str], None]) -> None:
+        """Initialize the adapter."""
+        self.write = write
+
+
+def _stream_json(data: Iterable[Any], write: Callable[[str], None]) -> None:
+    """Write a JSON array one element at a time.
+
+    The output is the same as json.dumps(list(data), indent=2).
+    """
+    separator = "[\n"
+    for item in data:
+        write(separator)
+        write(textwrap.indent(json.dumps(item, indent=2), "  "))
+        separator = ",\n"
+    write("[]\n" if separator == "[\n" else "\n]\n")
+
+
+def _stream_table(
+    rows: Iterator[List[str]],
+    headers: List[str],
+    table_format: str,
+    write: Callable[[str], None],
+    sample_size: int,
+) -> None:
+    """Write a table, rendering at most sample_size rows at a time.
+
+    Column widths and alignment are worked out from the first
+    sample_size rows, the table is then written in chunks laid out
+    alike, thus its layout does not depend on the number of rows.
+    """
+    import tabulate as tabulate_module
+    from tabulate import tabulate
+
+    sample = list(itertools.islice(rows, sample_size))
+    if not sample:
+        write(tabulate(sample, headers=headers, tablefmt=table_format) + "\n")
+        return
+
+    columns = list(zip(*sample))
+    widths = [max(len(cell) for cell in column) for column in columns]
+    if headers:
+        # tabulate leaves room around headers, keep it for later chunks
+        widths = [
+            max(width, len(header) + tabulate_module.MIN_PADDING)
+            for width, header in zip(widths, headers)
+        ]
+    # numbers are right-aligned like tabulate does but kept as they are
+    # written, lining them up on the decimal point or reformatting them
+    # would depend on the rows of each chunk
+    # pylint: disable=protected-access
+    numeric = [
+        tabulate_module._column_type(column) in (int, float)
+        for column in columns
+    ]
+    colalign = ['right' if number else 'left' for number in numeric]
+
+    tablefmt = tabulate_module._table_formats.get(
+        table_format, tabulate_module._table_formats['simple']
+    )
+
+    hidden = tablefmt.with_header_hide or () if headers else ()
+
+    def render(chunk: List[List[str]], first: bool, last: bool) -> str:
+        padded = [
+            [
+                cell.rjust(width) if number else cell.ljust(width)
+                for cell, width, number in zip(row, widths, numeric)
+            ]
+            for row in chunk
+        ]
+        # chunks join up as one table: only the first gets the line
+        # above and only the last the line below, unless the format
+        # hides it under headers like tabulate does
+        chunkfmt = tablefmt._replace(
+            lineabove=tablefmt.lineabove
+            if first
+            else tablefmt.linebetweenrows,
+            linebelow=tablefmt.linebelow
+            if last and 'linebelow' not in hidden
+            else None,
+        )
+        return cast(
+            str,
+            tabulate(
+                padded,
+                headers=headers if first else [],
+                tablefmt=chunkfmt,
+                colalign=colalign,
+                disable_numparse=True,
+            ),
+        )
+
+    preserve = tabulate_module.PRESERVE_WHITESPACE
+    tabulate_module.PRESERVE_WHITESPACE = True
+    try:
+        chunk, first = sample, True
+        while chunk:
+            upcoming = list(itertools.islice(rows, sample_size))
+            write(render(chunk, first, not upcoming) + "\n")
+            chunk, first = upcoming, False
+    finally:
+        tabulate_module.PRESERVE_WHITESPACE = preserve
+
+
+def raw_stream_output(
+    output: str,
+    data: Iterable[Any],
+    yamlparser: 'YAML',
+    columns: Optional[List] = None,
+    no_headers: bool = False,
+    table_format: str = 'plain',
+    sort_by: Optional[str] = None,
+    write: Callable[[str], None] = _echo,
+    sample_size: int = const.TABLE_SAMPLE_SIZE,
+) -> None:
+    """Write the data formatted as output while it is being produced.
+
+    Unlike raw_format_output the data can be any iterable and is never
+    held as a whole, except for sorting which needs every record.
+    """
+    if output == 'auto':
+        output = const.DEFAULT_DATAOUTPUT
+
+    if isinstance(data, dict):
+        text = raw_format_output(
+            output,
+            data,
+            yamlparser,
+            columns,
+            no_headers,
+            table_format,
+            sort_by,
+        )
+        write(text + "\n")
+        return
+
+    if sort_by:
+        data = _sort_table(list(data), sort_by)
+
+    if output == 'json':
+        _stream_json(data, write)
+    elif output == 'ndjson':
+        for item in data:
+            write(json.dumps(item) + "\n")
+    elif output == 'yaml':
+        stream = _Writer(write)
+        empty = True
+        for item in data:
+            # a sequence dumped item by item is the same as dumped at once
+            yaml.dumpyaml(yamlparser, [item], stream)
+            empty = False
+        write("[]\n\n" if empty else "\n")
+    elif output == 'table':
+        if not columns:
+            columns = const.COLUMNS_DEFAULT
+
+        fmt = [
+            (v[0], compile_path(v[1] if len(v) > 1 else v[0])) for v in columns
+        ]
+        headers = [] if no_headers else [v[0] for v in fmt]
+
+        _stream_table(
+            _table_rows(data, fmt), headers, table_format, write, sample_size
+        )
+    else:
+        raise ValueError(
+            "Output Format was {}, expected either 'json' or 'yaml'".format(
+                output
+            )
+        )
+
+
 def _sort_table(result: List[Any], sort_by: str) -> List[Any]:
     """Sort the content of a table."""
-    from jsonpath_ng import parse
-
-    expr = parse(sort_by)
+    expr = compile_path(sort_by)
 
     def _internal_sort(row: Dict[Any, str]) -> Any:
-        val = next(iter([match.value for match in expr.find(row)]), None)
+        val = next(iter(expr(row)), None)
         return (val is None, val)
 
     result.sort(key=_internal_sort)
@@ -148,8 +491,27 @@ def format_output(
     )
 
 
+def stream_output(
+    ctx: Configuration,
+    data: Iterable[Any],
+    columns: Optional[List] = None,
+) -> None:
+    """Write data to stdout as it is produced, based on settings in ctx."""
+    raw_stream_output(
+        ctx.output,
+        data,
+        ctx.yaml(),
+        columns,
+        ctx.no_headers,
+        ctx.table_format,
+        ctx.sort_by,
+    )
+
+
 def debug_requests_on() -> None:
     """Switch on logging of the requests module."""
+    from http.client import HTTPConnection
+
     HTTPConnection.set_debuglevel(cast(HTTPConnection, HTTPConnection), 1)
 
     logging.basicConfig()
@@ -164,6 +526,8 @@ def debug_requests_off() -> None:
 
     Might have some side-effects.
     """
+    from http.client import HTTPConnection
+
     HTTPConnection.set_debuglevel(cast(HTTPConnection, HTTPConnection), 1)
 
     root_logger = logging.getLogger()
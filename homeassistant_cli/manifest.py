@@ -0,0 +1,118 @@
+"""Manifest of the commands of Home Assistant CLI (hass-cli).
+
+The manifest lists the name, module and help of every command, so help
+output and completion work without importing the plugins. Plugins of
+other packages are found through the `homeassistant_cli.plugins` entry
+points. Regenerate the manifest after changing a plugin with:
+
+    python -m homeassistant_cli.manifest
+"""
+import ast
+import functools
+import json
+import os
+from typing import Dict, List
+
+import homeassistant_cli.const as const
+
+ENTRY_POINT_GROUP = 'homeassistant_cli.plugins'
+
+MANIFEST_FILE = os.path.join(os.path.dirname(__file__), 'manifest.json')
+PLUGINS_DIR = os.path.join(os.path.dirname(__file__), 'plugins')
+
+# name -> {'module': ..., 'attr': ..., 'help': ...}
+Manifest = Dict[str, Dict[str, str]]
+
+
+@functools.lru_cache(maxsize=None)
+def builtin() -> Manifest:
+    """Return the commands shipped with hass-cli."""
+    try:
+        with open(MANIFEST_FILE) as file:
+            return json.load(file)['commands']  # type: ignore
+    except (OSError, ValueError, KeyError):
+        # missing or broken manifest, fall back to the plugin modules
+        return {
+            name: {
+                'module': f'{const.PACKAGE_NAME}.plugins.{name}',
+                'attr': 'cli',
+                'help': '',
+            }
+            for name in _plugin_names()
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def external() -> Manifest:
+    """Return the commands registered by other packages."""
+    from importlib.metadata import entry_points
+
+    points = entry_points()
+    if hasattr(points, 'select'):
+        group = points.select(group=ENTRY_POINT_GROUP)
+    else:  # Python < 3.10
+        group = points.get(ENTRY_POINT_GROUP, [])  # type: ignore
+
+    commands = {}  # type: Manifest
+    for point in group:
+        module, _, attr = point.value.partition(':')
+        commands[point.name] = {
+            'module': module.strip(),
+            'attr': attr.strip() or 'cli',
+            'help': '',
+        }
+    return commands
+
+
+def commands(with_external: bool = True) -> Manifest:
+    """Return all commands, the shipped ones taking precedence."""
+    if not with_external:
+        return builtin()
+    return {**external(), **builtin()}
+
+
+def _plugin_names() -> List[str]:
+    """Return the names of the plugin modules."""
+    return sorted(
+        filename[:-3]
+        for filename in os.listdir(PLUGINS_DIR)
+        if filename.endswith('.py') and not filename.startswith('__')
+    )
+
+
+def _help(path: str, attr: str = 'cli') -> str:
+    """Return the short help of the command defined in a plugin module."""
+    from click.utils import make_default_short_help
+
+    with open(path) as file:
+        tree = ast.parse(file.read(), path)
+
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == attr:
+            doc = (ast.get_docstring(node) or '').split('\f', 1)[0]
+            # long enough to be cut to the terminal width later on
+            return make_default_short_help(doc, 200)
+    return ''
+
+
+def generate() -> Manifest:
+    """Build the manifest from the sources of the plugins."""
+    return {
+        name: {
+            'module': f'{const.PACKAGE_NAME}.plugins.{name}',
+            'attr': 'cli',
+            'help': _help(os.path.join(PLUGINS_DIR, f'{name}.py')),
+        }
+        for name in _plugin_names()
+    }
+
+
+def write() -> None:
+    """Write the manifest of the shipped plugins."""
+    with open(MANIFEST_FILE, 'w') as file:
+        json.dump({'commands': generate()}, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+if __name__ == '__main__':
+    write()
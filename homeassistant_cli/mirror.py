@@ -0,0 +1,197 @@
+"""Local mirror of the states of Home Assistant.
+
+The mirror is filled once from a snapshot and then kept up to date from
+`state_changed` events or the compact messages of `subscribe_entities`,
+thus following the states costs in proportion to how often they change
+rather than to how many there are.
+"""
+from datetime import datetime, timezone
+import re
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+# keys of the compact state format of subscribe_entities
+COMPACT_STATE = 's'
+COMPACT_ATTRIBUTES = 'a'
+COMPACT_CONTEXT = 'c'
+COMPACT_LAST_CHANGED = 'lc'
+COMPACT_LAST_UPDATED = 'lu'
+
+# keys of the messages of subscribe_entities
+COMPACT_ADDED = 'a'
+COMPACT_CHANGED = 'c'
+COMPACT_REMOVED = 'r'
+DIFF_ADDITIONS = '+'
+DIFF_REMOVALS = '-'
+
+# entity id and its new state, None if the entity was removed; states
+# are dictionaries or what the project of the mirror made of them
+Change = Tuple[str, Any]
+
+
+def _timestamp(value: float) -> str:
+    """Return a timestamp in the ISO format the REST API uses."""
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def _context(value: Any) -> Dict[str, Any]:
+    """Return a full context from a compact one, which may be an id."""
+    if isinstance(value, dict):
+        return {
+            'id': value.get('id'),
+            'parent_id': value.get('parent_id'),
+            'user_id': value.get('user_id'),
+        }
+    return {'id': value, 'parent_id': None, 'user_id': None}
+
+
+def decode_state(entity_id: str, compact: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the state as the REST API has it from its compact form."""
+    last_changed = _timestamp(compact[COMPACT_LAST_CHANGED])
+    last_updated = (
+        _timestamp(compact[COMPACT_LAST_UPDATED])
+        if COMPACT_LAST_UPDATED in compact
+        else last_changed
+    )
+    return {
+        'entity_id': entity_id,
+        'state': compact.get(COMPACT_STATE),
+        'attributes': dict(compact.get(COMPACT_ATTRIBUTES) or {}),
+        'last_changed': last_changed,
+        'last_updated': last_updated,
+        'context': _context(compact.get(COMPACT_CONTEXT)),
+    }
+
+
+def apply_diff(state: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a new state with a compact diff applied to it."""
+    new = dict(state)
+    new['attributes'] = dict(state.get('attributes') or {})
+
+    additions = diff.get(DIFF_ADDITIONS) or {}
+    if COMPACT_STATE in additions:
+        new['state'] = additions[COMPACT_STATE]
+    new['attributes'].update(additions.get(COMPACT_ATTRIBUTES) or {})
+    if COMPACT_CONTEXT in additions:
+        new['context'] = _context(additions[COMPACT_CONTEXT])
+    if COMPACT_LAST_CHANGED in additions:
+        # a new last changed is the new last updated as well
+        new['last_changed'] = new['last_updated'] = _timestamp(
+            additions[COMPACT_LAST_CHANGED]
+        )
+    elif COMPACT_LAST_UPDATED in additions:
+        new['last_updated'] = _timestamp(additions[COMPACT_LAST_UPDATED])
+
+    removals = diff.get(DIFF_REMOVALS) or {}
+    for name in removals.get(COMPACT_ATTRIBUTES) or []:
+        new['attributes'].pop(name, None)
+
+    return new
+
+
+class StateMirror:
+    """States of the entities matching a filter, keyed by entity id.
+
+    Every update returns the changes it made. States are replaced rather
+    than changed in place, thus a state handed out stays as it was.
+    Given `project`, only what it returns of every state is kept, which
+    must include the entity id and the time of the last update. It may
+    be a mapping other than a dict, like a records.State.
+    """
+
+    def __init__(
+        self,
+        entity_filter: Optional[str] = None,
+        project: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ) -> None:
+        """Initialize an empty mirror."""
+        self.states = {}  # type: Dict[str, Any]
+        self._project = project
+        self._filter = (
+            re.compile(entity_filter)
+            if entity_filter and entity_filter != '.*'
+            else None
+        )  # type: Optional[re.Pattern]
+
+    def wanted(self, entity_id: str) -> bool:
+        """Return True if the entity is mirrored."""
+        return self._filter is None or bool(self._filter.search(entity_id))
+
+    def _set(self, entity_id: str, state: Dict[str, Any]) -> Change:
+        """Store the state of an entity."""
+        if self._project is not None:
+            state = self._project(state)
+        self.states[entity_id] = state
+        return (entity_id, state)
+
+    def _remove(self, entity_id: str) -> List[Change]:
+        """Forget an entity, if it was mirrored."""
+        if self.states.pop(entity_id, None) is None:
+            return []
+        return [(entity_id, None)]
+
+    def load(self, states: Iterable[Dict[str, Any]]) -> List[Change]:
+        """Add the states of a snapshot."""
+        return [
+            self._set(state['entity_id'], state)
+            for state in states
+            if self.wanted(state['entity_id'])
+        ]
+
+    def apply_event(self, event: Dict[str, Any]) -> List[Change]:
+        """Apply a state_changed event, ignoring other events."""
+        if event.get('event_type') != 'state_changed':
+            return []
+
+        data = event.get('data') or {}
+        entity_id = data.get('entity_id')
+        if not entity_id or not self.wanted(entity_id):
+            return []
+
+        new_state = data.get('new_state')
+        if new_state is None:
+            return self._remove(entity_id)
+
+        current = self.states.get(entity_id)
+        # ISO timestamps in UTC order the same as the times they stand for
+        if current and current.get('last_updated', '') > new_state.get(
+            'last_updated', ''
+        ):
+            return []
+
+        return [self._set(entity_id, new_state)]
+
+    def apply_compact(self, message: Dict[str, Any]) -> List[Change]:
+        """Apply a message of subscribe_entities."""
+        changes = []  # type: List[Change]
+
+        for entity_id, compact in (message.get(COMPACT_ADDED) or {}).items():
+            if self.wanted(entity_id):
+                changes.append(
+                    self._set(entity_id, decode_state(entity_id, compact))
+                )
+
+        for entity_id, diff in (message.get(COMPACT_CHANGED) or {}).items():
+            current = self.states.get(entity_id)
+            if current is not None:
+                changes.append(
+                    self._set(entity_id, apply_diff(current, diff))
+                )
+
+        for entity_id in message.get(COMPACT_REMOVED) or []:
+            changes.extend(self._remove(entity_id))
+
+        return changes
+
+    def apply(self, event: Dict[str, Any]) -> List[Change]:
+        """Apply an event or a message of subscribe_entities."""
+        if 'event_type' in event:
+            return self.apply_event(event)
+        return self.apply_compact(event)
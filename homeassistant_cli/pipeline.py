@@ -0,0 +1,372 @@
+"""Pipeline decoupling receiving messages from writing them out.
+
+The WebSocket receive loop only puts messages into a bounded queue. A
+writer thread takes them out in batches, formats them and writes every
+batch at once, thus slow formatting or output does not hold up reading
+from the server. Stages in front of the queue can thin out high-rate
+event streams.
+"""
+import collections
+import logging
+import threading
+import time
+from typing import (  # noqa: F401
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
+
+import homeassistant_cli.const as const
+
+_LOGGING = logging.getLogger(__name__)
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+SAMPLE = 'sample'
+OVERFLOW_POLICIES = [BLOCK, DROP_OLDEST, SAMPLE]
+
+
+class Pipeline:
+    """Bounded queue of messages with a writer thread draining it.
+
+    When the queue is full the overflow policy decides:
+
+    - block: the producer waits for room, nothing is lost. Not for
+      producers running on an event loop, which would stall meanwhile.
+    - drop-oldest: the oldest queued message makes room for the new one,
+      the default.
+    - sample: only every `sample_every`-th new message is kept, taking
+      the place of the oldest one, the others are dropped.
+    """
+
+    def __init__(
+        self,
+        formatter: Callable[[Any], str],
+        write: Callable[[str], None],
+        maxsize: int = const.DEFAULT_QUEUE_SIZE,
+        overflow: str = DROP_OLDEST,
+        batch_size: int = const.DEFAULT_BATCH_SIZE,
+        sample_every: int = const.DEFAULT_SAMPLE_EVERY,
+    ) -> None:
+        """Initialize the pipeline and start the writer."""
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+
+        self._formatter = formatter
+        self._write = write
+        self._maxsize = max(maxsize, 1)
+        self._overflow = overflow
+        self._batch_size = max(batch_size, 1)
+        self._sample_every = max(sample_every, 1)
+
+        self._queue = collections.deque()  # type: Deque[Any]
+        self._lock = threading.Condition()
+        self._closing = False
+        self._error = None  # type: Optional[BaseException]
+        self._overflowed = 0
+
+        self.counters = {
+            'received': 0,
+            'written': 0,
+            'dropped': 0,
+            'queued': 0,
+            'max_queued': 0,
+        }  # type: Dict[str, int]
+
+        self._writer = threading.Thread(
+            target=self._run, name='hass-cli-writer', daemon=True
+        )
+        self._writer.start()
+
+    def put(self, item: Any) -> None:
+        """Queue an item, applying the overflow policy if full.
+
+        Raises the error of the writer if it failed.
+        """
+        with self._lock:
+            if self._error:
+                raise self._error
+
+            self.counters['received'] += 1
+
+            if len(self._queue) >= self._maxsize:
+                if self._overflow == BLOCK:
+                    while (
+                        len(self._queue) >= self._maxsize and not self._error
+                    ):
+                        self._lock.wait()
+                    if self._error:
+                        raise self._error
+                else:
+                    self._overflowed += 1
+                    sampled = self._overflowed % self._sample_every == 0
+                    if self._overflow == SAMPLE and not sampled:
+                        self.counters['dropped'] += 1
+                        return
+                    self._queue.popleft()
+                    self.counters['dropped'] += 1
+            else:
+                self._overflowed = 0
+
+            self._queue.append(item)
+            self._count_queued()
+            self._lock.notify_all()
+
+    def _count_queued(self) -> None:
+        """Update the queue counters, lock must be held."""
+        self.counters['queued'] = len(self._queue)
+        self.counters['max_queued'] = max(
+            self.counters['max_queued'], len(self._queue)
+        )
+
+    def _take(self) -> List[Any]:
+        """Wait for and return the next batch, empty once closed."""
+        with self._lock:
+            while not self._queue and not self._closing:
+                self._lock.wait()
+
+            batch = [
+                self._queue.popleft()
+                for _ in range(min(self._batch_size, len(self._queue)))
+            ]
+            self._count_queued()
+            # wake up a blocked producer
+            self._lock.notify_all()
+            return batch
+
+    def _run(self) -> None:
+        """Format and write batches until closed and drained."""
+        try:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return
+                self._write_batch(batch)
+        except BaseException as ex:  # pylint: disable=broad-except
+            with self._lock:
+                self._error = ex
+                self._lock.notify_all()
+
+    def _write_batch(self, batch: Iterable[Any]) -> None:
+        """Format a batch of items and write them out at once."""
+        texts = [self._formatter(item) for item in batch]
+        self._write("".join(texts))
+        with self._lock:
+            self.counters['written'] += len(texts)
+
+    def close(self, drain: bool = True) -> None:
+        """Stop the writer, after writing what is queued if drain is set.
+
+        Raises the error of the writer if it failed.
+        """
+        with self._lock:
+            if not drain:
+                self.counters['dropped'] += len(self._queue)
+                self._queue.clear()
+            self._closing = True
+            self._lock.notify_all()
+
+        self._writer.join()
+
+        if self._error:
+            raise self._error
+
+    def __enter__(self) -> 'Pipeline':
+        """Return the pipeline."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Close the pipeline, draining it unless an error occurred."""
+        self.close(drain=args[0] is None)
+
+    def summary(self) -> str:
+        """Return the counters as text."""
+        return ", ".join(
+            f"{name.replace('_', ' ')}: {value}"
+            for name, value in self.counters.items()
+        )
+
+
+def _entity_id(event: Dict[str, Any]) -> Optional[str]:
+    """Return the entity of a state_changed event, None for others."""
+    if event.get('event_type') != 'state_changed':
+        return None
+    return cast(Optional[str], (event.get('data') or {}).get('entity_id'))
+
+
+def _state(state: Optional[Dict[str, Any]]) -> Tuple[Any, Any]:
+    """Return what makes up a distinct state."""
+    if not state:
+        return (None, None)
+    return (state.get('state'), state.get('attributes'))
+
+
+class Stage:
+    """Step of the pipeline handing on events to the next one.
+
+    Stages run before the queue, thus the events they drop never take
+    up room in it.
+    """
+
+    # counter reported in the summary
+    name = 'stage'
+
+    def __init__(self, downstream: Callable[[Any], None]) -> None:
+        """Initialize the stage."""
+        self.downstream = downstream
+        self.dropped = 0
+
+    def put(self, event: Dict[str, Any]) -> None:
+        """Hand on the event."""
+        self.downstream(event)
+
+    def close(self) -> None:
+        """Hand on anything held back."""
+
+
+class Deduplicate(Stage):
+    """Drop state changes that repeat the last state of the entity."""
+
+    name = 'duplicates'
+
+    def __init__(self, downstream: Callable[[Any], None]) -> None:
+        """Initialize the stage."""
+        super().__init__(downstream)
+        self._last = {}  # type: Dict[str, Tuple[Any, Any]]
+
+    def put(self, event: Dict[str, Any]) -> None:
+        """Hand on the event unless it repeats the last state."""
+        entity_id = _entity_id(event)
+        if entity_id is None:
+            self.downstream(event)
+            return
+
+        data = event['data']
+        state = _state(data.get('new_state'))
+        last = self._last.get(entity_id, _state(data.get('old_state')))
+        if state == last:
+            self.dropped += 1
+            return
+
+        self._last[entity_id] = state
+        self.downstream(event)
+
+
+class RateLimit(Stage):
+    """Let through at most `rate` events per second per event type."""
+
+    name = 'rate limited'
+
+    def __init__(
+        self,
+        downstream: Callable[[Any], None],
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the stage."""
+        super().__init__(downstream)
+        self._rate = rate
+        # rates below one event per second still let one through now and
+        # then, every 1/rate seconds
+        self._capacity = max(rate, 1.0)
+        self._clock = clock
+        # event type -> (tokens, time of the last refill)
+        self._buckets = {}  # type: Dict[str, Tuple[float, float]]
+
+    def put(self, event: Dict[str, Any]) -> None:
+        """Hand on the event if the budget of its type allows it."""
+        now = self._clock()
+        event_type = event.get('event_type', '')
+        tokens, last = self._buckets.get(event_type, (self._capacity, now))
+        tokens = min(self._capacity, tokens + (now - last) * self._rate)
+
+        if tokens < 1:
+            self._buckets[event_type] = (tokens, now)
+            self.dropped += 1
+            return
+
+        self._buckets[event_type] = (tokens - 1, now)
+        self.downstream(event)
+
+
+class Coalesce(Stage):
+    """Emit only the latest state change per entity every interval.
+
+    Other events are handed on right away.
+    """
+
+    name = 'coalesced'
+
+    def __init__(
+        self, downstream: Callable[[Any], None], interval: float
+    ) -> None:
+        """Initialize the stage and start flushing every interval."""
+        super().__init__(downstream)
+        self._interval = interval
+        self._held = {}  # type: Dict[str, Dict[str, Any]]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._run, name='hass-cli-coalesce', daemon=True
+        )
+        self._flusher.start()
+
+    def put(self, event: Dict[str, Any]) -> None:
+        """Hold the event until the next flush if it is a state change."""
+        entity_id = _entity_id(event)
+        if entity_id is None:
+            self.downstream(event)
+            return
+
+        with self._lock:
+            if entity_id in self._held:
+                self.dropped += 1
+            # keep the place of the first change within the interval
+            self._held[entity_id] = event
+
+    def flush(self) -> None:
+        """Hand on the held events."""
+        with self._lock:
+            held, self._held = self._held, {}
+        for event in held.values():
+            self.downstream(event)
+
+    def _run(self) -> None:
+        """Flush every interval until closed."""
+        while not self._stop.wait(self._interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop flushing and hand on what is held."""
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+
+
+def build_stages(
+    downstream: Callable[[Any], None],
+    dedupe: bool = False,
+    max_rate: Optional[float] = None,
+    coalesce: Optional[float] = None,
+) -> List[Stage]:
+    """Return the stages to put events through, the first one first.
+
+    Duplicates are dropped first, then rate limits apply and finally
+    state changes are coalesced.
+    """
+    stages = []  # type: List[Stage]
+    if coalesce:
+        stages.insert(0, Coalesce(downstream, coalesce))
+        downstream = stages[0].put
+    if max_rate:
+        stages.insert(0, RateLimit(downstream, max_rate))
+        downstream = stages[0].put
+    if dedupe:
+        stages.insert(0, Deduplicate(downstream))
+    return stages
@@ -0,0 +1,53 @@
+"""Agent plugin for Home Assistant CLI (hass-cli)."""
+import logging
+
+import click
+
+import homeassistant_cli.agent as agent
+from homeassistant_cli.cli import pass_context
+from homeassistant_cli.config import Configuration
+from homeassistant_cli.helper import format_output
+
+_LOGGING = logging.getLogger(__name__)
+
+
+@click.group('agent')
+@pass_context
+def cli(ctx):
+    """Keep a warm connection to speed up hass-cli calls."""
+
+
+@cli.command('run')
+@pass_context
+def run(ctx: Configuration):
+    """Run the agent until stopped.
+
+    While it runs, other hass-cli calls of the same user hand their
+    command to the agent, which already holds an authenticated
+    connection and the states of the server. Calls the agent does not
+    take, because it is busy or the command needs the terminal, run as
+    usual. Set HASS_NO_AGENT to never use the agent.
+
+    The socket is at HASS_AGENT_SOCKET, if set, or in the cache
+    directory.
+    """
+    try:
+        agent.Agent(ctx).serve()
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command()
+@pass_context
+def status(ctx: Configuration):
+    """Show the status of the running agent."""
+    ctx.auto_output('data')
+    ctx.echo(format_output(ctx, [agent.request('status')]))
+
+
+@cli.command()
+@pass_context
+def stop(ctx: Configuration):
+    """Stop the running agent."""
+    agent.request('stop')
+    ctx.vlog("Agent stopped")
@@ -11,6 +11,7 @@ from homeassistant_cli.cli import pass_context
 from homeassistant_cli.config import Configuration
 import homeassistant_cli.const as const
 import homeassistant_cli.helper as helper
+import homeassistant_cli.registry as registry
 import homeassistant_cli.remote as api
 
 _LOGGING = logging.getLogger(__name__)
@@ -88,8 +89,9 @@ def delete(ctx, names):
     ctx.auto_output("data")
     excode = 0
 
+    areas = registry.areas(api.get_areas(ctx))
     for name in names:
-        area = api.find_area(ctx, name)
+        area = areas.find(name)
         if not area:
             _LOGGING.error("Could not find area with id or name: %s", name)
             excode = 1
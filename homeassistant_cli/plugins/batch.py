@@ -0,0 +1,153 @@
+"""Batch plugin for Home Assistant CLI (hass-cli)."""
+
+import json
+import logging
+import shlex
+import sys
+from typing import IO, Iterator, List, Tuple
+
+import click
+
+from homeassistant_cli.cli import pass_context
+from homeassistant_cli.config import Configuration, Shared
+import homeassistant_cli.const as const
+from homeassistant_cli.exceptions import HomeAssistantCliError
+import homeassistant_cli.runner as runner
+
+_LOGGING = logging.getLogger(__name__)
+
+FORMATS = ['auto', 'cli', 'ndjson']
+
+
+def _parse(line: str, number: int, fmt: str) -> List[str]:
+    """Return the arguments of a command line of the batch."""
+    if fmt == 'ndjson' or (fmt == 'auto' and line.startswith(('[', '{'))):
+        try:
+            data = json.loads(line)
+        except ValueError as ex:
+            raise HomeAssistantCliError(f"Line {number}: {ex}")
+        if isinstance(data, dict):
+            data = data.get('args')
+        if not isinstance(data, list):
+            raise HomeAssistantCliError(
+                f"Line {number}: expected a list of arguments or an object"
+                " with `args`"
+            )
+        return [str(arg) for arg in data]
+
+    try:
+        return shlex.split(line, comments=True)
+    except ValueError as ex:
+        raise HomeAssistantCliError(f"Line {number}: {ex}")
+
+
+def _commands(file: IO[str], fmt: str) -> Iterator[Tuple[int, List[str]]]:
+    """Yield the numbered commands of the batch, skipping empty lines."""
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        args = _parse(line, number, fmt)
+        if args:
+            yield number, args
+
+
+@click.command('batch')
+@click.argument('file', type=click.File('r'), default='-')
+@click.option(
+    '--format',
+    'fmt',
+    type=click.Choice(FORMATS),
+    default='auto',
+    show_default=True,
+    help="How commands are written: hass-cli command lines, JSON lists "
+    "of arguments one per line, or either.",
+)
+@click.option(
+    '--concurrency',
+    '-j',
+    default=1,
+    show_default=True,
+    help="Commands run at once.",
+)
+@click.option(
+    '--ordered/--unordered',
+    default=True,
+    show_default=True,
+    help="Show output in the order of the commands or as they finish.",
+)
+@click.option(
+    '--status',
+    is_flag=True,
+    default=False,
+    help="Write a JSON line per command with its exit code to stderr.",
+)
+@click.option(
+    '--fail-fast',
+    is_flag=True,
+    default=False,
+    help="Run no more commands once one failed.",
+)
+@pass_context
+def cli(
+    ctx: Configuration, file, fmt, concurrency, ordered, status, fail_fast
+):
+    """Run many commands over one connection.
+
+    FILE holds one command per line, without the leading `hass-cli`, and
+    defaults to stdin. Global options given before `batch` apply to every
+    command that does not set them itself. Lines may also be JSON, as a
+    list of arguments or an object with `args`. Empty lines and lines
+    starting with # are skipped.
+
+    Example:
+
+        hass-cli -o json batch commands.txt
+
+    where commands.txt holds:
+
+        service call light.turn_on --arguments entity_id=light.kitchen
+        state get light.kitchen
+    """
+    # global options of this run are the defaults of every command
+    defaults = dict(click.get_current_context().find_root().params)
+    shared = Shared(remember=const.SHARED_DATA, pool_size=concurrency)
+
+    failed = 0
+    stopping = [False]
+
+    def commands() -> Iterator[Tuple[int, List[str]]]:
+        for command in _commands(file, fmt):
+            if stopping[0]:
+                return
+            yield command
+
+    try:
+        for result in runner.run_commands(
+            commands(), shared, defaults, concurrency, ordered
+        ):
+            click.echo(result.out, nl=False)
+            if result.err:
+                click.echo(result.err, nl=False, err=True)
+            if status:
+                click.echo(
+                    json.dumps(
+                        {
+                            'line': result.number,
+                            'args': result.args,
+                            'exit': result.code,
+                            'seconds': round(result.seconds, 3),
+                        }
+                    ),
+                    err=True,
+                )
+            sys.stdout.flush()
+            if result.code:
+                failed += 1
+                stopping[0] = fail_fast
+    finally:
+        shared.close()
+
+    if failed:
+        _LOGGING.error("%s command(s) failed", failed)
+        sys.exit(1)
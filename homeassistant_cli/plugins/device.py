@@ -9,7 +9,9 @@ import click
 import homeassistant_cli.autocompletion as autocompletion
 from homeassistant_cli.cli import pass_context
 from homeassistant_cli.config import Configuration
+import homeassistant_cli.const as const
 import homeassistant_cli.helper as helper
+import homeassistant_cli.registry as registry
 import homeassistant_cli.remote as api
 
 _LOGGING = logging.getLogger(__name__)
@@ -28,7 +30,7 @@ def listcmd(ctx: Configuration, devicefilter: str):
     """List all devices from Home Assistant."""
     ctx.auto_output("table")
 
-    areas = api.get_areas(ctx)
+    areas = registry.areas(api.get_areas(ctx))
 
     devices = api.get_devices(ctx)
 
@@ -42,10 +44,8 @@ def listcmd(ctx: Configuration, devicefilter: str):
             if devicefilterre.search(device['name']):
                 result.append(device)
 
-    for device in devices:
-        area = next(
-            (a for a in areas if a['area_id'] == device['area_id']), None
-        )
+    for device in result:
+        area = areas.get(device['area_id'])
         if area:
             device['area_name'] = area['name']
 
@@ -74,20 +74,27 @@ def listcmd(ctx: Configuration, devicefilter: str):
 @click.option(
     '--match', help="Expression used to find devices matching that name"
 )
+@click.option(
+    '--window',
+    default=const.DEFAULT_WS_WINDOW,
+    show_default=True,
+    help="Maximum number of updates in flight at once.",
+)
 @pass_context
 def assign(
     ctx: Configuration,
     area_id_or_name,
     names: List[str],
     match: Optional[str] = None,
+    window: int = const.DEFAULT_WS_WINDOW,
 ):
     """Update area on one or more devices.
 
     NAMES - one or more name or id (Optional)
     """
-    ctx.auto_output("data")
+    ctx.auto_output("table")
 
-    devices = api.get_devices(ctx)
+    devices = registry.devices(api.get_devices(ctx))
 
     result = []  # type: List[Dict]
 
@@ -100,7 +107,7 @@ def assign(
 
     if match:
         if match == ".*":
-            result = devices
+            result = list(devices)
         else:
             devicefilterre = re.compile(match)  # type: Pattern
 
@@ -109,35 +116,54 @@ def assign(
                     result.append(device)
 
     for id_or_name in names:
-        device = next(
-            (x for x in devices if x['id'] == id_or_name), None  # type: ignore
-        )
-        if not device:
-            device = next(
-                (x for x in devices if x['name'] == id_or_name),
-                None,  # type: ignore
-            )
-        if not device:
+        named = devices.find(id_or_name)
+        if not named:
             _LOGGING.error(
                 "Could not find device with id or name: %s", id_or_name
             )
             sys.exit(1)
-        result.append(device)
+        result.append(named)
 
-    for device in result:
-        output = api.assign_area(ctx, device['id'], area['area_id'])
+    # the same device may be both matched and named
+    devices_by_id = {device['id']: device for device in result}
+    device_ids = list(devices_by_id)
+
+    outputs = api.assign_areas(ctx, device_ids, area['area_id'], window)
+
+    report = []  # type: List[Dict[str, Any]]
+    for device_id, output in zip(device_ids, outputs):
+        name = devices_by_id[device_id]['name']
         if output['success']:
-            ctx.echo(
-                "Successfully assigned '{}' to '{}'".format(
-                    area['name'], device['name']
-                )
-            )
+            status, message = 'assigned', ''
         else:
+            status = 'failed'
+            message = output.get('error', {}).get('message', '')
             _LOGGING.error(
-                "Failed to assign '%s' to '%s'", area['name'], device['name']
+                "Failed to assign '%s' to '%s'", area['name'], name
             )
+        report.append(
+            {
+                'id': device_id,
+                'name': name,
+                'area': area['name'],
+                'status': status,
+                'message': message,
+            }
+        )
 
-            ctx.echo(str(output))
+    cols = [
+        ('ID', 'id'),
+        ('NAME', 'name'),
+        ('AREA', 'area'),
+        ('STATUS', 'status'),
+        ('MESSAGE', 'message'),
+    ]
+
+    ctx.echo(
+        helper.format_output(
+            ctx, report, columns=ctx.columns if ctx.columns else cols
+        )
+    )
 
 
 @cli.command('rename')
@@ -152,17 +178,7 @@ def rename(
     """Update name of specified device."""
     ctx.auto_output("data")
 
-    devices = api.get_devices(ctx)
-
-    device = next(
-        (x for x in devices if x['id'] == device_id_or_name),
-        None,  # type: ignore
-    )
-    if not device:
-        device = next(
-            (x for x in devices if x['name'] == device_id_or_name),
-            None,  # type: ignore
-        )
+    device = registry.devices(api.get_devices(ctx)).find(device_id_or_name)
     if not device:
         _LOGGING.error(
             "Could not find device with id or name: %s", device_id_or_name
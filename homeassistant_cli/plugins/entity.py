@@ -2,7 +2,7 @@
 import logging
 import re
 import sys
-from typing import Any, Dict, List, Optional, Pattern  # noqa
+from typing import Any, Callable, Dict, List, Optional, Pattern  # noqa
 
 import click
 
@@ -11,11 +11,17 @@ from homeassistant_cli.cli import pass_context
 from homeassistant_cli.config import Configuration
 import homeassistant_cli.const as const
 import homeassistant_cli.helper as helper
+import homeassistant_cli.registry as registry
 import homeassistant_cli.remote as api
 
 _LOGGING = logging.getLogger(__name__)
 
 
+def _area_id(entity: Dict, device: Optional[Dict]) -> Optional[str]:
+    """Return the area of the entity, else the one of its device."""
+    return entity.get('area_id') or (device or {}).get('area_id')
+
+
 @click.group('entity')
 @pass_context
 def cli(ctx):
@@ -24,31 +30,75 @@ def cli(ctx):
 
 @cli.command('list')
 @click.argument('entityfilter', default=".*", required=False)
+@click.option(
+    '--area',
+    help="Only entities in the area with this id or name, their own or "
+    "that of their device.",
+    shell_complete=autocompletion.areas,  # type: ignore
+)
+@click.option(
+    '--device-manufacturer',
+    'manufacturer',
+    help="Only entities of devices whose manufacturer matches this "
+    "expression.",
+)
+@click.option('--platform', help="Only entities of this integration.")
 @pass_context
-def listcmd(ctx: Configuration, entityfilter: str):
-    """List all entities from Home Assistant."""
-    ctx.auto_output("table")
+def listcmd(
+    ctx: Configuration,
+    entityfilter: str,
+    area: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    platform: Optional[str] = None,
+):
+    """List all entities from Home Assistant.
 
-    areas = api.get_areas(ctx)
+    The area of an entity is its own or, if it has none, the one of its
+    device.
+    """
+    ctx.auto_output("table")
 
-    entities = api.get_entities(ctx)
+    registries = api.get_registries(ctx)
+    areas = registry.areas(registries['areas'])
+    devices = registry.devices(registries['devices'])
 
-    result = []  # type: List[Dict]
-    if entityfilter == ".*":
-        result = entities
-    else:
+    area_id = None
+    if area:
+        found = areas.find(area)
+        if not found:
+            _LOGGING.error("Could not find area with id or name: %s", area)
+            sys.exit(1)
+        area_id = found['area_id']
+
+    # cheapest tests first, the expressions only for what is left
+    predicates = []  # type: List[Callable[[Dict, Optional[Dict]], bool]]
+    if platform:
+        predicates.append(lambda entity, _: entity['platform'] == platform)
+    if area_id is not None:
+        predicates.append(
+            lambda entity, device: _area_id(entity, device) == area_id
+        )
+    if manufacturer:
+        manufacturerre = re.compile(manufacturer)  # type: Pattern
+        predicates.append(
+            lambda _, device: bool(
+                manufacturerre.search((device or {}).get('manufacturer') or '')
+            )
+        )
+    if entityfilter != ".*":
         entityfilterre = re.compile(entityfilter)  # type: Pattern
-
-        for entity in entities:
-            if entityfilterre.search(entity['entity_id']):
-                result.append(entity)
-
-    for entity in entities:
-        area = next(
-            (a for a in areas if a['area_id'] == entity['area_id']), None
+        predicates.append(
+            lambda entity, _: bool(entityfilterre.search(entity['entity_id']))
         )
-        if area:
-            entity['area_name'] = area['name']
+
+    result = []  # type: List[Dict]
+    for entity in registries['entities']:
+        device = devices.get(entity.get('device_id'))
+        if all(predicate(entity, device) for predicate in predicates):
+            name = areas.name(_area_id(entity, device))
+            if name:
+                entity['area_name'] = name
+            result.append(entity)
 
     cols = [
         ('ENTITY_ID', 'entity_id'),
@@ -77,20 +127,27 @@ def listcmd(ctx: Configuration, entityfilter: str):
 @click.option(
     '--match', help="Expression used to find entities matching that name"
 )
+@click.option(
+    '--window',
+    default=const.DEFAULT_WS_WINDOW,
+    show_default=True,
+    help="Maximum number of updates in flight at once.",
+)
 @pass_context
 def assign(
     ctx: Configuration,
     area_id_or_name,
     names: List[str],
     match: Optional[str] = None,
+    window: int = const.DEFAULT_WS_WINDOW,
 ):
     """Update area on one or more entities.
 
     NAMES - one or more name or id (Optional)
     """
-    ctx.auto_output("data")
+    ctx.auto_output("table")
 
-    entities = api.get_entities(ctx)
+    entities = registry.entities(api.get_entities(ctx))
 
     result = []  # type: List[Dict]
 
@@ -103,7 +160,7 @@ def assign(
 
     if match:
         if match == ".*":
-            result = entities
+            result = list(entities)
         else:
             entityfilterre = re.compile(match)  # type: Pattern
 
@@ -112,39 +169,52 @@ def assign(
                     result.append(entity)
 
     for id_or_name in names:
-        entity = next(
-            (x for x in entities if x['entity_id'] == id_or_name), None  # type: ignore
-        )
-        if not entity:
-            entity = next(
-                (x for x in entities if x['name'] == id_or_name),
-                None,  # type: ignore
-            )
-        if not entity:
+        named = entities.find(id_or_name)
+        if not named:
             _LOGGING.error(
                 "Could not find entity with id or name: %s", id_or_name
             )
             sys.exit(1)
-        result.append(entity)
+        result.append(named)
 
-    for entity in result:
-        output = api.assign_entity_area(
-            ctx, entity['entity_id'], area['area_id']
-        )
+    # the same entity may be both matched and named
+    entity_ids = list(dict.fromkeys(entity['entity_id'] for entity in result))
+
+    outputs = api.assign_entity_areas(
+        ctx, entity_ids, area['area_id'], window
+    )
+
+    report = []  # type: List[Dict[str, Any]]
+    for entity_id, output in zip(entity_ids, outputs):
         if output['success']:
-            ctx.echo(
-                "Successfully assigned '{}' to '{}'".format(
-                    area['name'], entity['entity_id']
-                )
-            )
+            status, message = 'assigned', ''
         else:
+            status = 'failed'
+            message = output.get('error', {}).get('message', '')
             _LOGGING.error(
-                "Failed to assign '%s' to '%s'",
-                area['name'],
-                entity['entity_id'],
+                "Failed to assign '%s' to '%s'", area['name'], entity_id
             )
+        report.append(
+            {
+                'entity_id': entity_id,
+                'area': area['name'],
+                'status': status,
+                'message': message,
+            }
+        )
+
+    cols = [
+        ('ENTITY_ID', 'entity_id'),
+        ('AREA', 'area'),
+        ('STATUS', 'status'),
+        ('MESSAGE', 'message'),
+    ]
 
-            ctx.echo(str(output))
+    ctx.echo(
+        helper.format_output(
+            ctx, report, columns=ctx.columns if ctx.columns else cols
+        )
+    )
 
 
 @cli.command('rename')
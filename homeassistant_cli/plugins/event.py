@@ -1,16 +1,20 @@
 """Event plugin for Home Assistant CLI (hass-cli)."""
+import io
 import json as json_
 import logging
-from typing import Dict
+import sys
+from typing import Any, Dict
 
 import click
 
 import homeassistant_cli.autocompletion as autocompletion
 from homeassistant_cli.cli import pass_context
 from homeassistant_cli.config import Configuration
-from homeassistant_cli.exceptions import HomeAssistantCliError
+import homeassistant_cli.const as const
 from homeassistant_cli.helper import format_output, raw_format_output
+import homeassistant_cli.pipeline as pipeline
 import homeassistant_cli.remote as api
+import homeassistant_cli.yaml as yaml
 
 _LOGGING = logging.getLogger(__name__)
 
@@ -60,29 +64,104 @@ def fire(ctx: Configuration, event, json):
 
 @cli.command()
 @click.argument('event_type', required=False)
+@click.option(
+    '--queue-size',
+    default=const.DEFAULT_QUEUE_SIZE,
+    show_default=True,
+    help="Events buffered while they wait to be written.",
+)
+@click.option(
+    '--overflow',
+    type=click.Choice(pipeline.OVERFLOW_POLICIES),
+    default=pipeline.DROP_OLDEST,
+    show_default=True,
+    help="What to do when the buffer is full: wait for room, drop the "
+    "oldest event or keep only a sample of the new events. Waiting holds "
+    "up the connection, which the server may close then.",
+)
+@click.option(
+    '--coalesce',
+    type=float,
+    help="Only show the latest state change per entity every this many "
+    "seconds.",
+)
+@click.option(
+    '--max-rate',
+    type=float,
+    help="Show at most this many events per second per event type.",
+)
+@click.option(
+    '--dedupe',
+    is_flag=True,
+    default=False,
+    help="Skip state changes that repeat the last state of the entity.",
+)
 @pass_context
-def watch(ctx: Configuration, event_type):
+def watch(
+    ctx: Configuration,
+    event_type,
+    queue_size,
+    overflow,
+    coalesce,
+    max_rate,
+    dedupe,
+):
     """Subscribe and print events.
 
     EVENT-TYPE even type to subscribe to. if empty subscribe to all.
+
+    Events are received and written by separate threads. With -v the
+    number of received, written and dropped events is shown at the end.
+
+    For busy installations `--dedupe`, `--max-rate` and `--coalesce` thin
+    out the events before they are queued, in that order.
     """
     frame = {'type': 'subscribe_events'}
 
     cols = [('EVENT_TYPE', 'event_type'), ('DATA', '$.data')]
 
-    def _msghandler(msg: Dict) -> None:
-        if msg['type'] == 'event':
-            ctx.echo(
-                format_output(
-                    ctx,
-                    msg['event'],
-                    columns=ctx.columns if ctx.columns else cols,
-                )
-            )
-        elif msg['type'] == 'auth_invalid':
-            raise HomeAssistantCliError(msg.get('message'))
+    output = ctx.output
+    if output == 'auto':
+        output = const.DEFAULT_DATAOUTPUT
+
+    def _format(event: Any) -> str:
+        if output == 'yaml':
+            # one document per event keeps the output a valid YAML stream
+            stream = io.StringIO()
+            yaml.dumpyaml_all([event], stream)
+            return stream.getvalue()
+        text = format_output(
+            ctx, event, columns=ctx.columns if ctx.columns else cols
+        )
+        return text + "\n"
+
+    def _write(text: str) -> None:
+        click.echo(text, nl=False)
+        sys.stdout.flush()
 
     if event_type:
         frame['event_type'] = event_type
 
-    api.wsapi(ctx, frame, _msghandler)
+    events = pipeline.Pipeline(
+        _format, _write, maxsize=queue_size, overflow=overflow
+    )
+    stages = pipeline.build_stages(events.put, dedupe, max_rate, coalesce)
+    put = stages[0].put if stages else events.put
+
+    def _msghandler(msg: Dict) -> None:
+        if msg['type'] == 'event':
+            put(msg['event'])
+
+    try:
+        with events:
+            try:
+                api.wsapi(ctx, frame, _msghandler)
+            finally:
+                for stage in stages:
+                    stage.close()
+    finally:
+        if ctx.verbose or events.counters['dropped']:
+            summary = [events.summary()] + [
+                f"{stage.name}: {stage.dropped}" for stage in stages
+            ]
+            click.echo(f"Events {', '.join(summary)}", err=True)
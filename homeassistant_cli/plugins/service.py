@@ -9,7 +9,11 @@ import click
 import homeassistant_cli.autocompletion as autocompletion
 from homeassistant_cli.cli import pass_context
 from homeassistant_cli.config import Configuration
-from homeassistant_cli.helper import format_output, to_attributes
+from homeassistant_cli.helper import (
+    format_output,
+    split_entities,
+    to_attributes,
+)
 import homeassistant_cli.remote as api
 
 _LOGGING = logging.getLogger(__name__)
@@ -85,8 +89,15 @@ def list_cmd(ctx: Configuration, servicefilter):
 @click.option(
     '--arguments', help="Comma separated key/value pairs to use as arguments."
 )
+@click.option(
+    '--parallel',
+    default=1,
+    show_default=True,
+    help="Split the entity_id argument into chunks and call the service "
+    "for up to this many chunks concurrently.",
+)
 @pass_context
-def call(ctx: Configuration, service, arguments):
+def call(ctx: Configuration, service, arguments, parallel):
     """Call a service."""
     ctx.auto_output('data')
     _LOGGING.debug("service call <start>")
@@ -100,7 +111,19 @@ def call(ctx: Configuration, service, arguments):
 
     _LOGGING.debug("service call_service")
 
-    result = api.call_service(ctx, parts[0], parts[1], data)
+    entities = [e for e in data.get('entity_id', '').split(',') if e]
+    if parallel > 1 and len(entities) > 1:
+        calls = [
+            (parts[0], parts[1], {**data, 'entity_id': group})
+            for group in split_entities(entities, parallel)
+        ]
+        result = [
+            state
+            for states in api.call_services(ctx, calls, parallel)
+            for state in states
+        ]
+    else:
+        result = api.call_service(ctx, parts[0], parts[1], data)
 
     _LOGGING.debug("Formatting output")
     ctx.echo(format_output(ctx, result))
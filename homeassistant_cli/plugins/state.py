@@ -2,7 +2,18 @@
 import json as json_
 import logging
 import re
-from typing import Any, Dict, List, Pattern  # noqa
+import sys
+from typing import (  # noqa
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Set,
+)
 
 import click
 
@@ -11,7 +22,11 @@ from homeassistant_cli.cli import pass_context
 from homeassistant_cli.config import Configuration
 import homeassistant_cli.const as const
 import homeassistant_cli.helper as helper
+import homeassistant_cli.mirror as mirror
+import homeassistant_cli.pipeline as pipeline
+import homeassistant_cli.records as records
 import homeassistant_cli.remote as api
+import homeassistant_cli.where as where
 
 _LOGGING = logging.getLogger(__name__)
 
@@ -66,30 +81,139 @@ def delete(ctx: Configuration, entity):
 
 @cli.command('list')
 @click.argument('entityfilter', default=".*", required=False)
+@click.option(
+    '--watch',
+    is_flag=True,
+    default=False,
+    help="Keep running and show the states that change. Removed entities "
+    "are shown without a state.",
+)
+@click.option(
+    '--where',
+    'condition',
+    callback=lambda ctx, param, value: (
+        where.compile_where(value) if value else None
+    ),
+    help="Only states matching the expression, like "
+    "'domain == sensor and state > 30'.",
+)
 @pass_context
-def list_command(ctx, entityfilter):
-    """List all state from Home Assistant."""
+def list_command(ctx, entityfilter, watch, condition):
+    """List all state from Home Assistant.
+
+    Expressions for --where compare fields with ==, !=, <, <=, >, >=,
+    ~ (glob), !~, =~ (regular expression) or `in (a, b)` and combine
+    with and, or, not and parentheses. Fields are entity_id, domain,
+    state, last_changed, last_updated and paths like attributes.unit.
+    Numbers compare as numbers and times as `1h ago` or ISO time:
+
+        hass-cli state list --where 'attributes.battery_level < 15'
+
+        hass-cli state list --where 'domain in (light, switch) and
+        state == on and last_changed < 6h ago'
+    """
     ctx.auto_output("table")
-    states = api.get_states(ctx)
-    entity_filter = entityfilter
+    columns = ctx.columns if ctx.columns else const.COLUMNS_ENTITIES
+
+    # a table needs only the fields shown, sorted by and filtered on
+    fields = None
+    if ctx.output == 'table':
+        fields = helper.required_fields(
+            columns,
+            ctx.sort_by,
+            ['entity_id'] + (condition.fields if condition else []),
+        )
+
+    if watch:
+        _watch(ctx, entityfilter, columns, condition, fields)
+        return
+
+    states = api.iter_states(ctx, fields)
 
-    result = []  # type: List[Dict]
-    if entity_filter == ".*":
-        result = states
+    if entityfilter == ".*":
+        result = states  # type: Iterable[Dict]
     else:
-        entity_filter_re = re.compile(entity_filter)  # type: Pattern
+        entity_filter_re = re.compile(entityfilter)  # type: Pattern
 
-        for entity in states:
-            if entity_filter_re.search(entity['entity_id']):
-                result.append(entity)
-    ctx.echo(
-        helper.format_output(
-            ctx,
-            result,
-            columns=ctx.columns if ctx.columns else const.COLUMNS_ENTITIES,
+        result = (
+            entity
+            for entity in states
+            if entity_filter_re.search(entity['entity_id'])
         )
+    if condition:
+        result = filter(condition, result)
+
+    helper.stream_output(ctx, result, columns=columns)
+
+
+def _watch(
+    ctx: Configuration,
+    entityfilter: str,
+    columns: List,
+    condition: Optional[Callable[[Dict], bool]] = None,
+    fields: Optional[List[str]] = None,
+) -> None:
+    """Show the matching states, then the ones changing, until stopped.
+
+    The states are fetched once and kept up to date in a local mirror,
+    thus only changes travel over the network. With a condition only
+    states meeting it and removals are shown. Given fields, only those
+    of the states are kept, as records.
+    """
+    keep = (
+        helper.projection(fields + ['last_updated'])
+        if fields is not None
+        else None
     )
 
+    def _record(state: Dict[str, Any]) -> records.State:
+        return records.State.from_dict(keep(state) if keep else state)
+
+    states = mirror.StateMirror(entityfilter, _record)
+    first = [True]
+
+    def _format(changes: List[mirror.Change]) -> str:
+        rows = [
+            state if state is not None else {'entity_id': entity_id}
+            for entity_id, state in changes
+        ]
+        # only the first table, holding all states, gets headers
+        text = helper.raw_format_output(
+            ctx.output,
+            rows,
+            ctx.yaml(),
+            columns,
+            ctx.no_headers or not first[0],
+            ctx.table_format,
+            ctx.sort_by,
+        )
+        first[0] = False
+        return text + "\n"
+
+    def _write(text: str) -> None:
+        click.echo(text, nl=False)
+        sys.stdout.flush()
+
+    output = pipeline.Pipeline(_format, _write)
+
+    def _update(events: List[Dict]) -> None:
+        changes = [
+            (entity_id, state if state is None else state.as_dict())
+            for event in events
+            for entity_id, state in states.apply(event)
+        ]
+        if condition is not None:
+            changes = [
+                change
+                for change in changes
+                if change[1] is None or condition(change[1])
+            ]
+        if changes:
+            output.put(changes)
+
+    with output:
+        api.subscribe_states(ctx, _update)
+
 
 @cli.command()
 @click.argument(
@@ -193,11 +317,24 @@ def _report(ctx: Configuration, result: List[Dict[str, Any]], action: str):
         ctx.echo("%s entities reported to be %s", len(result), action)
 
 
-def _homeassistant_cmd(ctx: Configuration, entities, cmd, action):
+def _homeassistant_cmd(
+    ctx: Configuration, entities, cmd, action, parallel: int = 1
+):
     """Run command on Home Assistant."""
-    data = {'entity_id': entities}
     _LOGGING.debug("%s on %s", cmd, entities)
-    result = api.call_service(ctx, 'homeassistant', cmd, data)
+    if parallel > 1:
+        calls = [
+            ('homeassistant', cmd, {'entity_id': group})
+            for group in helper.split_entities(list(entities), parallel)
+        ]
+        result = [
+            state
+            for states in api.call_services(ctx, calls, parallel)
+            for state in states
+        ]
+    else:
+        data = {'entity_id': entities}
+        result = api.call_service(ctx, 'homeassistant', cmd, data)
 
     _report(ctx, result, action)
 
@@ -209,11 +346,18 @@ def _homeassistant_cmd(ctx: Configuration, entities, cmd, action):
     required=True,
     shell_complete=autocompletion.entities,  # type: ignore
 )
+@click.option(
+    '--parallel',
+    default=1,
+    show_default=True,
+    help="Split the entities by domain and send up to this many "
+    "service calls concurrently.",
+)
 @pass_context
-def toggle(ctx: Configuration, entities):
+def toggle(ctx: Configuration, entities, parallel):
     """Toggle state for one or more entities in Home Assistant."""
     ctx.auto_output("table")
-    _homeassistant_cmd(ctx, entities, 'toggle', "toggled")
+    _homeassistant_cmd(ctx, entities, 'toggle', "toggled", parallel)
 
 
 @cli.command('turn_off')
@@ -223,11 +367,18 @@ def toggle(ctx: Configuration, entities):
     required=True,
     shell_complete=autocompletion.entities,  # type: ignore
 )
+@click.option(
+    '--parallel',
+    default=1,
+    show_default=True,
+    help="Split the entities by domain and send up to this many "
+    "service calls concurrently.",
+)
 @pass_context
-def off_cmd(ctx: Configuration, entities):
+def off_cmd(ctx: Configuration, entities, parallel):
     """Turn entity off."""
     ctx.auto_output("table")
-    _homeassistant_cmd(ctx, entities, 'turn_off', "turned off")
+    _homeassistant_cmd(ctx, entities, 'turn_off', "turned off", parallel)
 
 
 @cli.command('turn_on')
@@ -237,11 +388,18 @@ def off_cmd(ctx: Configuration, entities):
     required=True,
     shell_complete=autocompletion.entities,  # type: ignore
 )
+@click.option(
+    '--parallel',
+    default=1,
+    show_default=True,
+    help="Split the entities by domain and send up to this many "
+    "service calls concurrently.",
+)
 @pass_context
-def on_cmd(ctx: Configuration, entities):
+def on_cmd(ctx: Configuration, entities, parallel):
     """Turn entity on."""
     ctx.auto_output("table")
-    _homeassistant_cmd(ctx, entities, 'turn_on', "turned on")
+    _homeassistant_cmd(ctx, entities, 'turn_on', "turned on", parallel)
 
 
 @cli.command()
@@ -265,11 +423,40 @@ def on_cmd(ctx: Configuration, entities):
     help="End of the period to query history from. A timestamp or relative "
     "expression relative to now. Defaults to now.",
 )
+@click.option(
+    '--slice',
+    'slice_',
+    required=False,
+    help="Query the period in slices of this length, i.e. `6h` or `1d`.",
+)
+@click.option(
+    '--group-size',
+    type=int,
+    required=False,
+    help="Query at most this many entities per request.",
+)
+@click.option(
+    '--parallel',
+    default=1,
+    show_default=True,
+    help="Fetch up to this many slices or groups concurrently.",
+)
 @pass_context
-def history(ctx: Configuration, entities: List, since: str, end: str):
+def history(
+    ctx: Configuration,
+    entities: List,
+    since: str,
+    end: str,
+    slice_: Optional[str],
+    group_size: Optional[int],
+    parallel: int,
+):
     """Get state history from Home Assistant, all or per entity.
 
     You can use `--since` and `--end` to narrow or expand the time period.
+    Long periods or many entities can be split with `--slice` and
+    `--group-size` and fetched concurrently with `--parallel`. A failing
+    slice is retried on its own.
 
     Both options accepts a full timestamp i.e. `2016-02-06T22:15:00+00:00`
     or a relative expression i.e. `3m` for three minutes, `5d` for 5 days.
@@ -298,25 +485,50 @@ def history(ctx: Configuration, entities: List, since: str, end: str):
             )
         )
 
-    data = api.get_history(ctx, list(entities), start_time, end_time)
-
-    result = []  # type: List[Dict[str, Any]]
-    entity_count = 0
-    for item in data:
-        result.extend(item)  # type: ignore
-        entity_count = entity_count + 1
-
-    click.echo(
-        helper.format_output(
-            ctx,
-            result,
-            columns=ctx.columns if ctx.columns else const.COLUMNS_ENTITIES,
+    if slice_ or group_size:
+        slices = api.history_slices(
+            list(entities),
+            start_time,
+            end_time,
+            helper.to_timedelta(slice_) if slice_ else None,
+            group_size,
         )
+
+        def progress(done: int, total: int, part: api.HistorySlice) -> None:
+            if ctx.verbose:
+                click.echo(
+                    'Fetched slice {}/{}: {} to {}'.format(
+                        done, total, part[1].isoformat(), part[2].isoformat()
+                    ),
+                    err=True,
+                )
+
+        data = api.get_history_sliced(
+            ctx, slices, parallel, progress
+        )  # type: Iterator[Dict[str, Any]]
+    else:
+        data = api.iter_history(ctx, list(entities), start_time, end_time)
+
+    rows = 0
+    seen = set()  # type: Set[str]
+
+    def counted() -> Iterator[Dict[str, Any]]:
+        nonlocal rows
+        for row in data:
+            rows += 1
+            if 'entity_id' in row:
+                seen.add(row['entity_id'])
+            yield row
+
+    helper.stream_output(
+        ctx,
+        counted(),
+        columns=ctx.columns if ctx.columns else const.COLUMNS_ENTITIES,
     )
 
     if ctx.verbose:
         click.echo(
             'History with {} rows from {} entities found.'.format(
-                len(result), entity_count
+                rows, len(seen)
             )
         )
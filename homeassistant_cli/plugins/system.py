@@ -22,7 +22,9 @@ def cli(ctx):
 @pass_context
 def log(ctx):
     """Get errors from Home Assistant."""
-    click.echo(api.get_raw_error_log(ctx))
+    for chunk in api.iter_raw_error_log(ctx):
+        click.echo(chunk, nl=False)
+    click.echo()
 
 
 @cli.command()
@@ -0,0 +1,266 @@
+"""Compact records of states and registry entries kept in memory.
+
+Home Assistant sends states and registry entries as dictionaries. The
+processes keeping many of them for long, like the agent mirroring all
+states or batch mode remembering the registries, keep them as records
+instead: fields live in slots, strings repeated across records, like
+domains and platforms, are interned and the attributes of a state stay
+JSON text until read.
+
+Records read like the dictionaries they were made from, which
+`as_dict()` returns again. Code changing the data works on those.
+"""
+from collections.abc import Mapping
+import json
+import sys
+from typing import Any, Dict, Iterator, Optional, Tuple, Type  # noqa: F401
+
+# fields missing from the dictionary a record was made from
+_ABSENT = object()
+
+_CONTEXT_FIELDS = ('id', 'parent_id', 'user_id')
+
+
+def _intern(value: Any) -> Any:
+    """Return strings interned, other values as they are."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record(Mapping):
+    """Read-only record with the fields of an entry in slots.
+
+    Keys outside of `FIELDS` are kept as they are, thus no data is lost
+    whatever the version of Home Assistant.
+    """
+
+    __slots__ = ('_extra',)
+    _extra: Optional[Dict[str, Any]]
+
+    # fields in slots of the same name and the ones of those interned
+    FIELDS = ()  # type: Tuple[str, ...]
+    INTERNED = frozenset()  # type: frozenset
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Record':
+        """Return the record of an entry."""
+        record = cls.__new__(cls)
+        for name in cls.FIELDS:
+            value = data.get(name, _ABSENT)
+            if name in cls.INTERNED:
+                value = _intern(value)
+            setattr(record, name, value)
+        record._set_extra(data, cls.FIELDS)
+        return record
+
+    def _set_extra(self, data: Dict[str, Any], known: Tuple[str, ...]) -> None:
+        """Keep the keys of data not in known."""
+        extra = {key: value for key, value in data.items() if key not in known}
+        self._extra = extra or None
+
+    def _field(self, key: str) -> Any:
+        """Return the value of a key, _ABSENT if there is none."""
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self._extra.get(key, _ABSENT) if self._extra else _ABSENT
+
+    def __getitem__(self, key: str) -> Any:
+        """Return the value of a key like a dictionary would."""
+        value = self._field(key)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys of the entry."""
+        for name in self.FIELDS:
+            if self._field(name) is not _ABSENT:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        """Return the number of keys of the entry."""
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        """Return the representation of the record."""
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the entry as the dictionary the record was made from."""
+        return {key: self._field(key) for key in self}
+
+
+class State(Record):
+    """State of an entity."""
+
+    __slots__ = (
+        'entity_id',
+        'domain',
+        'state',
+        'last_changed',
+        'last_updated',
+        '_attributes',
+        '_context',
+    )
+    # declared for type checking only, values live in the slots
+    entity_id: Any
+    domain: Optional[str]
+    state: Any
+    last_changed: Any
+    last_updated: Any
+    _attributes: Any
+    _context: Any
+
+    FIELDS = (
+        'entity_id',
+        'state',
+        'attributes',
+        'last_changed',
+        'last_updated',
+        'context',
+    )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'State':
+        """Return the record of a state."""
+        record = cls.__new__(cls)
+        record.entity_id = entity_id = data.get('entity_id', _ABSENT)
+        record.domain = (
+            sys.intern(entity_id.split('.', 1)[0])
+            if isinstance(entity_id, str)
+            else None
+        )
+        record.state = _intern(data.get('state', _ABSENT))
+
+        record.last_changed = data.get('last_changed', _ABSENT)
+        last_updated = data.get('last_updated', _ABSENT)
+        # mostly the same time, kept once then
+        record.last_updated = (
+            record.last_changed
+            if last_updated == record.last_changed
+            else last_updated
+        )
+
+        attributes = data.get('attributes', _ABSENT)
+        record._attributes = (
+            json.dumps(attributes, separators=(',', ':'))
+            if isinstance(attributes, dict)
+            else attributes
+        )
+
+        context = data.get('context', _ABSENT)
+        if isinstance(context, dict) and set(context) == set(_CONTEXT_FIELDS):
+            record._context = (
+                context['id'],
+                context['parent_id'],
+                _intern(context['user_id']),
+            )
+        else:
+            record._context = context
+
+        record._set_extra(data, cls.FIELDS)
+        return record
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """Return the attributes, decoded anew on every access."""
+        if isinstance(self._attributes, str):
+            return json.loads(self._attributes)  # type: ignore
+        if self._attributes is _ABSENT or self._attributes is None:
+            return {}
+        return self._attributes  # type: ignore
+
+    @property
+    def context(self) -> Optional[Dict[str, Any]]:
+        """Return the context of the state."""
+        if isinstance(self._context, tuple):
+            return dict(zip(_CONTEXT_FIELDS, self._context))
+        if self._context is _ABSENT:
+            return None
+        return self._context  # type: ignore
+
+    def _field(self, key: str) -> Any:
+        """Return the value of a key, _ABSENT if there is none."""
+        if key == 'attributes':
+            if self._attributes is _ABSENT:
+                return _ABSENT
+            return self.attributes
+        if key == 'context':
+            if self._context is _ABSENT:
+                return _ABSENT
+            return self.context
+        return super()._field(key)
+
+
+class Entity(Record):
+    """Entry of the entity registry."""
+
+    __slots__ = (
+        'entity_id',
+        'name',
+        'platform',
+        'device_id',
+        'area_id',
+        'config_entry_id',
+        'disabled_by',
+        'hidden_by',
+        'entity_category',
+        'icon',
+    )
+    FIELDS = __slots__
+    INTERNED = frozenset(
+        (
+            'platform',
+            'device_id',
+            'area_id',
+            'config_entry_id',
+            'disabled_by',
+            'hidden_by',
+            'entity_category',
+        )
+    )
+
+
+class Device(Record):
+    """Entry of the device registry."""
+
+    __slots__ = (
+        'id',
+        'name',
+        'name_by_user',
+        'manufacturer',
+        'model',
+        'sw_version',
+        'area_id',
+        'via_device_id',
+        'config_entries',
+        'disabled_by',
+    )
+    FIELDS = __slots__
+    INTERNED = frozenset(
+        (
+            'manufacturer',
+            'model',
+            'sw_version',
+            'area_id',
+            'via_device_id',
+            'disabled_by',
+        )
+    )
+
+
+class Area(Record):
+    """Entry of the area registry."""
+
+    __slots__ = ('area_id', 'name', 'picture')
+    FIELDS = __slots__
+    INTERNED = frozenset(('area_id',))
+
+
+# the records of the registries remembered by name, see config.Shared
+REGISTRIES = {
+    'areas': Area,
+    'devices': Device,
+    'entities': Entity,
+}  # type: Dict[str, Type[Record]]
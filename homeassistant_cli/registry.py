@@ -0,0 +1,76 @@
+"""Registries of Home Assistant indexed for lookups and joins.
+
+A registry is built once per command from the entries the server sent.
+Indexes by a field are built on first use, thus every lookup after that
+is a dictionary access rather than a scan of all entries.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional  # noqa: F401
+
+
+class Registry:
+    """Entries of a registry, looked up by id and by their other fields."""
+
+    def __init__(
+        self, entries: Iterable[Dict[str, Any]], id_field: str
+    ) -> None:
+        """Initialize with the entries and the field holding their id."""
+        self.entries = list(entries)
+        self.id_field = id_field
+        self._indexes = {}  # type: Dict[str, Dict[Any, List[Dict[str, Any]]]]
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the entries in the order of the server."""
+        return iter(self.entries)
+
+    def _index(self, field: str) -> Dict[Any, List[Dict[str, Any]]]:
+        """Return the entries by the value of field."""
+        index = self._indexes.get(field)
+        if index is None:
+            index = {}
+            for entry in self.entries:
+                index.setdefault(entry.get(field), []).append(entry)
+            self._indexes[field] = index
+        return index
+
+    def lookup(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Return the entries having value in field."""
+        return self._index(field).get(value, [])
+
+    def get(self, entry_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the entry with the id, if any."""
+        if entry_id is None:
+            return None
+        entries = self.lookup(self.id_field, entry_id)
+        return entries[0] if entries else None
+
+    def find(self, id_or_name: str) -> Optional[Dict[str, Any]]:
+        """Return the entry first by id and if no match by name."""
+        entry = self.get(id_or_name)
+        if entry is None:
+            entries = self.lookup('name', id_or_name)
+            entry = entries[0] if entries else None
+        return entry
+
+    def name(self, entry_id: Optional[str]) -> Optional[str]:
+        """Return the name of the entry with the id, if any."""
+        entry = self.get(entry_id)
+        return entry['name'] if entry else None
+
+
+def areas(entries: Iterable[Dict[str, Any]]) -> Registry:
+    """Return the area registry of the entries."""
+    return Registry(entries, 'area_id')
+
+
+def devices(entries: Iterable[Dict[str, Any]]) -> Registry:
+    """Return the device registry of the entries."""
+    return Registry(entries, 'id')
+
+
+def entities(entries: Iterable[Dict[str, Any]]) -> Registry:
+    """Return the entity registry of the entries."""
+    return Registry(entries, 'entity_id')
@@ -5,21 +5,49 @@ If a connection error occurs while communicating with the API a
 HomeAssistantCliError will be raised.
 """
 import asyncio
+import codecs
 import collections
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import enum
+import functools
+import heapq
+import itertools
 import json
 import logging
-from typing import Any, Callable, Dict, List, Optional, cast
+import threading
+from typing import (  # noqa: F401
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    cast,
+)
 import urllib.parse
 from urllib.parse import urlencode
 
-import aiohttp
-import requests
-
+import homeassistant_cli.cache as cache
 from homeassistant_cli.config import Configuration, resolve_server
+import homeassistant_cli.const as const
 from homeassistant_cli.exceptions import HomeAssistantCliError
 import homeassistant_cli.hassconst as hass
+import homeassistant_cli.helper as helper
+import homeassistant_cli.mirror as mirror
+import homeassistant_cli.registry as registry
+
+if TYPE_CHECKING:
+    # loaded by the code paths using them: requests for the REST API and
+    # aiohttp for the WebSocket API
+    import aiohttp
+    import requests
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -29,6 +57,9 @@ METH_DELETE = 'DELETE'
 METH_GET = 'GET'
 METH_POST = 'POST'
 
+# Bytes read at a time from streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class APIStatus(enum.Enum):
     """Representation of an API status."""
@@ -43,26 +74,82 @@ class APIStatus(enum.Enum):
         return self.value  # type: ignore
 
 
+def _session(ctx: Configuration) -> 'requests.Session':
+    """Return the pooled HTTP session of the context, creating it if needed.
+
+    The session keeps connections alive between calls and retries
+    idempotent requests on connection errors and gateway failures.
+    """
+    if not getattr(ctx, 'session', None):
+        shared = getattr(ctx, 'shared', None)
+        if shared is not None:
+            ctx.session = shared.connection(
+                'http', ctx, lambda: _new_session(ctx)
+            )
+        else:
+            ctx.session = _new_session(ctx)
+
+    return cast('requests.Session', ctx.session)
+
+
+def _new_session(ctx: Configuration) -> 'requests.Session':
+    """Return a new pooled HTTP session for the settings of the context."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retries = Retry(
+        total=getattr(ctx, 'retries', const.DEFAULT_RETRIES),
+        backoff_factor=getattr(ctx, 'backoff', const.DEFAULT_BACKOFF),
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    pool_size = getattr(ctx, 'pool_size', const.DEFAULT_POOL_SIZE)
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retries,
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.verify = not getattr(ctx, 'insecure', False)
+    if getattr(ctx, 'cert', None):
+        session.cert = ctx.cert
+
+    _LOGGER.debug(
+        "Session: verify(%s), cert(%s), pool(%s), retries(%s)",
+        session.verify,
+        session.cert,
+        pool_size,
+        retries.total,
+    )
+    return session
+
+
 def restapi(
-    ctx: Configuration, method: str, path: str, data: Optional[Dict] = None
-) -> requests.Response:
-    """Make a call to the Home Assistant REST API."""
+    ctx: Configuration,
+    method: str,
+    path: str,
+    data: Optional[Dict] = None,
+    stream: bool = False,
+    no_read_timeout: bool = False,
+) -> 'requests.Response':
+    """Make a call to the Home Assistant REST API.
+
+    With stream the body is not read until the response is consumed.
+    With no_read_timeout the server may take as long as it needs to
+    answer, only connecting times out.
+    """
+    import requests
+
     if data is None:
         data_str = None
     else:
         data_str = json.dumps(data, cls=JSONEncoder)
 
-    if not ctx.session:
-        ctx.session = requests.Session()
-        ctx.session.verify = not ctx.insecure
-        if ctx.cert:
-            ctx.session.cert = ctx.cert
-
-        _LOGGER.debug(
-            "Session: verify(%s), cert(%s)",
-            ctx.session.verify,
-            ctx.session.cert,
-        )
+    session = _session(ctx)
 
     headers = {CONTENT_TYPE: hass.CONTENT_TYPE_JSON}  # type: Dict[str, Any]
 
@@ -73,11 +160,28 @@ def restapi(
 
     url = urllib.parse.urljoin(resolve_server(ctx) + path, "")
 
+    # (connect, read) timeout
+    timeout = getattr(ctx, 'timeout', const.DEFAULT_TIMEOUT)
+    timeouts = (timeout, None if no_read_timeout else timeout)
+
     try:
         if method == METH_GET:
-            return requests.get(url, params=data_str, headers=headers)
+            return session.get(
+                url,
+                params=data_str,
+                headers=headers,
+                timeout=timeouts,
+                stream=stream,
+            )
 
-        return requests.request(method, url, data=data_str, headers=headers)
+        return session.request(
+            method,
+            url,
+            data=data_str,
+            headers=headers,
+            timeout=timeouts,
+            stream=stream,
+        )
 
     except requests.exceptions.ConnectionError:
         raise HomeAssistantCliError(f"Error connecting to {url}")
@@ -88,6 +192,335 @@ def restapi(
         raise HomeAssistantCliError(error)
 
 
+def _iter_text(
+    req: 'requests.Response', chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[str]:
+    """Yield the body of a streamed response as text.
+
+    Errors while downloading are raised like the ones of `restapi`.
+    """
+    import requests
+
+    decoder = codecs.getincrementaldecoder(req.encoding or 'utf-8')(
+        errors='replace'
+    )
+    try:
+        for chunk in req.iter_content(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+    except requests.exceptions.Timeout:
+        raise HomeAssistantCliError(f"Timeout when talking to {req.url}")
+    except requests.exceptions.RequestException as ex:
+        raise HomeAssistantCliError(f"Error reading from {req.url}: {ex}")
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def iter_json_array(chunks: Iterable[str], depth: int = 1) -> Iterator[Any]:
+    """Parse a JSON array incrementally and yield its elements.
+
+    With a depth of 2 the array is expected to hold arrays and the
+    elements of those are yielded instead, and so on. Only the element
+    being parsed is kept in memory, never the whole document.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    level = 0
+    eof = False
+
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            buf, pos = buf[pos:] + next(chunks, ''), 0
+            eof = pos == len(buf)
+            continue
+
+        char = buf[pos]
+        if char == ',' and level > 0:
+            pos += 1
+        elif char == ']' and level > 0:
+            pos += 1
+            level -= 1
+            if level == 0:
+                return
+        elif level < depth:
+            if char != '[':
+                raise ValueError(
+                    f"Expected a JSON array at '{buf[pos:pos + 20]}'"
+                )
+            pos += 1
+            level += 1
+        else:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                item, end = None, None
+            # a value ending with the buffer may be continued, e.g. 12|34
+            if end is None or (end == len(buf) and not eof):
+                if eof:
+                    raise ValueError(f"Invalid JSON at '{buf[pos:pos + 20]}'")
+                more = next(chunks, '')
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            pos = end
+            yield item
+
+
+class WebSocketClient:
+    """Persistent, multiplexed connection to the Home Assistant WS API.
+
+    The connection is opened and authenticated once. Every frame sent
+    gets its own id and the reply is routed back to whoever is waiting
+    for that id, thus many requests can share the one socket.
+    """
+
+    def __init__(self, ctx: Configuration, threaded: bool = False) -> None:
+        """Initialize the client.
+
+        A threaded client runs its event loop in a thread of its own, thus
+        it can be used by several threads at once.
+        """
+        self._ctx = ctx
+        self.loop = asyncio.new_event_loop()
+        self._thread = None  # type: Optional[threading.Thread]
+        if threaded:
+            self._thread = threading.Thread(
+                target=self.loop.run_forever, name='hass-cli-ws', daemon=True
+            )
+            self._thread.start()
+        self._session = None  # type: Optional[aiohttp.ClientSession]
+        self._wsconn = (
+            None
+        )  # type: Optional[aiohttp.ClientWebSocketResponse]
+        self._reader = None  # type: Optional[asyncio.Task]
+        self._closed = None  # type: Optional[asyncio.Future]
+        self._lock = None  # type: Optional[asyncio.Lock]
+        self._ids = itertools.count(1)
+        self._pending = {}  # type: Dict[int, asyncio.Future]
+        self._listeners = {}  # type: Dict[int, Callable[[Dict], Any]]
+
+    @property
+    def connected(self) -> bool:
+        """Return True if the connection is open and authenticated."""
+        return self._wsconn is not None and not self._wsconn.closed
+
+    def run(self, coro: Awaitable) -> Any:
+        """Run a coroutine on the event loop owned by the client."""
+        if self._thread is not None:
+            return asyncio.run_coroutine_threadsafe(
+                cast(Coroutine, coro), self.loop
+            ).result()
+        return self.loop.run_until_complete(coro)
+
+    async def connect(self) -> None:
+        """Open the connection and authenticate, if not already done."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self.connected:
+                await self._connect()
+
+    async def _connect(self) -> None:
+        """Open the connection and authenticate."""
+        # drop what is left of an earlier connection closed by the server
+        await self._disconnect()
+
+        import aiohttp
+
+        url = resolve_server(self._ctx) + "/api/websocket"
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=getattr(self._ctx, 'timeout', None),
+        )
+        self._session = aiohttp.ClientSession(timeout=timeout)
+        try:
+            self._wsconn = await self._session.ws_connect(
+                url,
+                ssl=not getattr(self._ctx, 'insecure', False),
+            )
+        except aiohttp.ClientError:
+            await self._session.close()
+            raise HomeAssistantCliError(f"Error connecting to {url}")
+
+        await self._wsconn.send_str(
+            json.dumps({'type': 'auth', 'access_token': self._ctx.token})
+        )
+
+        while True:
+            msg = await self._wsconn.receive()
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                await self._disconnect()
+                raise HomeAssistantCliError(
+                    f"Connection to {url} closed during authentication"
+                )
+            mydata = json.loads(msg.data)  # type: Dict
+            if mydata['type'] == 'auth_ok':
+                break
+            if mydata['type'] == 'auth_invalid':
+                await self._disconnect()
+                raise HomeAssistantCliError(mydata.get('message'))
+
+        _LOGGER.debug("Authenticated WebSocket connection to %s", url)
+        self._closed = self.loop.create_future()
+        self._reader = self.loop.create_task(self._read())
+
+    async def _read(self) -> None:
+        """Read messages and route them by id until the socket closes."""
+        import aiohttp
+
+        wsconn = cast(aiohttp.ClientWebSocketResponse, self._wsconn)
+        error = None  # type: Optional[BaseException]
+        try:
+            while True:
+                msg = await wsconn.receive()
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                mydata = json.loads(msg.data)
+                # Home Assistant may coalesce several messages into one
+                for item in mydata if isinstance(mydata, list) else [mydata]:
+                    self._dispatch(item)
+        except asyncio.CancelledError:
+            pass
+        except Exception as ex:  # pylint: disable=broad-except
+            error = ex
+
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(
+                    error or HomeAssistantCliError("WebSocket closed")
+                )
+        self._pending.clear()
+        self._listeners.clear()
+
+        closed = cast(asyncio.Future, self._closed)
+        if not closed.done():
+            if error:
+                closed.set_exception(error)
+            else:
+                closed.set_result(None)
+
+    def _dispatch(self, message: Dict) -> None:
+        """Route a message to the listener or request with its id."""
+        msgid = message.get('id')
+
+        listener = self._listeners.get(msgid)  # type: ignore
+        if listener:
+            listener(message)
+
+        if message.get('type') == 'result':
+            future = self._pending.pop(msgid, None)  # type: ignore
+            if future and not future.done():
+                future.set_result(message)
+
+    async def _send(self, frame: Dict) -> asyncio.Future:
+        """Send a frame with a fresh id and return future for its result."""
+        await self.connect()
+
+        msgid = next(self._ids)
+        future = self.loop.create_future()
+        self._pending[msgid] = future
+        await cast('aiohttp.ClientWebSocketResponse', self._wsconn).send_str(
+            json.dumps({**frame, 'id': msgid}, cls=JSONEncoder)
+        )
+        return future
+
+    async def request(self, frame: Dict) -> Dict:
+        """Send a frame and return the result message for it."""
+        return cast(Dict, await (await self._send(frame)))
+
+    async def subscribe(
+        self, frame: Dict, callback: Callable[[Dict], Any]
+    ) -> int:
+        """Send a subscription frame and call back on every message for it.
+
+        Return the id of the subscription. Raise HomeAssistantCliError if
+        the server refuses it.
+        """
+        await self.connect()
+
+        msgid = next(self._ids)
+        future = self.loop.create_future()
+        self._pending[msgid] = future
+        self._listeners[msgid] = callback
+        await cast('aiohttp.ClientWebSocketResponse', self._wsconn).send_str(
+            json.dumps({**frame, 'id': msgid}, cls=JSONEncoder)
+        )
+        result = await future
+        if not result.get('success', True):
+            self._listeners.pop(msgid, None)
+            error = (result.get('error') or {}).get('message')
+            raise HomeAssistantCliError(
+                error or f"Subscription {frame['type']} failed"
+            )
+        return msgid
+
+    async def unsubscribe(self, subscription: int) -> None:
+        """Stop an earlier subscription."""
+        self._listeners.pop(subscription, None)
+        if self.connected:
+            await self.request(
+                {'type': 'unsubscribe_events', 'subscription': subscription}
+            )
+
+    async def wait_closed(self) -> None:
+        """Wait until the connection is closed by the server."""
+        if self._closed is None:
+            await self.connect()
+        # an already closed connection is not opened again
+        await cast(asyncio.Future, self._closed)
+
+    async def _disconnect(self) -> None:
+        """Close the socket and the HTTP session."""
+        if self._reader:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._wsconn is not None:
+            await self._wsconn.close()
+            self._wsconn = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def close(self) -> None:
+        """Close the connection and the event loop."""
+        if self.loop.is_closed():
+            return
+        self.run(self._disconnect())
+        if self._thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+        self.loop.close()
+
+
+def _wsclient(ctx: Configuration) -> WebSocketClient:
+    """Return the WebSocket client of the context, creating it if needed."""
+    client = getattr(ctx, 'wsclient', None)
+    if client is None or client.loop.is_closed():
+        shared = getattr(ctx, 'shared', None)
+        if shared is not None:
+            client = shared.connection(
+                'ws', ctx, lambda: WebSocketClient(ctx, threaded=True)
+            )
+        else:
+            client = WebSocketClient(ctx)
+        ctx.wsclient = client
+    return cast(WebSocketClient, client)
+
+
 def wsapi(
     ctx: Configuration,
     frame: Dict,
@@ -99,42 +532,119 @@ def wsapi(
     on every message.
 
     If no callback return data returned.
+
+    All calls made with the same context share one connection.
     """
-    loop = asyncio.get_event_loop()
+    client = _wsclient(ctx)
 
-    async def fetcher() -> Optional[Dict]:
-        async with aiohttp.ClientSession() as session:
-            async with session.ws_connect(
-                resolve_server(ctx) + "/api/websocket"
-            ) as wsconn:
+    if callback:
 
-                await wsconn.send_str(
-                    json.dumps({'type': 'auth', 'access_token': ctx.token})
-                )
+        async def listener() -> None:
+            await client.subscribe(frame, callback)
+            await client.wait_closed()
 
-                frame['id'] = 1
-
-                await wsconn.send_str(json.dumps(frame))
-
-                while True:
-                    msg = await wsconn.receive()
-                    if msg.type == aiohttp.WSMsgType.ERROR:
-                        break
-                    elif msg.type == aiohttp.WSMsgType.CLOSED:
-                        break
-                    elif msg.type == aiohttp.WSMsgType.TEXT:
-                        mydata = json.loads(msg.data)  # type: Dict
-
-                        if callback:
-                            callback(mydata)
-                        elif mydata['type'] == 'result':
-                            return mydata
-                        elif mydata['type'] == 'auth_invalid':
-                            raise HomeAssistantCliError(mydata.get('message'))
+        client.run(listener())
         return None
 
-    result = loop.run_until_complete(fetcher())
-    return result
+    return cast(Dict, client.run(client.request(frame)))
+
+
+def subscribe_states(
+    ctx: Configuration,
+    callback: Callable[[List[Dict]], Any],
+    ready: Optional[Callable[[], Any]] = None,
+) -> None:
+    """Call back with every update of the states until the server hangs up.
+
+    The updates are the messages of subscribe_entities, the first one
+    holding all states. Servers without subscribe_entities get a state
+    snapshot from the REST API instead, as state_changed events without
+    an old state, followed by the actual state_changed events. Every
+    call back gets the updates that arrived together. `ready` is called
+    once all states were handed over.
+    """
+    client = _wsclient(ctx)
+    source = _state_source(ctx)
+    compact = [source != const.STATE_SOURCE_REST]
+
+    def handler(msg: Dict) -> None:
+        if msg['type'] == 'event':
+            callback([msg['event']])
+            if compact[0] and ready:
+                compact[0] = False
+                ready()
+
+    async def listener() -> None:
+        if compact[0]:
+            try:
+                await client.subscribe(
+                    {'type': 'subscribe_entities'}, handler
+                )
+            except HomeAssistantCliError as ex:
+                if source == const.STATE_SOURCE_WS:
+                    raise
+                compact[0] = False
+                _LOGGER.debug("No subscribe_entities, using events: %s", ex)
+        if not compact[0]:
+            # subscribe first, so no change made while fetching is missed
+            await client.subscribe(
+                {'type': 'subscribe_events', 'event_type': 'state_changed'},
+                handler,
+            )
+            states = await client.loop.run_in_executor(
+                None, _get_rest_states, ctx
+            )
+            callback(
+                [
+                    {
+                        'event_type': 'state_changed',
+                        'data': {
+                            'entity_id': state['entity_id'],
+                            'old_state': None,
+                            'new_state': state,
+                        },
+                    }
+                    for state in states
+                ]
+            )
+            if ready:
+                ready()
+        await client.wait_closed()
+
+    client.run(listener())
+
+
+def wsapi_batch(
+    ctx: Configuration,
+    frames: List[Dict],
+    window: int = const.DEFAULT_WS_WINDOW,
+) -> List[Dict]:
+    """Make many calls to Home Assistant over one WS connection.
+
+    At most `window` frames are in flight at any time. The result
+    messages are returned in the order of the frames; a frame that could
+    not be sent or answered gets an unsuccessful result with the error.
+    """
+    client = _wsclient(ctx)
+
+    async def sender() -> List[Dict]:
+        semaphore = asyncio.Semaphore(max(window, 1))
+
+        async def send(frame: Dict) -> Dict:
+            async with semaphore:
+                try:
+                    return await client.request(frame)
+                except HomeAssistantCliError as ex:
+                    return {
+                        'type': 'result',
+                        'success': False,
+                        'error': {'code': 'client_error', 'message': str(ex)},
+                    }
+
+        await client.connect()
+        return list(await asyncio.gather(*(send(f) for f in frames)))
+
+    return cast(List[Dict], client.run(sender()))
 
 
 class JSONEncoder(json.JSONEncoder):
@@ -156,6 +666,7 @@ class JSONEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, o)
 
 
+@cache.memoize('areas')
 def get_areas(ctx: Configuration) -> List[Dict[str, Any]]:
     """Return all areas."""
     frame = {'type': hass.WS_TYPE_AREA_REGISTRY_LIST}
@@ -169,15 +680,10 @@ def get_areas(ctx: Configuration) -> List[Dict[str, Any]]:
 
 def find_area(ctx: Configuration, id_or_name: str) -> Optional[Dict[str, str]]:
     """Find area first by id and if no match by name."""
-    areas = get_areas(ctx)
-
-    area = next((x for x in areas if x['area_id'] == id_or_name), None)
-    if not area:
-        area = next((x for x in areas if x['name'] == id_or_name), None)
-
-    return area
+    return registry.areas(get_areas(ctx)).find(id_or_name)
 
 
+@cache.invalidates('areas')
 def create_area(ctx: Configuration, name: str) -> Dict[str, Any]:
     """Create area."""
     frame = {'type': hass.WS_TYPE_AREA_REGISTRY_CREATE, 'name': name}
@@ -185,6 +691,7 @@ def create_area(ctx: Configuration, name: str) -> Dict[str, Any]:
     return cast(Dict[str, Any], wsapi(ctx, frame))
 
 
+@cache.invalidates('areas', 'devices', 'entities')
 def delete_area(ctx: Configuration, area_id: str) -> Dict[str, Any]:
     """Delete area."""
     frame = {'type': hass.WS_TYPE_AREA_REGISTRY_DELETE, 'area_id': area_id}
@@ -192,6 +699,7 @@ def delete_area(ctx: Configuration, area_id: str) -> Dict[str, Any]:
     return cast(Dict[str, Any], wsapi(ctx, frame))
 
 
+@cache.invalidates('areas')
 def rename_area(
     ctx: Configuration, area_id: str, new_name: str
 ) -> Dict[str, Any]:
@@ -205,6 +713,7 @@ def rename_area(
     return cast(Dict[str, Any], wsapi(ctx, frame))
 
 
+@cache.invalidates('entities', 'states')
 def rename_entity(
     ctx: Configuration,
     entity_id: str,
@@ -225,6 +734,7 @@ def rename_entity(
     return cast(Dict[str, Any], wsapi(ctx, frame))
 
 
+@cache.invalidates('devices')
 def rename_device(
     ctx: Configuration, device_id: str, new_name: str
 ) -> Dict[str, Any]:
@@ -238,6 +748,7 @@ def rename_device(
     return cast(Dict[str, Any], wsapi(ctx, frame))
 
 
+@cache.invalidates('devices')
 def assign_area(
     ctx: Configuration, device_id: str, area_id: str
 ) -> Dict[str, Any]:
@@ -251,6 +762,27 @@ def assign_area(
     return cast(Dict[str, Any], wsapi(ctx, frame))
 
 
+@cache.invalidates('devices')
+def assign_areas(
+    ctx: Configuration,
+    device_ids: List[str],
+    area_id: str,
+    window: int = const.DEFAULT_WS_WINDOW,
+) -> List[Dict[str, Any]]:
+    """Assign area to many devices over one connection."""
+    frames = [
+        {
+            'type': hass.WS_TYPE_DEVICE_REGISTRY_UPDATE,
+            'area_id': area_id,
+            'device_id': device_id,
+        }
+        for device_id in device_ids
+    ]
+
+    return wsapi_batch(ctx, frames, window)
+
+
+@cache.invalidates('entities')
 def assign_entity_area(
     ctx: Configuration, entity_id: str, area_id: str
 ) -> Dict[str, Any]:
@@ -264,6 +796,26 @@ def assign_entity_area(
     return cast(Dict[str, Any], wsapi(ctx, frame))
 
 
+@cache.invalidates('entities')
+def assign_entity_areas(
+    ctx: Configuration,
+    entity_ids: List[str],
+    area_id: str,
+    window: int = const.DEFAULT_WS_WINDOW,
+) -> List[Dict[str, Any]]:
+    """Assign area to many entities over one connection."""
+    frames = [
+        {
+            'type': hass.WS_TYPE_ENTITY_REGISTRY_UPDATE,
+            'area_id': area_id,
+            'entity_id': entity_id,
+        }
+        for entity_id in entity_ids
+    ]
+
+    return wsapi_batch(ctx, frames, window)
+
+
 def get_health(ctx: Configuration) -> Dict[str, Any]:
     """Get system Health."""
     frame = {'type': 'system_health/info'}
@@ -273,6 +825,7 @@ def get_health(ctx: Configuration) -> Dict[str, Any]:
     return info
 
 
+@cache.memoize('devices')
 def get_devices(ctx: Configuration) -> List[Dict[str, Any]]:
     """Return all devices."""
     frame = {'type': hass.WS_TYPE_DEVICE_REGISTRY_LIST}
@@ -284,6 +837,7 @@ def get_devices(ctx: Configuration) -> List[Dict[str, Any]]:
     return devices
 
 
+@cache.memoize('entities')
 def get_entities(ctx: Configuration) -> List[Dict[str, Any]]:
     """Return all entities."""
     frame = {'type': hass.WS_TYPE_ENTITY_REGISTRY_LIST}
@@ -295,6 +849,49 @@ def get_entities(ctx: Configuration) -> List[Dict[str, Any]]:
     return devices
 
 
+REGISTRY_FRAMES = {
+    'areas': hass.WS_TYPE_AREA_REGISTRY_LIST,
+    'devices': hass.WS_TYPE_DEVICE_REGISTRY_LIST,
+    'entities': hass.WS_TYPE_ENTITY_REGISTRY_LIST,
+}
+
+
+def get_registries(
+    ctx: Configuration, *names: str
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Return the named registries, all of them if none is named.
+
+    Registries not at hand in the cache are fetched together, over one
+    WS connection.
+    """
+    names = names or tuple(REGISTRY_FRAMES)
+    fetched = {}  # type: Dict[str, List[Dict[str, Any]]]
+    resolved = set()  # type: Set[str]
+
+    def fetch(name: str) -> List[Dict[str, Any]]:
+        if name not in fetched:
+            missing = [n for n in names if n not in resolved]
+            frames = [{'type': REGISTRY_FRAMES[n]} for n in missing]
+            for other, output in zip(missing, wsapi_batch(ctx, frames)):
+                if not output.get('success'):
+                    raise HomeAssistantCliError(
+                        "Could not get the {} registry: {}".format(
+                            other,
+                            output.get('error', {}).get('message', ''),
+                        )
+                    )
+                fetched[other] = output['result']
+        return fetched[name]
+
+    registries = {}  # type: Dict[str, List[Dict[str, Any]]]
+    for name in names:
+        registries[name] = cache.cached(
+            ctx, name, functools.partial(fetch, name)
+        )
+        resolved.add(name)
+    return registries
+
+
 def get_entity(ctx: Configuration, entity_id: str) -> List[Dict[str, Any]]:
     """Return id."""
     frame = {'type': hass.WS_TYPE_ENTITY_REGISTRY_GET, 'entity_id': entity_id}
@@ -337,7 +934,7 @@ def get_info(ctx: Configuration) -> Dict[str, Any]:
         # ValueError if req.json() can't parse the json
 
 
-def get_events(ctx: Configuration) -> Dict[str, Any]:
+def get_events(ctx: Configuration) -> List[Dict[str, Any]]:
     """Return all events."""
     try:
         req = restapi(ctx, METH_GET, hass.URL_API_EVENTS)
@@ -345,46 +942,315 @@ def get_events(ctx: Configuration) -> Dict[str, Any]:
         raise HomeAssistantCliError(f"Unexpected error getting events: {ex}")
 
     if req.status_code == 200:
-        return cast(Dict[str, Any], req.json())
+        return cast(List[Dict[str, Any]], req.json())
 
     raise HomeAssistantCliError(f"Error while getting all events: {req.text}")
 
 
+def _history_path(
+    entities: Optional[List] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> str:
+    """Return the path to query history with."""
+    method = hass.URL_API_HISTORY_PERIOD
+    if start_time:
+        method = f"{method}/{start_time.isoformat()}"
+
+    params = collections.OrderedDict()  # type: Dict[str, str]
+
+    if entities:
+        params["filter_entity_id"] = ",".join(entities)
+    if end_time:
+        params["end_time"] = end_time.isoformat()
+
+    if params:
+        method = f"{method}?{urlencode(params)}"
+
+    return method
+
+
 def get_history(
     ctx: Configuration,
     entities: Optional[List] = None,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
-) -> List[Dict[str, Any]]:
-    """Return History."""
+) -> List[List[Dict[str, Any]]]:
+    """Return History, a list of the rows of every entity."""
     try:
-        if start_time:
-            method = hass.URL_API_HISTORY_PERIOD.format(start_time.isoformat())
-        else:
-            method = hass.URL_API_HISTORY
+        req = restapi(
+            ctx, METH_GET, _history_path(entities, start_time, end_time)
+        )
+    except HomeAssistantCliError as ex:
+        raise HomeAssistantCliError(f"Unexpected error getting history: {ex}")
 
-        params = collections.OrderedDict()  # type: Dict[str, str]
+    if req.status_code == 200:
+        return cast(List[List[Dict[str, Any]]], req.json())
 
-        if entities:
-            params["filter_entity_id"] = ",".join(entities)
-        if end_time:
-            params["end_time"] = end_time.isoformat()
+    raise HomeAssistantCliError(f"Error while getting all events: {req.text}")
 
-        if params:
-            method = f"{method}?{urlencode(params)}"
 
-        req = restapi(ctx, METH_GET, method)
+def iter_history(
+    ctx: Configuration,
+    entities: Optional[List] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield the history one state change at a time.
+
+    The response is parsed while it is downloaded, thus only one row is
+    held in memory at a time.
+    """
+    try:
+        req = restapi(
+            ctx,
+            METH_GET,
+            _history_path(entities, start_time, end_time),
+            stream=True,
+            # long periods take the server long to look up
+            no_read_timeout=True,
+        )
     except HomeAssistantCliError as ex:
         raise HomeAssistantCliError(f"Unexpected error getting history: {ex}")
 
-    if req.status_code == 200:
-        return cast(List[Dict[str, Any]], req.json())
+    with req:
+        if req.status_code != 200:
+            raise HomeAssistantCliError(
+                f"Error while getting all events: {req.text}"
+            )
 
-    raise HomeAssistantCliError(f"Error while getting all events: {req.text}")
+        # a list of state changes per entity
+        yield from iter_json_array(_iter_text(req), depth=2)
+
+
+# (entity ids, start, end) of one part of a history query
+HistorySlice = Tuple[List[str], datetime, datetime]
+
+
+def history_slices(
+    entities: List[str],
+    start_time: datetime,
+    end_time: datetime,
+    length: Optional[timedelta] = None,
+    group_size: Optional[int] = None,
+) -> List[HistorySlice]:
+    """Split a history query into time slices and groups of entities."""
+    if group_size:
+        groups = [
+            entities[i : i + group_size]
+            for i in range(0, len(entities), group_size)
+        ]
+    else:
+        groups = [entities]
+
+    slices = []  # type: List[HistorySlice]
+    for group in groups:
+        start = start_time
+        while True:
+            end = min(start + length, end_time) if length else end_time
+            slices.append((group, start, end))
+            if end >= end_time:
+                break
+            start = end
+    return slices
+
+
+def _history_key(row: Dict[str, Any]) -> Tuple[str, str]:
+    """Return the key history rows are ordered and told apart by.
+
+    Changes of attributes only keep the last change, thus the last
+    update tells them apart. Minimal responses only have the former.
+    """
+    return (
+        row.get('entity_id', ''),
+        row.get('last_updated') or row.get('last_changed', ''),
+    )
+
+
+def get_history_sliced(
+    ctx: Configuration,
+    slices: List[HistorySlice],
+    parallel: int = 1,
+    progress: Optional[Callable[[int, int, HistorySlice], None]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Fetch history slices concurrently and merge them.
+
+    At most `parallel` slices are fetched at the same time. A failing
+    slice is retried on its own, up to `--retries` times, without
+    fetching the others again. Rows are yielded ordered by entity and
+    last update, with the duplicates at slice boundaries removed.
+    `progress` is called with the number of slices done, the total and
+    the slice after each slice was fetched.
+    """
+    # resolve and set up the session once, before slices run concurrently
+    resolve_server(ctx)
+    _session(ctx)
+    attempts = max(getattr(ctx, 'retries', const.DEFAULT_RETRIES), 0) + 1
+
+    def fetch(part: HistorySlice) -> List[Dict[str, Any]]:
+        entities, start, end = part
+        for attempt in range(1, attempts + 1):
+            try:
+                data = get_history(ctx, entities, start, end)
+                break
+            except HomeAssistantCliError as ex:
+                if attempt == attempts:
+                    raise
+                _LOGGER.warning(
+                    "Retrying history from %s to %s: %s", start, end, ex
+                )
+
+        if start > slices[0][1]:
+            # drop the state carried over from before the slice, stamped
+            # with the start of the slice, the previous one has it
+            data = [
+                item[1:] if item and _changed_by(item[0], start) else item
+                for item in data
+            ]
+        rows = [row for item in data for row in item]
+        return sorted(rows, key=_history_key)
+
+    async def fetcher() -> List[List[Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        results = [[] for _ in slices]  # type: List[List[Dict[str, Any]]]
+        failed = []  # type: List[str]
+        done = 0
+
+        async def run(index: int) -> None:
+            nonlocal done
+            try:
+                results[index] = await loop.run_in_executor(
+                    executor, fetch, slices[index]
+                )
+            except HomeAssistantCliError as ex:
+                _, start, end = slices[index]
+                failed.append(f"{start.isoformat()} - {end.isoformat()}: {ex}")
+                return
+            done += 1
+            if progress:
+                progress(done, len(slices), slices[index])
+
+        with ThreadPoolExecutor(max_workers=max(parallel, 1)) as executor:
+            await asyncio.gather(*(run(i) for i in range(len(slices))))
+
+        if failed:
+            raise HomeAssistantCliError(
+                "Error while getting history for {} of {} slices:\n{}".format(
+                    len(failed), len(slices), "\n".join(failed)
+                )
+            )
+        return results
+
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(fetcher())
+    finally:
+        loop.close()
+
+    last = None
+    for row in heapq.merge(*results, key=_history_key):
+        key = _history_key(row)
+        if key != last:
+            last = key
+            yield row
+
+
+def _changed_by(row: Dict[str, Any], time: datetime) -> bool:
+    """Return True if the history row changed at or before time."""
+    try:
+        return datetime.fromisoformat(row['last_changed']) <= time
+    except (KeyError, TypeError, ValueError):
+        return False
 
 
 def get_states(ctx: Configuration) -> List[Dict[str, Any]]:
-    """Return all states."""
+    """Return all states, from the mirror of the agent if there is one."""
+    states = _mirrored_states(ctx)
+    if states is not None:
+        return states
+    return _get_states(ctx)
+
+
+def _mirrored_states(ctx: Configuration) -> Optional[List[Dict[str, Any]]]:
+    """Return the states kept up to date by the process, if any."""
+    shared = getattr(ctx, 'shared', None)
+    if shared is None:
+        return None
+    return cast(Optional[List[Dict[str, Any]]], shared.states(ctx))
+
+
+def _state_source(ctx: Configuration) -> str:
+    """Return where the states are to come from."""
+    return getattr(ctx, 'state_source', None) or const.STATE_SOURCE_AUTO
+
+
+def _iter_compact_states(ctx: Configuration) -> Iterator[Dict[str, Any]]:
+    """Fetch all states in the compact format of subscribe_entities.
+
+    The first message of the subscription holds every state with short
+    keys and without repeating timestamps and contexts, thus is much
+    smaller than the REST response. The states are yielded the way the
+    REST API has them, decoded one at a time.
+    """
+    client = _wsclient(ctx)
+
+    async def snapshot() -> Dict[str, Any]:
+        received = client.loop.create_future()
+
+        def handler(msg: Dict) -> None:
+            if msg['type'] == 'event' and not received.done():
+                received.set_result(msg['event'])
+
+        subscription = await client.subscribe(
+            {'type': 'subscribe_entities'}, handler
+        )
+        closed = client.loop.create_task(client.wait_closed())
+        try:
+            await asyncio.wait(
+                [received, closed], return_when=asyncio.FIRST_COMPLETED
+            )
+            if not received.done():
+                raise HomeAssistantCliError(
+                    "Connection closed before the states were received"
+                )
+            return cast(Dict[str, Any], received.result())
+        finally:
+            closed.cancel()
+            if client.connected:
+                await client.unsubscribe(subscription)
+
+    message = client.run(snapshot())
+    for entity_id, compact in (
+        message.get(mirror.COMPACT_ADDED) or {}
+    ).items():
+        yield mirror.decode_state(entity_id, compact)
+
+
+def _ws_states(ctx: Configuration) -> Optional[List[Dict[str, Any]]]:
+    """Return all states from the WS API, None if REST is to be used."""
+    source = _state_source(ctx)
+    if source == const.STATE_SOURCE_REST:
+        return None
+    try:
+        return list(_iter_compact_states(ctx))
+    except HomeAssistantCliError as ex:
+        if source == const.STATE_SOURCE_WS:
+            raise
+        _LOGGER.debug("No states from the WS API, using REST: %s", ex)
+        return None
+
+
+@cache.memoize('states')
+def _get_states(ctx: Configuration) -> List[Dict[str, Any]]:
+    """Fetch all states from the configured source."""
+    states = _ws_states(ctx)
+    if states is not None:
+        return states
+    return _get_rest_states(ctx)
+
+
+def _get_rest_states(ctx: Configuration) -> List[Dict[str, Any]]:
+    """Fetch all states from the REST API."""
     try:
         req = restapi(ctx, METH_GET, hass.URL_API_STATES)
     except HomeAssistantCliError as ex:
@@ -397,6 +1263,51 @@ def get_states(ctx: Configuration) -> List[Dict[str, Any]]:
     raise HomeAssistantCliError(f"Error while getting all states: {req.text}")
 
 
+def iter_states(
+    ctx: Configuration, fields: Optional[Iterable[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Yield all states one at a time.
+
+    The REST response is parsed while it is downloaded, thus only one
+    state is held in memory at a time. Cached states are used if caching
+    is on. Only with `--state-source ws` do the states come from the
+    compact snapshot of the WS API, which arrives as one message and is
+    decoded one state at a time. Given the paths of the fields needed,
+    every state is cut down to those as soon as it is parsed.
+    """
+    if fields is not None:
+        project = helper.projection(fields)
+        for state in iter_states(ctx):
+            yield project(state)
+        return
+
+    states = _mirrored_states(ctx)
+    if states is not None:
+        yield from states
+        return
+
+    if cache.enabled(ctx):
+        yield from get_states(ctx)
+        return
+
+    if _state_source(ctx) == const.STATE_SOURCE_WS:
+        yield from _iter_compact_states(ctx)
+        return
+
+    try:
+        req = restapi(ctx, METH_GET, hass.URL_API_STATES, stream=True)
+    except HomeAssistantCliError as ex:
+        raise HomeAssistantCliError(f"Unexpected error getting state: {ex}")
+
+    with req:
+        if req.status_code != 200:
+            raise HomeAssistantCliError(
+                f"Error while getting all states: {req.text}"
+            )
+
+        yield from iter_json_array(_iter_text(req))
+
+
 def get_raw_error_log(ctx: Configuration) -> str:
     """Return the error log."""
     try:
@@ -410,6 +1321,26 @@ def get_raw_error_log(ctx: Configuration) -> str:
     return req.text
 
 
+def iter_raw_error_log(ctx: Configuration) -> Iterator[str]:
+    """Yield the error log in pieces as it is downloaded."""
+    try:
+        req = restapi(
+            ctx,
+            METH_GET,
+            hass.URL_API_ERROR_LOG,
+            stream=True,
+            no_read_timeout=True,
+        )
+        req.raise_for_status()
+    except HomeAssistantCliError as ex:
+        raise HomeAssistantCliError(
+            f"Unexpected error getting error log: {ex}"
+        )
+
+    with req:
+        yield from _iter_text(req)
+
+
 def get_config(ctx: Configuration) -> Dict[str, Any]:
     """Return the running configuration."""
     try:
@@ -450,6 +1381,7 @@ def get_state(ctx: Configuration, entity_id: str) -> Optional[Dict[str, Any]]:
     )
 
 
+@cache.invalidates('states')
 def remove_state(ctx: Configuration, entity_id: str) -> bool:
     """Call API to remove state for entity_id.
 
@@ -473,6 +1405,7 @@ def remove_state(ctx: Configuration, entity_id: str) -> bool:
     )
 
 
+@cache.invalidates('states')
 def set_state(
     ctx: Configuration, entity_id: str, data: Dict
 ) -> Dict[str, Any]:
@@ -529,6 +1462,7 @@ def get_event_listeners(ctx: Configuration) -> Dict:
         return {}
 
 
+@cache.invalidates('states')
 def fire_event(
     ctx: Configuration, event_type: str, data: Optional[Dict[str, Any]] = None
 ) -> Optional[Dict[str, Any]]:
@@ -549,6 +1483,7 @@ def fire_event(
         raise HomeAssistantCliError(f"Error firing event: {exception}")
 
 
+@cache.invalidates('states')
 def call_service(
     ctx: Configuration,
     domain: str,
@@ -574,6 +1509,44 @@ def call_service(
     return cast(List[Dict[str, Any]], req.json())
 
 
+def call_services(
+    ctx: Configuration,
+    calls: Iterable[Tuple[str, str, Optional[Dict]]],
+    parallel: int = 1,
+) -> List[List[Dict[str, Any]]]:
+    """Call several services concurrently.
+
+    Each call is a (domain, service, service_data) tuple. At most
+    `parallel` calls run at the same time, all sharing the pooled
+    session of the context. Return the changed states of every call in
+    the order of the calls.
+    """
+    # resolve and set up the session once, before calls run concurrently
+    resolve_server(ctx)
+    _session(ctx)
+
+    async def caller() -> List[List[Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max(parallel, 1)) as executor:
+            return list(
+                await asyncio.gather(
+                    *(
+                        loop.run_in_executor(
+                            executor, call_service, ctx, *call
+                        )
+                        for call in calls
+                    )
+                )
+            )
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(caller())
+    finally:
+        loop.close()
+
+
+@cache.memoize('services')
 def get_services(
     ctx: Configuration,
 ) -> List[Dict[str, Any]]:
@@ -0,0 +1,280 @@
+"""Run hass-cli command lines inside a running process.
+
+Used by the agent, which runs the commands of other hass-cli processes,
+and by batch mode, which runs many commands at once. Output of every
+command is handed to its own write functions, even while other threads
+run other commands.
+"""
+import collections
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextlib
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from typing import (  # noqa: F401
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from homeassistant_cli.config import Configuration, Shared
+import homeassistant_cli.const as const
+
+# the environment is global, thus one command with its own at a time
+_ENV_LOCK = threading.Lock()
+_STREAMS_LOCK = threading.Lock()
+_RUNNING = [0]
+
+
+class _ThreadStream(io.TextIOBase):
+    """Text stream handing what is written to the writer of the thread.
+
+    Threads without a writer of their own use the stream replaced.
+    """
+
+    def __init__(self, default: Any) -> None:
+        """Initialize the stream."""
+        super().__init__()
+        self.default = default
+        self.local = threading.local()
+
+    @property
+    def encoding(self) -> str:  # type: ignore
+        """Return the encoding, click checks it."""
+        return 'utf-8'
+
+    @property
+    def errors(self) -> str:  # type: ignore
+        """Return the error handling, click checks it."""
+        return 'strict'
+
+    def writable(self) -> bool:
+        """Return True, the stream is for writing."""
+        return True
+
+    def readable(self) -> bool:
+        """Return True, the stream is for reading as well."""
+        return True
+
+    def _target(self) -> Any:
+        """Return the stream of the current thread."""
+        return getattr(self.local, 'stream', None) or self.default
+
+    def write(self, text: str) -> int:
+        """Write text to the stream of the current thread."""
+        if not isinstance(text, str):
+            # makes click treat this as a text stream
+            raise TypeError(f"write() expects str, not {type(text)}")
+        return int(self._target().write(text) or len(text))
+
+    def flush(self) -> None:
+        """Flush the stream of the current thread."""
+        self._target().flush()
+
+    def read(self, size: Optional[int] = -1) -> str:
+        """Read from the stream of the current thread."""
+        return str(self._target().read(size))
+
+    def readline(self, size: Optional[int] = -1) -> str:  # type: ignore
+        """Read a line from the stream of the current thread."""
+        return str(self._target().readline(size))
+
+    def isatty(self) -> bool:
+        """Return False for streams of a thread."""
+        if getattr(self.local, 'stream', None) is not None:
+            return False
+        return bool(self.default.isatty())
+
+
+class _Writer(io.TextIOBase):
+    """Text stream handing what is written to a write function."""
+
+    def __init__(self, write: Callable[[str], None]) -> None:
+        """Initialize the stream."""
+        super().__init__()
+        self._write = write
+
+    def write(self, text: str) -> int:
+        """Hand on the text."""
+        self._write(text)
+        return len(text)
+
+
+@contextlib.contextmanager
+def _streams(
+    stdin: str,
+    write_out: Callable[[str], None],
+    write_err: Callable[[str], None],
+) -> Iterator[None]:
+    """Point the standard streams of the current thread elsewhere."""
+    with _STREAMS_LOCK:
+        if not _RUNNING[0]:
+            sys.stdin = _ThreadStream(sys.stdin)
+            sys.stdout = _ThreadStream(sys.stdout)
+            sys.stderr = _ThreadStream(sys.stderr)
+        _RUNNING[0] += 1
+        streams = sys.stdin, sys.stdout, sys.stderr
+
+    targets = (io.StringIO(stdin), _Writer(write_out), _Writer(write_err))
+    for stream, target in zip(streams, targets):
+        stream.local.stream = target  # type: ignore
+    try:
+        yield
+    finally:
+        for stream in streams:
+            stream.local.stream = None  # type: ignore
+        with _STREAMS_LOCK:
+            _RUNNING[0] -= 1
+            if not _RUNNING[0]:
+                sys.stdin = streams[0].default  # type: ignore
+                sys.stdout = streams[1].default  # type: ignore
+                sys.stderr = streams[2].default  # type: ignore
+
+
+@contextlib.contextmanager
+def _environment(env: Optional[Dict[str, str]]) -> Iterator[None]:
+    """Use the hass-cli settings of env in place of our own, if given."""
+    if env is None:
+        yield
+        return
+
+    with _ENV_LOCK:
+        saved = {
+            name: value
+            for name, value in os.environ.items()
+            if name.startswith(const.AGENT_ENV_PREFIXES)
+        }
+        for name in saved:
+            del os.environ[name]
+        os.environ.update(
+            {
+                name: value
+                for name, value in env.items()
+                if name.startswith(const.AGENT_ENV_PREFIXES)
+            }
+        )
+        try:
+            yield
+        finally:
+            for name in [
+                n
+                for n in os.environ
+                if n.startswith(const.AGENT_ENV_PREFIXES)
+            ]:
+                del os.environ[name]
+            os.environ.update(saved)
+
+
+def run_command(
+    args: List[str],
+    write_out: Callable[[str], None],
+    write_err: Callable[[str], None],
+    env: Optional[Dict[str, str]] = None,
+    stdin: str = '',
+    shared: Optional[Shared] = None,
+    defaults: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Run a command line and return its exit code.
+
+    The command sees the given standard input and, if given, environment.
+    It shares connections with the other commands run with `shared`.
+    Global options missing from the command line are taken from
+    `defaults`, keyed by parameter name.
+    """
+    from homeassistant_cli.cli import main
+
+    obj = Configuration()
+    obj.shared = shared
+    if shared is not None:
+        obj.pool_size = max(obj.pool_size, shared.pool_size)
+
+    root = logging.getLogger()
+    level = root.level
+    with _environment(env), _streams(stdin, write_out, write_err):
+        try:
+            return main(list(args), obj, defaults)
+        except SystemExit as ex:
+            if ex.code is None or isinstance(ex.code, int):
+                return ex.code or 0
+            write_err(f"{ex.code}\n")
+            return 1
+        finally:
+            # --loglevel of the command must not stick
+            root.setLevel(level)
+
+
+class Result(NamedTuple):
+    """Outcome of one command of a batch."""
+
+    number: int
+    args: List[str]
+    code: int
+    out: str
+    err: str
+    seconds: float
+
+
+def run_commands(
+    commands: Iterable[Tuple[int, List[str]]],
+    shared: Shared,
+    defaults: Optional[Dict[str, Any]] = None,
+    concurrency: int = 1,
+    ordered: bool = True,
+) -> Iterator[Result]:
+    """Run numbered command lines and yield their results.
+
+    At most `concurrency` commands run at once and only a few more are
+    read ahead. Results come in the order of the commands if `ordered`,
+    otherwise as soon as they are done.
+    """
+
+    def run(number: int, args: List[str]) -> Result:
+        out = []  # type: List[str]
+        err = []  # type: List[str]
+        start = time.monotonic()
+        code = run_command(
+            args, out.append, err.append, shared=shared, defaults=defaults
+        )
+        return Result(
+            number,
+            args,
+            code,
+            ''.join(out),
+            ''.join(err),
+            time.monotonic() - start,
+        )
+
+    concurrency = max(concurrency, 1)
+    pending = collections.deque()  # type: Deque[Any]
+
+    def finished(block: bool) -> Iterator[Result]:
+        if ordered:
+            while pending and (block or pending[0].done()):
+                yield pending.popleft().result()
+                block = False
+            return
+        done, _ = wait(
+            pending, timeout=None if block else 0, return_when=FIRST_COMPLETED
+        )
+        for future in [f for f in pending if f in done]:
+            pending.remove(future)
+            yield future.result()
+
+    with ThreadPoolExecutor(
+        concurrency, thread_name_prefix='hass-cli-batch'
+    ) as pool:
+        for number, args in commands:
+            pending.append(pool.submit(run, number, args))
+            yield from finished(block=len(pending) > 2 * concurrency)
+        while pending:
+            yield from finished(block=True)
@@ -0,0 +1,362 @@
+"""Filter expressions over states, as given to `--where`.
+
+An expression is compiled once to a function testing one state, thus
+filtering costs one call per state. Examples:
+
+    domain == sensor and state > 30
+    attributes.battery_level < 15 or state in (unavailable, unknown)
+    entity_id ~ 'light.*_ceiling' and last_changed > 2h ago
+
+Comparisons are `==` (or `=`), `!=`, `<`, `<=`, `>`, `>=`, `~` (glob),
+`!~` (no glob match), `=~` (regular expression) and `in (a, b, ...)`.
+They combine with `and`, `or`, `not` and parentheses, a field on its own
+tests it is set. Fields are `entity_id`, `domain`, `state`,
+`last_changed`, `last_updated` and dotted paths like `attributes.unit`.
+
+Values compare as numbers when the value given is a number, and as
+times on `last_changed` and `last_updated`, given either as ISO time or
+as a duration followed by `ago`. Values that cannot be converted never
+match. For lists, like the members of a group, any item may match.
+Cheap tests, like on the domain, run before lookups of attributes.
+"""
+from datetime import datetime, timezone
+import fnmatch
+import operator
+import re
+from typing import Any, Callable, List, Optional, Pattern, Tuple  # noqa
+
+import click
+
+import homeassistant_cli.helper as helper
+
+Predicate = Callable[[Any], bool]
+
+TIME_FIELDS = ('last_changed', 'last_updated')
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    |(?P<op>==|!=|<=|>=|=~|!~|<|>|=|~)
+    |(?P<punct>[(),])
+    |(?P<word>[^\s()<>=!~,"']+)
+    )""",
+    re.VERBOSE,
+)
+_NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+_KEYWORDS = {'and', 'or', 'not', 'in', 'ago'}
+_ORDERING = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+_CONSTANTS = {'true': True, 'false': False, 'none': None, 'null': None}
+
+# rough cost of a test, used to run the cheap ones first
+_COST_FIELD = {'entity_id': 1, 'domain': 1, 'state': 2}
+_COST_PATH = 3
+_COST_TIME = 3
+_COST_PATTERN = 1
+_COST_REGEX = 2
+
+_MISSING = object()
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    """Return the kinds and values of the tokens of an expression."""
+    tokens = []  # type: List[Tuple[str, str]]
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise click.BadParameter(
+                f"Cannot read the expression at: {text[pos:]}"
+            )
+        kind = match.lastgroup or ''
+        value = match.group(kind)
+        if kind == 'word' and value.lower() in _KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+def _to_time(value: Any) -> Optional[datetime]:
+    """Return value as time, None if it is not one."""
+    if isinstance(value, datetime):
+        return value
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed
+
+
+def _to_number(value: Any) -> Optional[float]:
+    """Return value as number, None if it is not one."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_text(value: Any) -> Any:
+    """Return value as text, leaving booleans and None as they are."""
+    if value is None or isinstance(value, bool):
+        return value
+    return str(value)
+
+
+def _field(path: str) -> Tuple[Callable[[Any], Any], int]:
+    """Return a function getting the field of a state and its cost."""
+    if path == 'domain':
+        return (lambda state: state['entity_id'].split('.', 1)[0]), 1
+    if path in _COST_FIELD or path in TIME_FIELDS:
+        return (lambda state: state.get(path, _MISSING)), _COST_FIELD.get(
+            path, 2
+        )
+
+    lookup = helper.compile_path(path)
+
+    def get(state: Any) -> Any:
+        found = lookup(state)
+        return found[0] if found else _MISSING
+
+    return get, _COST_PATH
+
+
+def _any(test: Predicate) -> Predicate:
+    """Return a test also holding for lists having a matching item."""
+
+    def check(value: Any) -> bool:
+        if value is _MISSING:
+            return False
+        if isinstance(value, (list, tuple)):
+            return any(test(item) for item in value)
+        return test(value)
+
+    return check
+
+
+def _compare(path: str, op: str, value: Any) -> Tuple[Predicate, int]:
+    """Return the test of one comparison and its cost."""
+    get, cost = _field(path)
+
+    if path == 'domain' and op in ('==', '=', 'in'):
+        # a prefix test, without splitting the entity id
+        domains = value if op == 'in' else [value]
+        prefixes = tuple(f'{domain}.' for domain in domains)
+        return (lambda state: state['entity_id'].startswith(prefixes)), 1
+
+    if op in ('~', '!~'):
+        regex = re.compile(fnmatch.translate(str(value)))
+        test = _any(lambda v: bool(regex.match(str(v))))
+        if op == '!~':
+            return (lambda state: not test(get(state))), cost + _COST_PATTERN
+        return (lambda state: test(get(state))), cost + _COST_PATTERN
+
+    if op == '=~':
+        try:
+            pattern = re.compile(str(value))  # type: Pattern
+        except re.error as ex:
+            raise click.BadParameter(f"Not a regular expression: {ex}")
+        test = _any(lambda v: bool(pattern.search(str(v))))
+        return (lambda state: test(get(state))), cost + _COST_REGEX
+
+    values = value if op == 'in' else [value]
+    times = path in TIME_FIELDS or isinstance(values[0], datetime)
+    if times:
+        convert = _to_time  # type: Callable[[Any], Any]
+        cost += _COST_TIME
+        if any(not isinstance(v, datetime) for v in values):
+            raise click.BadParameter(
+                f"{path} is compared with times, like `1h ago` or ISO time"
+            )
+    elif any(isinstance(v, float) for v in values):
+        convert = _to_number
+    else:
+        convert = _to_text
+
+    if op == 'in':
+        wanted = set(values)
+        test = _any(lambda v: convert(v) in wanted)
+    elif op in ('==', '='):
+        test = _any(lambda v: convert(v) == value)
+    elif op == '!=':
+        # values that cannot be converted do not match either way
+        strict = convert is not _to_text
+
+        def differs(v: Any) -> bool:
+            converted = convert(v)
+            if strict and converted is None:
+                return False
+            return bool(converted != value)
+
+        test = _any(differs)
+    else:
+        if value is None or isinstance(value, bool):
+            raise click.BadParameter(f"Cannot order by {op} {value}")
+        order = _ORDERING[op]
+
+        def ordered(v: Any) -> bool:
+            converted = convert(v)
+            if converted is None or isinstance(converted, bool):
+                return False
+            return bool(order(converted, value))
+
+        test = _any(ordered)
+
+    return (lambda state: test(get(state))), cost
+
+
+class _Parser:
+    """Recursive descent parser building the tests of an expression."""
+
+    def __init__(self, text: str) -> None:
+        """Initialize with the expression."""
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.now = datetime.now(timezone.utc)
+        self.fields = []  # type: List[str]
+
+    def peek(self) -> Tuple[str, str]:
+        """Return the next token, without taking it."""
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return ('end', '')
+
+    def take(self, kind: str, value: Optional[str] = None) -> str:
+        """Take the next token, which must be of kind."""
+        token = self.peek()
+        if token[0] != kind or (value is not None and token[1] != value):
+            found = token[1] or 'the end'
+            raise click.BadParameter(
+                f"Expected {value or kind} but found {found}"
+            )
+        self.pos += 1
+        return token[1]
+
+    def parse(self) -> Tuple[Predicate, int]:
+        """Return the test of the whole expression."""
+        result = self.disjunction()
+        if self.peek()[0] != 'end':
+            raise click.BadParameter(f"Unexpected {self.peek()[1]}")
+        return result
+
+    def disjunction(self) -> Tuple[Predicate, int]:
+        """Parse tests joined by `or`."""
+        parts = [self.conjunction()]
+        while self.peek() == ('keyword', 'or'):
+            self.take('keyword')
+            parts.append(self.conjunction())
+        return _combine(parts, any)
+
+    def conjunction(self) -> Tuple[Predicate, int]:
+        """Parse tests joined by `and`."""
+        parts = [self.negation()]
+        while self.peek() == ('keyword', 'and'):
+            self.take('keyword')
+            parts.append(self.negation())
+        return _combine(parts, all)
+
+    def negation(self) -> Tuple[Predicate, int]:
+        """Parse a test, possibly negated."""
+        if self.peek() == ('keyword', 'not'):
+            self.take('keyword')
+            test, cost = self.negation()
+            return (lambda state: not test(state)), cost
+        if self.peek() == ('punct', '('):
+            self.take('punct', '(')
+            result = self.disjunction()
+            self.take('punct', ')')
+            return result
+        return self.comparison()
+
+    def comparison(self) -> Tuple[Predicate, int]:
+        """Parse a comparison of a field, or a field on its own."""
+        path = self.take('word')
+        self.fields.append('entity_id' if path == 'domain' else path)
+        kind, op = self.peek()
+        if kind == 'keyword' and op == 'in':
+            self.take('keyword')
+            return _compare(path, 'in', self.values(path))
+        if kind != 'op':
+            get, cost = _field(path)
+            return (lambda state: _is_set(get(state))), cost
+        self.take('op')
+        return _compare(path, op, self.value(path))
+
+    def values(self, path: str) -> List[Any]:
+        """Parse a parenthesized list of values."""
+        self.take('punct', '(')
+        values = [self.value(path)]
+        while self.peek() == ('punct', ','):
+            self.take('punct')
+            values.append(self.value(path))
+        self.take('punct', ')')
+        return values
+
+    def value(self, path: str) -> Any:
+        """Parse a value, converted the way the field is compared."""
+        kind, text = self.peek()
+        if kind == 'string':
+            self.take('string')
+            text = re.sub(r'\\(.)', r'\1', text[1:-1])
+            if path in TIME_FIELDS:
+                return _to_time(text) or text
+            return text
+        text = self.take('word')
+
+        if path in TIME_FIELDS:
+            if self.peek() == ('keyword', 'ago'):
+                self.take('keyword')
+                return self.now - helper.to_timedelta(text)
+            return _to_time(text) or text
+        if text.lower() in _CONSTANTS:
+            return _CONSTANTS[text.lower()]
+        if _NUMBER.match(text):
+            return float(text)
+        return text
+
+
+def _is_set(value: Any) -> bool:
+    """Return True for values other than missing, None or empty."""
+    return value is not _MISSING and value not in (None, '', [], {})
+
+
+def _combine(
+    parts: List[Tuple[Predicate, int]], how: Callable[[Any], bool]
+) -> Tuple[Predicate, int]:
+    """Return the test of parts joined by `and` (all) or `or` (any)."""
+    if len(parts) == 1:
+        return parts[0]
+    parts = sorted(parts, key=lambda part: part[1])
+    tests = [test for test, _ in parts]
+    cost = sum(cost for _, cost in parts)
+    return (lambda state: how(test(state) for test in tests)), cost
+
+
+class Condition:  # pylint: disable=too-few-public-methods
+    """Compiled expression, called with a state to test it."""
+
+    def __init__(self, expression: str) -> None:
+        """Compile the expression."""
+        parser = _Parser(expression)
+        self._test, _ = parser.parse()
+        self.expression = expression
+        # the fields of the states the expression looks at
+        self.fields = list(dict.fromkeys(parser.fields))
+
+    def __call__(self, state: Any) -> bool:
+        """Return True if the state matches the expression."""
+        return self._test(state)
+
+
+def compile_where(expression: str) -> Condition:
+    """Return the condition telling whether a state matches the expression."""
+    return Condition(expression)
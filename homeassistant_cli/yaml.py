@@ -1,38 +1,97 @@
 """Yaml utility for hass-cli."""
 
-from typing import Any, Optional, cast
+from io import StringIO
+import threading
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Tuple, cast
 
-from ruamel.yaml import YAML
-from ruamel.yaml.compat import StringIO
+if TYPE_CHECKING:
+    from ruamel.yaml import YAML
 
 
-def yaml() -> YAML:
-    """Return default YAML parser."""
-    yamlp = YAML(typ='safe', pure=True)
-    yamlp.preserve_quotes = cast(None, True)
+def _safe(explicit_start: bool = False) -> 'YAML':
+    """Return a safe YAML instance, using the C parser when available.
+
+    Output keeps the layout hass-cli always had, which only the Python
+    emitter can write.
+    """
+    from ruamel.yaml import YAML
+    from ruamel.yaml.emitter import Emitter
+    from ruamel.yaml.representer import SafeRepresenter
+
+    class Representer(SafeRepresenter):  # pylint: disable=too-many-ancestors
+        """Representer writing None as an empty value, like round-trip."""
+
+        def represent_none(self, data: Any) -> Any:
+            """Represent None, as `null` only if it is all there is."""
+            if not self.represented_objects and not getattr(
+                self.serializer, 'use_explicit_start', False
+            ):
+                return self.represent_scalar('tag:yaml.org,2002:null', 'null')
+            return self.represent_scalar('tag:yaml.org,2002:null', '')
+
+    Representer.add_representer(type(None), Representer.represent_none)
+
+    # without pure=True ruamel.yaml picks the libyaml based parser and
+    # emitter of ruamel.yaml.clib if installed, the emitter of which
+    # ignores the indentation
+    yamlp = YAML(typ='safe')
+    yamlp.Emitter = Emitter
+    yamlp.Representer = Representer
     yamlp.default_flow_style = False
+    yamlp.indent(mapping=4, sequence=6, offset=3)
+    yamlp.explicit_start = explicit_start
+    # keep the order of the keys as Home Assistant returns them
+    yamlp.representer.sort_base_mapping_type_on_output = False
     return yamlp
 
 
-def loadyaml(yamlp: YAML, source: str) -> Any:
+# YAML instances keep state while loading or dumping, thus every thread
+# gets its own
+_LOCAL = threading.local()
+
+
+def _cached(key: Tuple[str, bool]) -> 'YAML':
+    """Return the YAML instance for key of the current thread."""
+    instances = getattr(_LOCAL, 'instances', None)
+    if instances is None:
+        instances = _LOCAL.instances = {}
+    if key not in instances:
+        instances[key] = _safe(key[1])
+    return cast('YAML', instances[key])
+
+
+def yaml() -> 'YAML':
+    """Return default YAML parser and emitter, shared by the thread."""
+    return _emitter()
+
+
+def _emitter(explicit_start: bool = False) -> 'YAML':
+    """Return the YAML emitter shared by the whole thread."""
+    return _cached(('emitter', explicit_start))
+
+
+def loadyaml(yamlp: 'YAML', source: str) -> Any:
     """Load YAML."""
     return yamlp.load(source)
 
 
 def dumpyaml(
-    yamlp: YAML, data: Any, stream: Any = None, **kw: Any
+    yamlp: 'YAML', data: Any, stream: Any = None, **kw: Any
 ) -> Optional[str]:
-    """Dump YAML to string."""
+    """Dump YAML to string, with the settings of yamlp."""
     inefficient = False
     if stream is None:
         inefficient = True
         stream = StringIO()
-    # overriding here to get dumping to
-    # not sort keys.
-    yamlp = YAML()
-    yamlp.indent(mapping=4, sequence=6, offset=3)
-    # yamlp.compact(seq_seq=False, seq_map=False)
     yamlp.dump(data, stream, **kw)
     if inefficient:
         return cast(str, stream.getvalue())
     return None
+
+
+def dumpyaml_all(documents: Iterable[Any], stream: Any) -> None:
+    """Dump every item as a document of its own, each starting with ---.
+
+    Documents are written as they come, thus it suits endless streams.
+    """
+    _emitter(explicit_start=True).dump_all(documents, stream)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark the memory taken by states and registry entries.
+
+Compares the dictionaries decoded from the server's JSON with the
+records of homeassistant_cli.records, as the agent and batch mode keep
+them, and times making the records and turning them back.
+
+    $ python script/bench_records.py [number of entities]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from homeassistant_cli import records
+
+
+def states(count: int) -> str:
+    """Return count states shaped like the ones of Home Assistant."""
+    return json.dumps(
+        [
+            {
+                'entity_id': f'sensor.sensor_{i}',
+                'state': 'on' if i % 3 else str(i * 0.5),
+                'attributes': {
+                    'friendly_name': f'Sensor {i}',
+                    'unit_of_measurement': '°C',
+                    'device_class': 'temperature',
+                },
+                'last_changed': '2019-01-27T23:19:55.322474+00:00',
+                'last_updated': '2019-01-27T23:19:55.322474+00:00',
+                'context': {
+                    'id': f'{i:032x}',
+                    'parent_id': None,
+                    'user_id': None,
+                },
+            }
+            for i in range(count)
+        ]
+    )
+
+
+def entities(count: int) -> str:
+    """Return count entries of the entity registry."""
+    return json.dumps(
+        [
+            {
+                'entity_id': f'sensor.sensor_{i}',
+                'name': None,
+                'platform': 'mqtt',
+                'device_id': f'{i // 4:032x}',
+                'area_id': f'area_{i % 20}',
+                'config_entry_id': f'{i % 5:032x}',
+                'disabled_by': None,
+                'hidden_by': None,
+                'entity_category': None,
+                'icon': None,
+            }
+            for i in range(count)
+        ]
+    )
+
+
+def measured(build: Callable[[], Any]) -> Tuple[Any, int, float]:
+    """Return what build made, the bytes it holds and the time it took."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, size, elapsed
+
+
+def compare(name: str, text: str, record: Any) -> None:
+    """Print the memory of the entries of text as dicts and as records."""
+
+    def as_dicts() -> List[Dict[str, Any]]:
+        return json.loads(text)  # type: ignore
+
+    def as_records() -> Tuple[Any, ...]:
+        return tuple(record.from_dict(entry) for entry in json.loads(text))
+
+    _, dict_size, dict_time = measured(as_dicts)
+    kept, record_size, record_time = measured(as_records)
+
+    start = time.perf_counter()
+    for entry in kept:
+        entry.as_dict()
+    back = time.perf_counter() - start
+
+    print(f"{name}:")
+    print(f"  {'dicts':<10} {dict_size / 2 ** 20:8.2f} MiB {dict_time:8.3f}s")
+    print(
+        f"  {'records':<10} {record_size / 2 ** 20:8.2f} MiB "
+        f"{record_time:8.3f}s"
+    )
+    print(f"  {'as_dict()':<10} {'':12} {back:8.3f}s")
+    print(f"  Memory saved: {1 - record_size / dict_size:5.1%}")
+
+
+def main() -> None:
+    """Run the benchmark."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f"Keeping {count} entities")
+    compare('States', states(count), records.State)
+    compare('Entity registry', entities(count), records.Entity)
+
+
+if __name__ == '__main__':
+    main()
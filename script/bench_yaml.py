@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Benchmark YAML loading and output of a large state list.
+
+Compares a new pure Python parser per call, as hass-cli used to do, with
+the shared parser of homeassistant_cli.yaml, which uses libyaml when
+installed. Output compares a new round-trip emitter per call with the
+shared emitter, both dumping the list at once and streaming it item by
+item as `state list -o yaml` does. Both write with the Python emitter,
+the only one keeping the layout of hass-cli, thus output only gains
+from reusing the emitter.
+
+    $ python script/bench_yaml.py [number of states]
+"""
+from io import StringIO
+import sys
+import time
+from typing import Any, Callable, Dict, List, cast
+
+from ruamel.yaml import YAML
+
+from homeassistant_cli import yaml
+
+
+def states(count: int) -> List[Dict[str, Any]]:
+    """Return count states shaped like the ones of Home Assistant."""
+    return [
+        {
+            'entity_id': f'sensor.sensor_{i}',
+            'state': str(i * 0.5),
+            'attributes': {
+                'friendly_name': f'Sensor {i}',
+                'unit_of_measurement': '°C',
+                'device_class': 'temperature',
+            },
+            'last_changed': '2019-01-27T23:19:55.322474+00:00',
+            'last_updated': '2019-01-27T23:19:55.322474+00:00',
+            'context': {'id': f'{i:032x}', 'user_id': None},
+        }
+        for i in range(count)
+    ]
+
+
+def old_load(text: str) -> Any:
+    """Load like hass-cli did before, with a new parser per call."""
+    return YAML(typ='safe', pure=True).load(text)
+
+
+def new_load(text: str) -> Any:
+    """Load with the shared parser."""
+    return yaml.loadyaml(yaml.yaml(), text)
+
+
+def old_dump(data: Any, stream: Any) -> None:
+    """Dump like hass-cli did before, with a new emitter per call."""
+    yamlp = YAML()
+    yamlp.indent(mapping=4, sequence=6, offset=3)
+    yamlp.dump(data, stream)
+
+
+def new_dump(data: Any, stream: Any) -> None:
+    """Dump with the shared emitter."""
+    yaml.dumpyaml(yaml.yaml(), data, stream)
+
+
+def timed(name: str, func: Callable[[], None]) -> float:
+    """Run func and print how long it took."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:8.3f}s")
+    return elapsed
+
+
+def main() -> None:
+    """Run the benchmark."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    data = states(count)
+    text = cast(str, yaml.dumpyaml(yaml.yaml(), data))
+    print(f"Loading {count} states")
+
+    before_load = timed('old', lambda: old_load(text))
+    after_load = timed('new', lambda: new_load(text))
+
+    print(f"Speedup: {before_load / after_load:5.1f}x")
+    print(f"Dumping {count} states")
+
+    before = timed('old, whole list', lambda: old_dump(data, StringIO()))
+    after = timed('new, whole list', lambda: new_dump(data, StringIO()))
+
+    def streamed(dump: Callable[[Any, Any], None]) -> Callable[[], None]:
+        def run() -> None:
+            stream = StringIO()
+            for item in data:
+                dump([item], stream)
+
+        return run
+
+    before_streamed = timed('old, item by item', streamed(old_dump))
+    after_streamed = timed('new, item by item', streamed(new_dump))
+
+    print(f"Speedup whole list:   {before / after:5.1f}x")
+    print(f"Speedup item by item: {before_streamed / after_streamed:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,14 @@ mydata_text - str with the raw text
 mydata      - Dict with the content parsed from json
 """
 
+import asyncio
 import json
 import os
+import socket
+import threading
+from typing import Any, Dict, Generator, List
 
+from aiohttp import WSMsgType, web
 import click_log.core as logcore
 import pkg_resources
 import pytest
@@ -50,3 +55,108 @@ def _all_fixtures():
 
 
 _all_fixtures()  # type: ignore
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch) -> str:
+    """Keep anything cached by a test in its own directory."""
+    path = str(tmp_path / 'cache')
+    monkeypatch.setenv('HASS_CACHE_DIR', path)
+    return path
+
+
+class FakeWebSocketServer:
+    """Minimal Home Assistant WebSocket API server running in a thread.
+
+    Frames received after authentication are passed to `responder`
+    which returns the list of messages to send back, None in the list
+    closes the connection.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the server."""
+        self.loop = asyncio.new_event_loop()
+        self.connections = 0
+        self.frames = []  # type: List[Dict[str, Any]]
+        self.responder = self.default_responder
+        self.url = ''
+        self._runner = None  # type: Any
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True
+        )
+
+    @staticmethod
+    def default_responder(frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Acknowledge every frame with a successful result."""
+        return [
+            {
+                'id': frame['id'],
+                'type': 'result',
+                'success': True,
+                'result': None,
+            }
+        ]
+
+    async def _handler(self, request: web.Request) -> web.WebSocketResponse:
+        """Serve one WebSocket connection."""
+        wsconn = web.WebSocketResponse()
+        await wsconn.prepare(request)
+        self.connections += 1
+
+        await wsconn.send_json({'type': 'auth_required'})
+        auth = await wsconn.receive_json()
+        if auth.get('access_token') == 'invalid':
+            await wsconn.send_json(
+                {'type': 'auth_invalid', 'message': 'Invalid access token'}
+            )
+            await wsconn.close()
+            return wsconn
+        await wsconn.send_json({'type': 'auth_ok'})
+
+        async for msg in wsconn:
+            if msg.type != WSMsgType.TEXT:
+                break
+            frame = json.loads(msg.data)
+            self.frames.append(frame)
+            for reply in self.responder(frame):
+                if reply is None:
+                    # a None reply hangs up on the client
+                    await wsconn.close()
+                    return wsconn
+                await wsconn.send_json(reply)
+
+        return wsconn
+
+    async def _start(self) -> None:
+        """Start listening on a free local port."""
+        app = web.Application()
+        app.router.add_get('/api/websocket', self._handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:{}'.format(sock.getsockname()[1])
+        await web.SockSite(self._runner, sock).start()
+
+    def start(self) -> None:
+        """Start the server thread."""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    def stop(self) -> None:
+        """Stop the server thread."""
+        asyncio.run_coroutine_threadsafe(
+            self._runner.cleanup(), self.loop
+        ).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def ws_server() -> Generator[FakeWebSocketServer, None, None]:
+    """Return a running fake WebSocket server."""
+    server = FakeWebSocketServer()
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,161 @@
+"""Tests for the agent running commands of other hass-cli processes."""
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+import requests_mock
+
+import homeassistant_cli.agent as agent
+from homeassistant_cli.config import Configuration
+import homeassistant_cli.runner as runner
+
+COMPACT = {'s': 'on', 'a': {'friendly_name': 'Kitchen'}, 'lc': 1.0}
+
+
+@pytest.fixture(name='socket_path')
+def socket_path_fixture(tmp_path, monkeypatch) -> str:
+    """Keep the socket of the agent in the directory of the test."""
+    path = str(tmp_path / 'agent.sock')
+    monkeypatch.setenv('HASS_AGENT_SOCKET', path)
+    return path
+
+
+@pytest.fixture(name='running')
+def running_fixture(ws_server, socket_path):
+    """Return a running agent following the states of the server."""
+
+    def responder(frame):
+        reply = [{'id': frame['id'], 'type': 'result', 'success': True}]
+        if frame['type'] == 'subscribe_entities':
+            reply.append(
+                {
+                    'id': frame['id'],
+                    'type': 'event',
+                    'event': {'a': {'light.kitchen': COMPACT}},
+                }
+            )
+        return reply
+
+    ws_server.responder = responder
+
+    ctx = Configuration()
+    ctx.server = ws_server.url
+    server = agent.Agent(ctx, socket_path)
+    listening = threading.Event()
+    thread = threading.Thread(
+        target=server.serve, args=(listening.set,), daemon=True
+    )
+    thread.start()
+    listening.wait(5)
+    for _ in range(500):
+        if server.status()['states'] is not None:
+            break
+        time.sleep(0.01)
+
+    yield server
+
+    server.stop()
+    thread.join(5)
+
+
+def test_forwardable() -> None:
+    """Test commands needing the terminal are not forwarded."""
+    assert agent._forwardable(['state', 'list'])
+    assert agent._forwardable(['state', 'edit', 'light.a', '--json', '{}'])
+    assert not agent._forwardable([])
+    assert not agent._forwardable(['agent', 'run'])
+    assert not agent._forwardable(['event', 'watch'])
+    assert not agent._forwardable(['state', 'edit', 'light.a'])
+    assert not agent._forwardable(['state', 'list', '--watch'])
+    assert not agent._forwardable(['template', 'tpl.j2'])
+
+
+def test_run_command_captures_output(monkeypatch) -> None:
+    """Test a command runs with the environment and streams it is given."""
+    out = []  # type: list
+    err = []  # type: list
+    monkeypatch.setenv('HASS_SERVER', 'http://mine:8123')
+
+    with requests_mock.Mocker() as mock:
+        mock.get('http://theirs:8123/api/states', text='[]')
+        code = runner.run_command(
+            ['-o', 'json', 'state', 'list'],
+            out.append,
+            err.append,
+            env={'HASS_SERVER': 'http://theirs:8123'},
+        )
+
+    assert code == 0
+    assert json.loads(''.join(out)) == []
+    assert os.environ['HASS_SERVER'] == 'http://mine:8123'
+
+    code = runner.run_command(['nosuchcommand'], out.append, err.append)
+    assert code == 2
+    assert 'No such command' in ''.join(err)
+
+
+def test_agent_runs_forwarded_command(running, ws_server, capsys) -> None:
+    """Test a forwarded command is answered from the mirrored states."""
+    args = ['--server', ws_server.url, '-o', 'json', 'state', 'list']
+
+    # no REST API mocked, the states must come from the agent
+    with requests_mock.Mocker():
+        code = agent.forward(args, ['state', 'list'])
+
+    assert code == 0
+    states = json.loads(capsys.readouterr().out)
+    assert [state['entity_id'] for state in states] == ['light.kitchen']
+    assert running.status()['served'] == 1
+
+
+def test_relative_paths_stay_local(
+    running, ws_server, tmp_path, monkeypatch
+) -> None:
+    """Test commands naming files relative to the caller are not forwarded.
+
+    The agent runs in another directory, where the paths name other files.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'ca.pem').write_text('')
+    words = ['state', 'list']
+
+    for cert in ('ca.pem', './ca.pem', '../elsewhere/ca.pem'):
+        args = ['--server', ws_server.url, '--cert', cert] + words
+        assert agent.forward(args, words) is None
+    assert agent.forward(['--cert=ca.pem'] + words, words) is None
+    assert running.status()['served'] == 0
+
+    assert not agent._relative_path(str(tmp_path / 'ca.pem'))
+    assert not agent._relative_path('light.kitchen')
+    assert not agent._relative_path('-')
+
+
+def test_busy_agent_leaves_command_to_caller(running, ws_server) -> None:
+    """Test a caller runs the command itself while the agent is busy."""
+    with running._busy:  # pylint: disable=protected-access
+        assert agent.forward(['state', 'list'], ['state', 'list']) is None
+
+
+def test_silent_agent_leaves_command_to_caller(
+    socket_path, monkeypatch
+) -> None:
+    """Test a caller runs the command itself if the agent never answers."""
+    monkeypatch.setattr(agent.const, 'AGENT_ANSWER_TIMEOUT', 0.2)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    try:
+        start = time.monotonic()
+        assert agent.forward(['state', 'list'], ['state', 'list']) is None
+        assert time.monotonic() - start < 5
+    finally:
+        server.close()
+
+
+def test_no_agent(socket_path) -> None:
+    """Test commands run locally when there is no agent."""
+    assert not agent.available()
+    assert agent.forward(['state', 'list'], ['state', 'list']) is None
@@ -0,0 +1,106 @@
+"""Tests for running many commands with batch."""
+
+import json
+from unittest import mock
+
+from click.testing import CliRunner
+import requests_mock
+
+import homeassistant_cli.cli as cli
+import homeassistant_cli.remote as api
+
+COMMANDS = """
+# lights first
+state get light.kitchen
+["state", "get", "light.bowl"]
+
+{"args": ["-o", "yaml", "state", "get", "light.kitchen"]}
+"""
+
+
+def _state(entity_id: str) -> str:
+    return json.dumps({'entity_id': entity_id, 'state': 'on'})
+
+
+def test_batch_runs_commands_in_order() -> None:
+    """Test commands run over one session, output in their order."""
+    with requests_mock.Mocker() as mock_api:
+        for entity_id in ('light.kitchen', 'light.bowl'):
+            mock_api.get(
+                f'http://localhost:8123/api/states/{entity_id}',
+                text=_state(entity_id),
+            )
+        with mock.patch.object(
+            api, '_new_session', wraps=api._new_session
+        ) as new_session:
+            result = CliRunner(mix_stderr=False).invoke(
+                cli.cli,
+                ['-o', 'ndjson', 'batch', '-j', '3', '--status'],
+                input=COMMANDS,
+                catch_exceptions=False,
+            )
+
+    assert result.exit_code == 0
+    lines = result.stdout.splitlines()
+    # -o of the batch applies unless the command sets its own
+    assert [json.loads(line)['entity_id'] for line in lines[:2]] == [
+        'light.kitchen',
+        'light.bowl',
+    ]
+    assert lines[2:4] == [
+        '   -  entity_id: light.kitchen',
+        '      state: on',
+    ]
+    assert new_session.call_count == 1
+
+    status = [json.loads(line) for line in result.stderr.splitlines()]
+    assert [(s['line'], s['exit']) for s in status] == [(3, 0), (4, 0), (6, 0)]
+    assert status[1]['args'] == ['state', 'get', 'light.bowl']
+
+
+def test_batch_unordered_reports_failures(tmp_path) -> None:
+    """Test a failing command fails the batch, the others still run."""
+    commands = tmp_path / 'commands.txt'
+    commands.write_text("state get light.kitchen\nnosuchcommand\n")
+
+    with requests_mock.Mocker() as mock_api:
+        mock_api.get(
+            'http://localhost:8123/api/states/light.kitchen',
+            text=_state('light.kitchen'),
+        )
+        result = CliRunner(mix_stderr=False).invoke(
+            cli.cli,
+            ['-o', 'json', 'batch', '--unordered', '-j', '2', str(commands)],
+        )
+
+    assert result.exit_code == 1
+    assert json.loads(result.stdout)[0]['entity_id'] == 'light.kitchen'
+    assert 'No such command' in result.stderr
+
+
+def test_batch_fail_fast() -> None:
+    """Test no commands run after a failure with --fail-fast."""
+    with requests_mock.Mocker() as mock_api:
+        mock_api.get(
+            'http://localhost:8123/api/states/light.kitchen',
+            text=_state('light.kitchen'),
+        )
+        result = CliRunner(mix_stderr=False).invoke(
+            cli.cli,
+            ['batch', '--fail-fast', '--format', 'cli'],
+            input="nosuchcommand\nstate get light.kitchen\n",
+        )
+
+    assert result.exit_code == 1
+    assert result.stdout == ''
+    assert not mock_api.called
+
+
+def test_batch_bad_line() -> None:
+    """Test unreadable lines are reported with their number."""
+    result = CliRunner(mix_stderr=False).invoke(
+        cli.cli, ['batch', '--format', 'ndjson'], input='\n{"args": 1}\n'
+    )
+
+    assert result.exit_code == 1
+    assert 'Line 2' in str(result.exception)
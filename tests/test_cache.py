@@ -0,0 +1,155 @@
+"""Tests for the on-disk cache."""
+import json
+import sys
+import time
+import unittest.mock as mock
+
+from click.testing import CliRunner
+import requests_mock
+
+import homeassistant_cli.cache as cache
+import homeassistant_cli.cli as cli
+import homeassistant_cli.config as config
+from homeassistant_cli.config import Configuration
+import homeassistant_cli.remote as api
+
+
+def _config(**kwargs) -> Configuration:
+    """Return a configuration with the cache enabled."""
+    cfg = Configuration()
+    cfg.server = 'http://localhost:8123'
+    cfg.token = 'supersecret'
+    cfg.cache = True
+    for key, value in kwargs.items():
+        setattr(cfg, key, value)
+    return cfg
+
+
+def test_state_list_uses_cache(basic_entities_text) -> None:
+    """Test repeated invocations with --cache hit the server once."""
+    with requests_mock.Mocker() as mock_http:
+        states = mock_http.get(
+            "http://localhost:8123/api/states",
+            text=basic_entities_text,
+            status_code=200,
+        )
+
+        runner = CliRunner()
+        for _ in range(2):
+            result = runner.invoke(
+                cli.cli,
+                ["--cache", "--output=json", "state", "list"],
+                catch_exceptions=False,
+            )
+            assert result.exit_code == 0
+            assert len(json.loads(result.output)) == 3
+
+        assert states.call_count == 1
+
+        result = runner.invoke(
+            cli.cli,
+            ["--refresh", "--output=json", "state", "list"],
+            catch_exceptions=False,
+        )
+        assert result.exit_code == 0
+        assert states.call_count == 2
+
+
+def test_cache_expires(default_areas) -> None:
+    """Test entries older than their TTL are refetched."""
+    cfg = _config()
+    with mock.patch(
+        'homeassistant_cli.remote.wsapi',
+        return_value={'result': default_areas},
+    ) as wsapi:
+        assert api.get_areas(cfg) == default_areas
+        assert api.get_areas(cfg) == default_areas
+        assert wsapi.call_count == 1
+
+        with mock.patch.dict(cache.const.CACHE_TTL, {'areas': 0}):
+            time.sleep(0.01)
+            api.get_areas(cfg)
+        assert wsapi.call_count == 2
+
+
+def test_cache_invalidated_by_changes(default_areas) -> None:
+    """Test changes made through hass-cli drop the affected entries."""
+    cfg = _config()
+    with mock.patch(
+        'homeassistant_cli.remote.wsapi',
+        return_value={'result': default_areas, 'success': True},
+    ) as wsapi:
+        api.get_areas(cfg)
+        api.rename_area(cfg, default_areas[0]['area_id'], 'Shed')
+        api.get_areas(cfg)
+
+        assert wsapi.call_count == 3
+
+
+def test_cache_keyed_by_token(default_areas) -> None:
+    """Test entries are not shared between different credentials."""
+    with mock.patch(
+        'homeassistant_cli.remote.wsapi',
+        return_value={'result': default_areas},
+    ) as wsapi:
+        api.get_areas(_config())
+        api.get_areas(_config(token='other'))
+
+        assert wsapi.call_count == 2
+
+
+def test_cache_resolved_server(monkeypatch) -> None:
+    """Test a discovered server is remembered."""
+    # resolve_server never runs discovery when under pytest
+    monkeypatch.delitem(sys.modules, 'pytest')
+    monkeypatch.delenv('HASSIO_TOKEN', raising=False)
+
+    cfg = _config(server='auto', cache=False)
+    with mock.patch(
+        'homeassistant_cli.config._locate_ha',
+        return_value='http://hass.local:8123',
+    ) as locate, mock.patch(
+        'homeassistant_cli.config._server_answers', return_value=True
+    ) as probe:
+        assert cfg.resolve_server() == 'http://hass.local:8123'
+        cfg.resolved_server = None
+        assert cfg.resolve_server() == 'http://hass.local:8123'
+
+        assert locate.call_count == 1
+        probe.assert_called_once_with('http://hass.local:8123', mock.ANY)
+
+
+def test_cache_resolved_server_gone(monkeypatch) -> None:
+    """Test discovery runs again if the remembered server is gone."""
+    monkeypatch.delitem(sys.modules, 'pytest')
+    monkeypatch.delenv('HASSIO_TOKEN', raising=False)
+
+    cfg = _config(server='auto')
+    with mock.patch(
+        'homeassistant_cli.config._locate_ha',
+        side_effect=['http://old.local:8123', 'http://new.local:8123'],
+    ) as locate, mock.patch(
+        'homeassistant_cli.config._server_answers', return_value=False
+    ):
+        assert cfg.resolve_server() == 'http://old.local:8123'
+        cfg.resolved_server = None
+        assert cfg.resolve_server() == 'http://new.local:8123'
+
+        assert locate.call_count == 2
+
+
+def test_cache_resolved_server_dropped() -> None:
+    """Test a remembered server that no longer answers is forgotten."""
+    cfg = _config(server='auto')
+    cache.write('auto', cfg, 'server', 'http://old.local:8123')
+
+    def locate(_timeout):
+        # gone before searching again, which may take long or fail
+        assert cache.read('auto', cfg, 'server') is None
+
+    with mock.patch(
+        'homeassistant_cli.config._locate_ha', side_effect=locate
+    ), mock.patch(
+        'homeassistant_cli.config._server_answers', return_value=False
+    ):
+        assert config._cached_locate_ha(cfg) is None
@@ -1,10 +1,12 @@
 """Tests file for Home Assistant CLI (hass-cli)."""
 from typing import cast
+from unittest import mock
 
 import requests_mock
 
 import homeassistant_cli.autocompletion as autocompletion
 import homeassistant_cli.cli as cli
+import homeassistant_cli.const as const
 from homeassistant_cli.config import Configuration
 
 
@@ -94,3 +96,75 @@ def test_area_completion(default_events_text) -> None:
 
         assert "component_loaded" in resultdict
         assert resultdict["component_loaded"] == ""
+
+
+def test_entity_completion_prefix(basic_entities_text) -> None:
+    """Test completion matches on the start of the entity id."""
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            'http://localhost:8123/api/states',
+            text=basic_entities_text,
+            status_code=200,
+        )
+
+        cfg = cli.cli.make_context('hass-cli', ['entity', 'get'])
+        result = autocompletion.entities(
+            cfg, ["entity", "get"], "sensor.o"  # type: ignore
+        )
+
+        assert result == [('sensor.one', 'friendly long name')]
+
+
+def test_completion_uses_index_offline(basic_entities_text) -> None:
+    """Test completion is served from the index without the network."""
+    with requests_mock.Mocker() as mock:
+        states = mock.get(
+            'http://localhost:8123/api/states',
+            text=basic_entities_text,
+            status_code=200,
+        )
+
+        cfg = cli.cli.make_context('hass-cli', ['entity', 'get'])
+        autocompletion.entities(cfg, ["entity", "get"], "")  # type: ignore
+
+    # any request made now would fail as nothing is mocked
+    with requests_mock.Mocker():
+        cfg = cli.cli.make_context('hass-cli', ['entity', 'get'])
+        result = autocompletion.entities(
+            cfg, ["entity", "get"], ""  # type: ignore
+        )
+
+    assert states.call_count == 1
+    assert len(result) == 3
+
+
+def test_completion_stale_index_refreshes_in_background(
+    basic_entities_text,
+) -> None:
+    """Test a stale index is used while refreshed by another process."""
+    with requests_mock.Mocker() as mock_http:
+        mock_http.get(
+            'http://localhost:8123/api/states',
+            text=basic_entities_text,
+            status_code=200,
+        )
+        cfg = cli.cli.make_context('hass-cli', ['entity', 'get'])
+        autocompletion.entities(cfg, ["entity", "get"], "")  # type: ignore
+
+    with mock.patch.dict(const.CACHE_TTL, {'completion': -1}):
+        with mock.patch('subprocess.Popen') as popen:
+            with requests_mock.Mocker():
+                cfg = cli.cli.make_context('hass-cli', ['entity', 'get'])
+                result = autocompletion.entities(
+                    cfg, ["entity", "get"], ""  # type: ignore
+                )
+                autocompletion.entities(
+                    cfg, ["entity", "get"], ""  # type: ignore
+                )
+
+    assert len(result) == 3
+    assert popen.call_count == 1
+    assert popen.call_args[0][0][-2:] == [
+        'homeassistant_cli.autocompletion',
+        'entities',
+    ]
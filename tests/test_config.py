@@ -0,0 +1,84 @@
+"""Tests for the configuration and server discovery."""
+import socket
+import threading
+import time
+import unittest.mock as mock
+
+import homeassistant_cli.config as config
+
+
+class _FakeInfo:
+    """A resolved zeroconf service."""
+
+    def __init__(self, base_url: str) -> None:
+        """Initialize the service."""
+        self.properties = {b'base_url': base_url.encode('utf-8')}
+
+
+def _browser(delay: float, *names: str):
+    """Return a ServiceBrowser announcing names after delay."""
+
+    def browse(zconf, service_type, listener):
+        def announce():
+            time.sleep(delay)
+            for name in names:
+                listener.add_service(zconf, service_type, name)
+
+        threading.Thread(target=announce, daemon=True).start()
+
+    return browse
+
+
+def test_locate_ha_returns_on_first_service() -> None:
+    """Test discovery does not wait longer than the first answer."""
+    zconf = mock.MagicMock()
+    zconf.get_service_info.return_value = _FakeInfo('http://hass:8123')
+
+    with mock.patch('zeroconf.Zeroconf', return_value=zconf), mock.patch(
+        'zeroconf.ServiceBrowser', side_effect=_browser(0.02, 'hass')
+    ):
+        start = time.monotonic()
+        assert config._locate_ha(timeout=5) == 'http://hass:8123'
+        assert time.monotonic() - start < 1
+
+    zconf.close.assert_called_once_with()
+
+
+def test_locate_ha_first_of_several() -> None:
+    """Test the first instance to answer is used."""
+    zconf = mock.MagicMock()
+    zconf.get_service_info.side_effect = lambda _type, name: _FakeInfo(
+        f'http://{name}:8123'
+    )
+
+    with mock.patch('zeroconf.Zeroconf', return_value=zconf), mock.patch(
+        'zeroconf.ServiceBrowser', side_effect=_browser(0, 'one', 'two')
+    ):
+        assert config._locate_ha(timeout=5) == 'http://one:8123'
+
+
+def test_locate_ha_timeout() -> None:
+    """Test discovery gives up after the timeout."""
+    zconf = mock.MagicMock()
+    zconf.get_service_info.return_value = None
+
+    with mock.patch('zeroconf.Zeroconf', return_value=zconf), mock.patch(
+        'zeroconf.ServiceBrowser', side_effect=_browser(0, 'incomplete')
+    ):
+        start = time.monotonic()
+        assert config._locate_ha(timeout=0.1) is None
+        assert time.monotonic() - start < 1
+
+
+def test_server_answers() -> None:
+    """Test the probe of a remembered server."""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    port = server.getsockname()[1]
+    try:
+        assert config._server_answers(f'http://127.0.0.1:{port}', 1)
+    finally:
+        server.close()
+
+    assert not config._server_answers(f'http://127.0.0.1:{port}', 1)
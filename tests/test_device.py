@@ -61,19 +61,71 @@ def test_device_assign(default_areas, default_devices) -> None:
             'homeassistant_cli.remote.get_areas', return_value=default_areas
         ):
             with mock.patch(
-                'homeassistant_cli.remote.assign_area',
-                return_value={'success': True},
-            ):
+                'homeassistant_cli.remote.assign_areas',
+                return_value=[{'success': True}],
+            ) as assign:
 
                 runner = CliRunner()
                 result = runner.invoke(
                     cli.cli,
-                    ["device", "assign", "Kitchen", "Kitchen table left"],
+                    [
+                        "--output=json",
+                        "device",
+                        "assign",
+                        "Kitchen",
+                        "Kitchen table left",
+                    ],
                     catch_exceptions=False,
                 )
-                # print(result.output)
                 assert result.exit_code == 0
-                expected = (
-                    "Successfully assigned 'Kitchen' to 'Kitchen table left'\n"
+
+                assert assign.call_count == 1
+                data = json.loads(result.output)
+                assert len(data) == 1
+                assert data[0]['name'] == "Kitchen table left"
+                assert data[0]['area'] == "Kitchen"
+                assert data[0]['status'] == "assigned"
+
+
+def test_device_assign_match_reports_failures(
+    default_areas, default_devices
+) -> None:
+    """Test bulk device assign reports every device in one table."""
+    with mock.patch(
+        'homeassistant_cli.remote.get_devices', return_value=default_devices
+    ):
+        with mock.patch(
+            'homeassistant_cli.remote.get_areas', return_value=default_areas
+        ):
+            with mock.patch(
+                'homeassistant_cli.remote.assign_areas',
+                return_value=[
+                    {'success': True},
+                    {'success': False, 'error': {'message': 'not found'}},
+                ],
+            ) as assign:
+
+                runner = CliRunner()
+                result = runner.invoke(
+                    cli.cli,
+                    [
+                        "--output=table",
+                        "--columns=NAME=name,STATUS=status,MESSAGE=message",
+                        "device",
+                        "assign",
+                        "Kitchen",
+                        "--match",
+                        "table",
+                        "--window",
+                        "5",
+                    ],
+                    catch_exceptions=False,
                 )
-                assert result.output == expected
+                assert result.exit_code == 0
+
+                assert assign.call_args[0][3] == 5
+                lines = result.output.splitlines()
+                assert "Failed to assign 'Kitchen'" in lines[0]
+                assert lines[-2].startswith("Kitchen table left")
+                assert lines[-2].split()[-1] == "assigned"
+                assert lines[-1].endswith("failed    not found")
@@ -0,0 +1,142 @@
+"""Tests for listing entities joined with their devices and areas."""
+import json
+from typing import Any, Dict, List
+
+from click.testing import CliRunner
+import pytest
+
+import homeassistant_cli.cli as cli
+
+AREAS = [
+    {'area_id': 'kitchen', 'name': 'Kitchen'},
+    {'area_id': 'hall', 'name': 'Hall'},
+]
+DEVICES = [
+    {'id': 'bulb', 'name': 'Bulb', 'manufacturer': 'Signify', 'area_id': None},
+    {'id': 'plug', 'name': 'Plug', 'manufacturer': 'IKEA', 'area_id': 'hall'},
+]
+ENTITIES = [
+    {
+        'entity_id': 'light.bulb',
+        'platform': 'hue',
+        'device_id': 'bulb',
+        'area_id': 'kitchen',
+    },
+    {
+        'entity_id': 'switch.plug',
+        'platform': 'zha',
+        'device_id': 'plug',
+        'area_id': None,
+    },
+    {
+        'entity_id': 'sensor.plug_power',
+        'platform': 'zha',
+        'device_id': 'plug',
+        'area_id': 'kitchen',
+    },
+    {
+        'entity_id': 'sun.sun',
+        'platform': 'sun',
+        'device_id': None,
+        'area_id': None,
+    },
+]
+REGISTRIES = {
+    'config/area_registry/list': AREAS,
+    'config/device_registry/list': DEVICES,
+    'config/entity_registry/list': ENTITIES,
+}
+
+
+@pytest.fixture(name='registries')
+def registries_fixture(ws_server):
+    """Return a server sending the registries."""
+
+    def responder(frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {
+                'id': frame['id'],
+                'type': 'result',
+                'success': True,
+                'result': REGISTRIES[frame['type']],
+            }
+        ]
+
+    ws_server.responder = responder
+    return ws_server
+
+
+def _list(server, *args: str) -> List[Dict[str, Any]]:
+    result = CliRunner(mix_stderr=False).invoke(
+        cli.cli,
+        ['--server', server.url, '-o', 'json', 'entity', 'list'] + list(args),
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+    return json.loads(result.stdout)
+
+
+def test_entity_list_joins_areas(registries) -> None:
+    """Test entities get the area of their own or else of their device."""
+    entities = _list(registries)
+
+    assert registries.connections == 1
+    assert sorted(frame['type'] for frame in registries.frames) == sorted(
+        REGISTRIES
+    )
+    assert [entity.get('area_name') for entity in entities] == [
+        'Kitchen',
+        'Hall',
+        'Kitchen',
+        None,
+    ]
+
+
+@pytest.mark.parametrize(
+    'args,expected',
+    [
+        (['--area', 'Kitchen'], ['light.bulb', 'sensor.plug_power']),
+        (['--area', 'hall'], ['switch.plug']),
+        (
+            ['--device-manufacturer', 'IKEA'],
+            ['switch.plug', 'sensor.plug_power'],
+        ),
+        (['--platform', 'zha', '--area', 'Kitchen'], ['sensor.plug_power']),
+        (['--device-manufacturer', 'Sig', 'light'], ['light.bulb']),
+    ],
+)
+def test_entity_list_filters(registries, args, expected) -> None:
+    """Test entities are filtered on the joined rows."""
+    entities = _list(registries, *args)
+
+    assert [entity['entity_id'] for entity in entities] == expected
+
+
+def test_entity_list_unknown_area(registries) -> None:
+    """Test an unknown area is an error."""
+    result = CliRunner().invoke(
+        cli.cli,
+        ['--server', registries.url, 'entity', 'list', '--area', 'Attic'],
+    )
+
+    assert result.exit_code == 1
+
+
+def test_entity_list_fetches_only_uncached(registries) -> None:
+    """Test registries in the cache are not fetched again."""
+    runner = CliRunner(mix_stderr=False)
+    args = ['--server', registries.url, '--cache', '-o', 'json']
+    runner.invoke(cli.cli, args + ['area', 'list'], catch_exceptions=False)
+    registries.frames.clear()
+
+    result = runner.invoke(
+        cli.cli,
+        args + ['entity', 'list', '--area', 'Kitchen'],
+        catch_exceptions=False,
+    )
+
+    assert len(json.loads(result.stdout)) == 2
+    assert sorted(frame['type'] for frame in registries.frames) == [
+        'config/device_registry/list',
+        'config/entity_registry/list',
+    ]
@@ -1,7 +1,14 @@
 """Tests for helper."""
+from datetime import timedelta
+import json
 from typing import List, Sized, cast  # noqa: F401
 
+import click
+import pytest
+
+import homeassistant_cli.const as const
 import homeassistant_cli.helper as helper
+import homeassistant_cli.yaml as yaml
 
 
 def test_to_attributes_multiples():
@@ -56,3 +63,247 @@ def test_sorting_by_jsonpath():
     assert result[1].get('id') == 'Trio'
     assert result[2].get('id') == 'Duo'
     assert result[3].get('id') == 'Uno'
+
+
+def test_split_entities():
+    """Test entities are split by domain and in chunks."""
+    entities = ['light.a', 'switch.a', 'light.b', 'light.c', 'light.d']
+
+    assert helper.split_entities(entities, 1) == [
+        ['light.a', 'light.b', 'light.c', 'light.d'],
+        ['switch.a'],
+    ]
+    assert helper.split_entities(entities, 3) == [
+        ['light.a', 'light.b'],
+        ['light.c', 'light.d'],
+        ['switch.a'],
+    ]
+
+
+def test_compile_path_matches_jsonpath():
+    """Test the dotted path fast path agrees with jsonpath."""
+    from jsonpath_ng import parse
+
+    samples = [
+        {'state': 'on', 'attributes': {'friendly_name': 'Lamp'}},
+        {'state': None, 'attributes': {'friendly_name': None}},
+        {'state': [1, 2], 'attributes': []},
+        {'attributes': {}},
+        'scalar',
+        [{'state': 'on'}],
+    ]
+    for expr in ['state', 'attributes.friendly_name', 'attributes']:
+        parsed = parse(expr)
+        for sample in samples:
+            expected = [match.value for match in parsed.find(sample)]
+            assert helper.compile_path(expr)(sample) == expected
+
+
+def test_compile_path_cached():
+    """Test expressions are compiled once."""
+    assert helper.compile_path('$.data') is helper.compile_path('$.data')
+    assert helper.compile_path('$.data')({'data': 1}) == [1]
+    assert helper.compile_path('domain.services[*]')(
+        {'domain': {'services': ['a', 'b']}}
+    ) == ['a', 'b']
+
+
+def _streamed(output, data, **kwargs) -> str:
+    """Return what raw_stream_output writes."""
+    parts = []  # type: List[str]
+    helper.raw_stream_output(
+        output, iter(data), yaml.yaml(), write=parts.append, **kwargs
+    )
+    return ''.join(parts)
+
+
+def test_stream_output_matches_format_output(basic_entities):
+    """Test streaming gives the same output as formatting at once."""
+    for data in (basic_entities, []):
+        for output in ('json', 'yaml', 'table'):
+            expected = helper.raw_format_output(
+                output, data, yaml.yaml(), const.COLUMNS_ENTITIES
+            )
+            streamed = _streamed(
+                output, data, columns=const.COLUMNS_ENTITIES
+            )
+            assert streamed == expected + "\n"
+
+
+def test_stream_output_ndjson(basic_entities):
+    """Test ndjson has one record per line."""
+    lines = _streamed('ndjson', basic_entities).splitlines()
+
+    assert [json.loads(line) for line in lines] == basic_entities
+
+
+def test_stream_output_large_table():
+    """Test tables larger than the sample keep the sampled widths."""
+    data = [{'id': 'x' * (i % 3), 'no': i} for i in range(7)]
+
+    lines = _streamed(
+        'table',
+        data,
+        columns=[('ID', 'id'), ('NO', 'no')],
+        sample_size=3,
+    ).splitlines()
+
+    assert lines[0].split() == ['ID', 'NO']
+    assert len(lines) == 8
+    assert len({len(line) for line in lines[1:]}) == 1
+    assert [line.split()[-1] for line in lines[1:]] == [
+        str(i) for i in range(7)
+    ]
+
+
+def test_stream_output_table_layout_by_size():
+    """Test tables are laid out alike whether written in chunks or not."""
+    data = [{'id': 'x' * (i % 3), 'no': i * 7} for i in range(7)]
+    columns = [('ID', 'id'), ('NO', 'no')]
+
+    for table_format in ('plain', 'simple', 'github', 'grid', 'psql'):
+        whole = _streamed(
+            'table', data, columns=columns, table_format=table_format
+        )
+        chunked = _streamed(
+            'table',
+            data,
+            columns=columns,
+            table_format=table_format,
+            sample_size=3,
+        )
+        expected = helper.raw_format_output(
+            'table', data, yaml.yaml(), columns, table_format=table_format
+        )
+        assert chunked == whole == expected + "\n"
+
+
+def test_to_timedelta() -> None:
+    """Test durations are parsed."""
+    assert helper.to_timedelta('30m') == timedelta(minutes=30)
+    assert helper.to_timedelta('6h') == timedelta(hours=6)
+    assert helper.to_timedelta('2 days') == timedelta(days=2)
+
+    with pytest.raises(click.BadParameter):
+        helper.to_timedelta('soon')
+
+
+def test_yaml_shared_and_ordered():
+    """Test the YAML parser is shared and dumping keeps the key order."""
+    assert yaml.yaml() is yaml.yaml()
+
+    dumped = yaml.dumpyaml(yaml.yaml(), {'b': 1, 'a': {'d': None, 'c': 'x'}})
+
+    assert dumped == "b: 1\na:\n    d:\n    c: x\n"
+    assert yaml.loadyaml(yaml.yaml(), dumped) == {
+        'b': 1,
+        'a': {'d': None, 'c': 'x'},
+    }
+
+
+def test_yaml_layout():
+    """Test YAML is written with the layout hass-cli always had."""
+    states = [
+        {
+            'entity_id': 'light.kitchen',
+            'state': 'on',
+            'attributes': {
+                'rgb_color': [255, 0, 0],
+                'effects': [{'name': 'colorloop', 'speed': 1.5}],
+                'effect': None,
+            },
+            'context': {'id': '01ABC', 'user_id': None},
+        }
+    ]
+
+    assert yaml.dumpyaml(yaml.yaml(), states) == (
+        "   -  entity_id: light.kitchen\n"
+        "      state: on\n"
+        "      attributes:\n"
+        "          rgb_color:\n"
+        "             -  255\n"
+        "             -  0\n"
+        "             -  0\n"
+        "          effects:\n"
+        "             -  name: colorloop\n"
+        "                speed: 1.5\n"
+        "          effect:\n"
+        "      context:\n"
+        "          id: 01ABC\n"
+        "          user_id:\n"
+    )
+
+
+def test_yaml_own_settings():
+    """Test a YAML instance given is dumped with its own settings."""
+    from ruamel.yaml import YAML
+
+    yamlp = YAML(typ='safe', pure=True)
+    yamlp.default_flow_style = True
+
+    assert yaml.dumpyaml(yamlp, {'a': [1, 2]}) == "{a: [1, 2]}\n"
+
+
+def test_yaml_documents():
+    """Test items are dumped as separate documents while they come."""
+    parts = []  # type: List[str]
+
+    class Writer:
+        encoding = None
+
+        def write(self, text):
+            parts.append(text)
+
+    def documents():
+        yield {'event_type': 'one'}
+        assert parts, "first document not written yet"
+        yield {'event_type': 'two'}
+
+    yaml.dumpyaml_all(documents(), Writer())
+
+    text = ''.join(parts)
+    assert text == "---\nevent_type: one\n---\nevent_type: two\n"
+    assert list(yaml.yaml().load_all(text)) == [
+        {'event_type': 'one'},
+        {'event_type': 'two'},
+    ]
+
+
+def test_required_fields():
+    """Test the fields needed for a table are worked out."""
+    columns = const.COLUMNS_ENTITIES + [('MEMBERS', 'attributes.entity_id')]
+
+    assert helper.required_fields(columns, 'last_updated', ['state']) == [
+        'entity_id',
+        'attributes.friendly_name',
+        'state',
+        'last_changed',
+        'attributes.entity_id',
+        'state',
+        'last_updated',
+    ]
+    assert helper.required_fields([('ATTR', 'attributes[*]')]) == [
+        'attributes'
+    ]
+    assert helper.required_fields([('ANY', '$..friendly_name')]) is None
+
+
+def test_projection():
+    """Test only the fields at the paths are kept."""
+    project = helper.projection(
+        ['entity_id', 'attributes.friendly_name', 'context', 'context.id']
+    )
+    state = {
+        'entity_id': 'light.a',
+        'state': 'on',
+        'attributes': {'friendly_name': 'A', 'supported': [1, 2]},
+        'context': {'id': 'x', 'user_id': None},
+    }
+
+    assert project(state) == {
+        'entity_id': 'light.a',
+        'attributes': {'friendly_name': 'A'},
+        'context': {'id': 'x', 'user_id': None},
+    }
+    assert project({'attributes': None}) == {'attributes': None}
+    assert state['attributes']['supported'] == [1, 2]
@@ -0,0 +1,44 @@
+"""Tests for the start up cost of Home Assistant CLI (hass-cli)."""
+import subprocess
+import sys
+from typing import List
+
+import pytest
+
+# Dependencies only some commands need, loaded on the code paths using them
+HEAVY = ['aiohttp', 'requests', 'ruamel', 'tabulate', 'zeroconf']
+
+
+def _imported(*modules: str) -> List[str]:
+    """Return the top-level modules loaded by importing modules."""
+    code = "\n".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # import time: self [us] | cumulative | imported package
+    return [
+        line.rsplit('|', 1)[1].strip().split('.')[0]
+        for line in result.stderr.splitlines()
+        if line.startswith('import time:') and '|' in line
+    ]
+
+
+@pytest.mark.parametrize(
+    "modules",
+    [
+        ['homeassistant_cli.cli'],
+        # what `hass-cli state get sun.sun -o json` loads up front
+        ['homeassistant_cli.cli', 'homeassistant_cli.plugins.state'],
+        ['homeassistant_cli.cli', 'homeassistant_cli.plugins.service'],
+        ['homeassistant_cli.cli', 'homeassistant_cli.plugins.entity'],
+    ],
+)
+def test_no_heavy_imports(modules) -> None:
+    """Test heavy dependencies are not loaded at start up."""
+    loaded = set(_imported(*modules))
+
+    assert 'homeassistant_cli' in loaded
+    assert not loaded.intersection(HEAVY)
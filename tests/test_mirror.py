@@ -0,0 +1,333 @@
+"""Tests for the local mirror of the states."""
+import json
+
+from click.testing import CliRunner
+import pytest
+import requests_mock
+
+import homeassistant_cli.cli as cli
+from homeassistant_cli.config import Configuration
+import homeassistant_cli.mirror as mirror
+import homeassistant_cli.remote as api
+
+COMPACT = {
+    's': 'on',
+    'a': {'friendly_name': 'Kitchen', 'brightness': 100},
+    'c': '01ABC',
+    'lc': 1700000000.5,
+}
+
+
+def _state(entity_id: str, state: str, updated: str = '') -> dict:
+    """Return a state as the REST API has it."""
+    return {
+        'entity_id': entity_id,
+        'state': state,
+        'attributes': {},
+        'last_changed': updated,
+        'last_updated': updated,
+    }
+
+
+def _changed(new_state: dict) -> dict:
+    """Return a state_changed event for a state."""
+    return {
+        'event_type': 'state_changed',
+        'data': {'entity_id': new_state['entity_id'], 'new_state': new_state},
+    }
+
+
+def test_decode_state() -> None:
+    """Test a compact state is turned into the REST API format."""
+    state = mirror.decode_state('light.kitchen', COMPACT)
+
+    assert state == {
+        'entity_id': 'light.kitchen',
+        'state': 'on',
+        'attributes': {'friendly_name': 'Kitchen', 'brightness': 100},
+        'last_changed': '2023-11-14T22:13:20.500000+00:00',
+        'last_updated': '2023-11-14T22:13:20.500000+00:00',
+        'context': {'id': '01ABC', 'parent_id': None, 'user_id': None},
+    }
+
+
+def test_apply_compact() -> None:
+    """Test compact additions, diffs and removals are applied."""
+    states = mirror.StateMirror('^light')
+    changes = states.apply(
+        {'a': {'light.kitchen': COMPACT, 'switch.fan': COMPACT}}
+    )
+    first = states.states['light.kitchen']
+
+    assert [entity_id for entity_id, _ in changes] == ['light.kitchen']
+
+    changes = states.apply(
+        {
+            'c': {
+                'light.kitchen': {
+                    '+': {'s': 'off', 'a': {'brightness': 0}, 'lu': 1.0},
+                    '-': {'a': ['friendly_name']},
+                },
+                'switch.fan': {'+': {'s': 'off'}},
+            }
+        }
+    )
+    state = states.states['light.kitchen']
+
+    assert changes == [('light.kitchen', state)]
+    assert state['state'] == 'off'
+    assert state['attributes'] == {'brightness': 0}
+    assert state['last_updated'] == '1970-01-01T00:00:01+00:00'
+    assert state['last_changed'] == first['last_changed']
+    # states handed out before are left alone
+    assert first['state'] == 'on'
+
+    assert states.apply({'r': ['light.kitchen', 'light.gone']}) == [
+        ('light.kitchen', None)
+    ]
+    assert not states.states
+
+
+def test_apply_event_keeps_newer_state() -> None:
+    """Test an older state from a snapshot does not win over an event."""
+    states = mirror.StateMirror()
+    states.apply(_changed(_state('sensor.a', '2', '2023-01-01T00:00:02')))
+
+    assert not states.apply(
+        _changed(_state('sensor.a', '1', '2023-01-01T00:00:01'))
+    )
+    assert states.states['sensor.a']['state'] == '2'
+    assert not states.apply({'event_type': 'call_service', 'data': {}})
+    assert states.apply(
+        {
+            'event_type': 'state_changed',
+            'data': {'entity_id': 'sensor.a', 'new_state': None},
+        }
+    ) == [('sensor.a', None)]
+
+
+def _ndjson(output: str) -> list:
+    """Return the JSON lines of the output."""
+    return [
+        json.loads(line)
+        for line in output.splitlines()
+        if line.startswith('{')
+    ]
+
+
+def test_state_list_watch(ws_server) -> None:
+    """Test the states are listed once, then only the changed ones."""
+
+    def responder(frame):
+        assert frame['type'] == 'subscribe_entities'
+        return [
+            {'id': frame['id'], 'type': 'result', 'success': True},
+            {
+                'id': frame['id'],
+                'type': 'event',
+                'event': {'a': {'light.a': COMPACT, 'switch.b': COMPACT}},
+            },
+            {
+                'id': frame['id'],
+                'type': 'event',
+                'event': {'c': {'switch.b': {'+': {'s': 'off'}}}},
+            },
+            {
+                'id': frame['id'],
+                'type': 'event',
+                'event': {'c': {'light.a': {'+': {'s': 'off'}}}},
+            },
+            None,
+        ]
+
+    ws_server.responder = responder
+
+    runner = CliRunner(mix_stderr=False)
+    result = runner.invoke(
+        cli.cli,
+        [
+            '--server',
+            ws_server.url,
+            '-o',
+            'ndjson',
+            'state',
+            'list',
+            '--watch',
+            'light',
+        ],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    assert [
+        (row['entity_id'], row['state']) for row in _ndjson(result.stdout)
+    ] == [('light.a', 'on'), ('light.a', 'off')]
+
+
+def test_state_list_watch_events(ws_server) -> None:
+    """Test servers without subscribe_entities are followed by events."""
+
+    def responder(frame):
+        if frame['type'] == 'subscribe_entities':
+            return [
+                {
+                    'id': frame['id'],
+                    'type': 'result',
+                    'success': False,
+                    'error': {
+                        'code': 'unknown_command',
+                        'message': 'Unknown command.',
+                    },
+                }
+            ]
+        # a change made while the snapshot is taken arrives first
+        return [
+            {'id': frame['id'], 'type': 'result', 'success': True},
+            {
+                'id': frame['id'],
+                'type': 'event',
+                'event': _changed(_state('light.a', 'off', '2023-01-02')),
+            },
+            None,
+        ]
+
+    ws_server.responder = responder
+    snapshot = json.dumps(
+        [_state('light.a', 'on', '2023-01-01'), _state('switch.b', 'on')]
+    )
+
+    with requests_mock.Mocker() as mock:
+        mock.get(ws_server.url + '/api/states', text=snapshot)
+
+        runner = CliRunner(mix_stderr=False)
+        result = runner.invoke(
+            cli.cli,
+            [
+                '--server',
+                ws_server.url,
+                '-o',
+                'ndjson',
+                'state',
+                'list',
+                '--watch',
+            ],
+            catch_exceptions=False,
+        )
+
+    assert result.exit_code == 0
+    assert [
+        (row['entity_id'], row['state']) for row in _ndjson(result.stdout)
+    ] == [('light.a', 'off'), ('switch.b', 'on')]
+    assert [f['type'] for f in ws_server.frames] == [
+        'subscribe_entities',
+        'subscribe_events',
+    ]
+
+
+def _unknown_command(frame):
+    """Refuse subscribe_entities like servers predating it."""
+    if frame['type'] == 'subscribe_entities':
+        return [
+            {
+                'id': frame['id'],
+                'type': 'result',
+                'success': False,
+                'error': {
+                    'code': 'unknown_command',
+                    'message': 'Unknown command.',
+                },
+            }
+        ]
+    return [{'id': frame['id'], 'type': 'result', 'success': True}]
+
+
+def _snapshot(frame):
+    """Answer subscribe_entities with the state of one light."""
+    if frame['type'] != 'subscribe_entities':
+        return [{'id': frame['id'], 'type': 'result', 'success': True}]
+    return [
+        {'id': frame['id'], 'type': 'result', 'success': True},
+        {
+            'id': frame['id'],
+            'type': 'event',
+            'event': {'a': {'light.a': COMPACT}},
+        },
+    ]
+
+
+def test_get_states_compact(ws_server) -> None:
+    """Test all states at once come from subscribe_entities by default."""
+    ws_server.responder = _snapshot
+    ctx = Configuration()
+    ctx.server = ws_server.url
+
+    # no REST API mocked, the states must come over the WebSocket
+    with requests_mock.Mocker():
+        states = api.get_states(ctx)
+    ctx.close()
+
+    assert states == [mirror.decode_state('light.a', COMPACT)]
+
+
+def test_state_list_compact(ws_server) -> None:
+    """Test states are listed from the snapshot of subscribe_entities."""
+    ws_server.responder = _snapshot
+
+    # no REST API mocked, the states must come over the WebSocket
+    with requests_mock.Mocker():
+        result = CliRunner(mix_stderr=False).invoke(
+            cli.cli,
+            [
+                '--server',
+                ws_server.url,
+                '--state-source',
+                'ws',
+                '-o',
+                'json',
+                'state',
+                'list',
+            ],
+            catch_exceptions=False,
+        )
+
+    assert result.exit_code == 0
+    states = json.loads(result.stdout)
+    assert states == [mirror.decode_state('light.a', COMPACT)]
+    assert [f['type'] for f in ws_server.frames] == [
+        'subscribe_entities',
+        'unsubscribe_events',
+    ]
+
+
+@pytest.mark.parametrize(
+    'source,exit_code', [('auto', 0), ('rest', 0), ('ws', 1)]
+)
+def test_state_list_sources(ws_server, source, exit_code) -> None:
+    """Test states come from REST if asked for or the WS API lacks them."""
+    ws_server.responder = _unknown_command
+
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            ws_server.url + '/api/states',
+            text=json.dumps([_state('light.a', 'on')]),
+        )
+        result = CliRunner(mix_stderr=False).invoke(
+            cli.cli,
+            [
+                '--server',
+                ws_server.url,
+                '--state-source',
+                source,
+                '-o',
+                'json',
+                'state',
+                'list',
+            ],
+        )
+
+    assert result.exit_code == exit_code
+    if exit_code == 0:
+        assert json.loads(result.stdout)[0]['entity_id'] == 'light.a'
+    if source != 'ws':
+        # listing streams the REST response unless asked for the WS API
+        assert ws_server.frames == []
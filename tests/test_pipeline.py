@@ -0,0 +1,238 @@
+"""Tests for the pipeline between receiving and writing messages."""
+import threading
+import time
+
+from click.testing import CliRunner
+import pytest
+
+import homeassistant_cli.cli as cli
+import homeassistant_cli.pipeline as pipeline
+
+
+class _Gate:
+    """Writer that blocks until opened, to fill up the queue."""
+
+    def __init__(self) -> None:
+        """Initialize the gate."""
+        self.opened = threading.Event()
+        self.written = []  # type: list
+
+    def write(self, text: str) -> None:
+        """Wait until opened, then record the text."""
+        self.opened.wait(5)
+        self.written.append(text)
+
+
+def _fill(overflow: str, count: int, **kwargs) -> pipeline.Pipeline:
+    """Put count items through a pipeline with a stuck writer."""
+    gate = _Gate()
+    events = pipeline.Pipeline(
+        str, gate.write, maxsize=3, overflow=overflow, batch_size=1, **kwargs
+    )
+    # the writer holds the first item while stuck
+    events.put('0')
+    while events.counters['queued']:
+        time.sleep(0.001)
+    for i in range(1, count):
+        events.put(str(i))
+    gate.opened.set()
+    events.close()
+    events.lines = gate.written  # type: ignore
+    return events
+
+
+def test_block_keeps_everything() -> None:
+    """Test the block policy loses nothing and keeps the order."""
+    written = []  # type: list
+    with pipeline.Pipeline(
+        str, written.append, maxsize=2, overflow=pipeline.BLOCK
+    ) as events:
+        for i in range(100):
+            events.put(i)
+
+    assert ''.join(written) == ''.join(map(str, range(100)))
+    assert events.counters['dropped'] == 0
+    assert events.counters['written'] == 100
+    assert events.counters['max_queued'] <= 2
+
+
+def test_drop_oldest() -> None:
+    """Test drop-oldest keeps the newest items."""
+    events = _fill(pipeline.DROP_OLDEST, 10)
+
+    assert events.lines == ['0', '7', '8', '9']  # type: ignore
+    assert events.counters['dropped'] == 6
+    assert events.counters['received'] == 10
+
+
+def test_default_never_blocks() -> None:
+    """Test a stuck writer does not hold up the producer by default."""
+    gate = _Gate()
+    events = pipeline.Pipeline(str, gate.write, maxsize=2)
+    for i in range(100):
+        events.put(str(i))
+    assert events.counters['dropped'] >= 97
+
+    gate.opened.set()
+    events.close()
+
+
+def test_sample() -> None:
+    """Test sample keeps every n-th item while the queue is full."""
+    events = _fill(pipeline.SAMPLE, 14, sample_every=5)
+
+    # 4 to 13 overflow, 8 and 13 are kept each replacing the oldest
+    assert events.lines == ['0', '3', '8', '13']  # type: ignore
+    assert events.counters['dropped'] == 10
+
+
+def test_writer_error_stops_producer() -> None:
+    """Test a failing writer surfaces in put and close."""
+
+    def fail(text: str) -> None:
+        raise OSError("broken pipe")
+
+    events = pipeline.Pipeline(str, fail)
+    events.put(1)
+    with pytest.raises(OSError):
+        for i in range(1000):
+            events.put(i)
+            events._writer.join(0.01)  # pylint: disable=protected-access
+    with pytest.raises(OSError):
+        events.close()
+
+
+def test_event_watch(ws_server) -> None:
+    """Test events are written as they arrive until the server hangs up."""
+
+    def responder(frame):
+        events = [
+            {
+                'id': frame['id'],
+                'type': 'event',
+                'event': {'event_type': 'test', 'data': {'no': i}},
+            }
+            for i in range(5)
+        ]
+        result = [{'id': frame['id'], 'type': 'result', 'success': True}]
+        return result + events + [None]
+
+    ws_server.responder = responder
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli.cli,
+        ['--server', ws_server.url, '-o', 'ndjson', 'event', 'watch'],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert [line for line in lines if line.startswith('{')] == [
+        '{"event_type": "test", "data": {"no": %d}}' % i for i in range(5)
+    ]
+
+
+def _changed(entity_id: str, state: str, old: str = 'x') -> dict:
+    """Return a state_changed event."""
+    return {
+        'event_type': 'state_changed',
+        'data': {
+            'entity_id': entity_id,
+            'old_state': {'state': old, 'attributes': {}},
+            'new_state': {'state': state, 'attributes': {}},
+        },
+    }
+
+
+def test_deduplicate() -> None:
+    """Test repeated states of an entity are dropped."""
+    seen = []  # type: list
+    stage = pipeline.Deduplicate(seen.append)
+    for entity_id, state in [
+        ('sensor.a', 'x'),  # same as the old state
+        ('sensor.a', '1'),
+        ('sensor.b', '1'),
+        ('sensor.a', '1'),
+        ('sensor.a', '2'),
+    ]:
+        stage.put(_changed(entity_id, state))
+    stage.put({'event_type': 'call_service'})
+
+    assert [e['data']['new_state']['state'] for e in seen[:-1]] == [
+        '1',
+        '1',
+        '2',
+    ]
+    assert stage.dropped == 2
+
+
+def test_rate_limit() -> None:
+    """Test events are limited per event type."""
+    now = [0.0]
+    seen = []  # type: list
+    stage = pipeline.RateLimit(seen.append, 2, clock=lambda: now[0])
+
+    for _ in range(5):
+        stage.put({'event_type': 'state_changed'})
+    stage.put({'event_type': 'call_service'})
+    now[0] = 1.0
+    stage.put({'event_type': 'state_changed'})
+
+    assert [e['event_type'] for e in seen] == [
+        'state_changed',
+        'state_changed',
+        'call_service',
+        'state_changed',
+    ]
+    assert stage.dropped == 3
+
+
+def test_rate_limit_below_one() -> None:
+    """Test rates below one per second let an event through now and then."""
+    seen = []  # type: list
+    now = [0.0]
+    stage = pipeline.RateLimit(seen.append, 0.5, clock=lambda: now[0])
+
+    for i in range(100):
+        now[0] = i * 0.1
+        stage.put({'event_type': 'state_changed'})
+
+    # one right away, then one every two seconds
+    assert len(seen) == 5
+    assert stage.dropped == 95
+
+
+def test_coalesce() -> None:
+    """Test only the latest state per entity is handed on."""
+    seen = []  # type: list
+    stage = pipeline.Coalesce(seen.append, 3600)
+    for i in range(10):
+        stage.put(_changed('sensor.power', str(i)))
+        stage.put(_changed('sensor.energy', str(i * 2)))
+    stage.put({'event_type': 'call_service'})
+
+    assert [e['event_type'] for e in seen] == ['call_service']
+
+    stage.close()
+
+    assert [
+        (e['data']['entity_id'], e['data']['new_state']['state'])
+        for e in seen[1:]
+    ] == [('sensor.power', '9'), ('sensor.energy', '18')]
+    assert stage.dropped == 18
+
+
+def test_build_stages_order() -> None:
+    """Test duplicates are dropped before the rate limit applies."""
+    seen = []  # type: list
+    stages = pipeline.build_stages(seen.append, dedupe=True, max_rate=1)
+
+    assert [type(s) for s in stages] == [
+        pipeline.Deduplicate,
+        pipeline.RateLimit,
+    ]
+    stages[0].put(_changed('sensor.a', 'x'))
+    stages[0].put(_changed('sensor.a', '1'))
+
+    assert len(seen) == 1
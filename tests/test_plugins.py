@@ -1,12 +1,17 @@
 """Tests file for Home Assistant CLI (hass-cli)."""
-
+import subprocess
+import sys
 from typing import List
+from unittest import mock
 
 import pytest
 
 from homeassistant_cli.cli import HomeAssistantCli, cli
+import homeassistant_cli.manifest as manifest
 
 DFEAULT_PLUGINS = [
+    'agent',
+    'batch',
     'completion',
     'config',
     'discover',
@@ -66,3 +71,50 @@ def test_commands_loads(plugin) -> None:
     cmd = hac.get_command(ctx, plugin)
 
     assert cmd
+
+
+def test_manifest_up_to_date() -> None:
+    """Test the shipped manifest matches the plugins."""
+    assert manifest.builtin() == manifest.generate()
+
+
+def test_help_does_not_import_plugins() -> None:
+    """Test help output is built without importing any plugin."""
+    code = (
+        "import sys\n"
+        "import homeassistant_cli.cli as cli\n"
+        "try:\n"
+        "    cli.cli.main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print([m for m in sys.modules if '.plugins.' in m])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert 'state' in result.stdout
+    assert result.stdout.splitlines()[-1] == '[]'
+
+
+def test_external_plugin() -> None:
+    """Test plugins registered through entry points are listed."""
+    hac = HomeAssistantCli()
+    ctx = cli.make_context('hass-cli', ['info'])
+    external = {
+        'extra': {
+            'module': 'homeassistant_cli.plugins.system',
+            'attr': 'cli',
+            'help': '',
+        },
+        # the shipped plugin wins over one of the same name
+        'state': {'module': 'nowhere', 'attr': 'cli', 'help': ''},
+    }
+
+    with mock.patch.object(manifest, 'external', return_value=external):
+        assert 'extra' in hac.list_commands(ctx)
+        assert hac.get_command(ctx, 'extra').name == 'system'
+        assert hac.get_command(ctx, 'state').name == 'state'
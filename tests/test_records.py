@@ -0,0 +1,103 @@
+"""Tests for the records of states and registry entries."""
+import json
+
+from homeassistant_cli.config import Shared
+import homeassistant_cli.mirror as mirror
+import homeassistant_cli.records as records
+import homeassistant_cli.remote as api
+
+STATE = {
+    'entity_id': 'light.kitchen',
+    'state': 'on',
+    'attributes': {'friendly_name': 'Kitchen', 'brightness': 180},
+    'last_changed': '2019-01-27T23:19:55.322474+00:00',
+    'last_updated': '2019-01-27T23:19:55.322474+00:00',
+    'context': {'id': 'abc', 'parent_id': None, 'user_id': None},
+}
+
+
+def test_state_round_trip() -> None:
+    """Test a state reads like the dictionary it was made from."""
+    state = records.State.from_dict(STATE)
+
+    assert state.as_dict() == STATE
+    assert dict(state) == STATE
+    assert state == STATE
+    assert state['attributes']['brightness'] == 180
+    assert state.get('missing', 'default') == 'default'
+    assert 'context' in state
+    assert state.domain == 'light'
+    assert len(state) == 6
+
+
+def test_state_keeps_unknown_keys() -> None:
+    """Test keys a record has no slot for are kept."""
+    data = dict(STATE, context={'id': 'abc'}, origin='LOCAL')
+    del data['last_updated']
+    state = records.State.from_dict(data)
+
+    assert state.as_dict() == data
+    assert 'last_updated' not in state
+
+
+def test_state_attributes_decoded_when_read() -> None:
+    """Test attributes stay text until read and are copies then."""
+    state = records.State.from_dict(STATE)
+
+    assert isinstance(state._attributes, str)
+    state.attributes['brightness'] = 0
+    assert state.attributes['brightness'] == 180
+
+
+def test_strings_interned() -> None:
+    """Test repeated strings are shared by the records."""
+    first = records.Entity.from_dict(
+        {'entity_id': 'light.a', 'platform': ''.join(['h', 'ue'])}
+    )
+    second = records.Entity.from_dict(
+        {'entity_id': 'light.b', 'platform': ''.join(['hu', 'e'])}
+    )
+    assert first.platform is second.platform
+
+    kitchen = records.State.from_dict(STATE)
+    hall = records.State.from_dict(dict(STATE, entity_id='light.hall'))
+    assert kitchen.domain is hall.domain
+    assert kitchen.last_changed is kitchen.last_updated
+
+
+def test_json_encoder_hook() -> None:
+    """Test records are written by the JSON encoder like dictionaries."""
+    device = {'id': 'd1', 'name': 'Lamp', 'manufacturer': 'Acme'}
+    text = json.dumps(
+        [records.State.from_dict(STATE), records.Device.from_dict(device)],
+        cls=api.JSONEncoder,
+    )
+
+    assert json.loads(text) == [STATE, device]
+
+
+def test_mirror_of_records() -> None:
+    """Test a mirror keeping records applies compact diffs."""
+    states = mirror.StateMirror(project=records.State.from_dict)
+    states.load([STATE])
+    states.apply_compact(
+        {'c': {'light.kitchen': {'+': {'s': 'off', 'a': {'brightness': 0}}}}}
+    )
+
+    state = states.states['light.kitchen']
+    assert isinstance(state, records.State)
+    assert state['state'] == 'off'
+    assert state.attributes == {'friendly_name': 'Kitchen', 'brightness': 0}
+
+
+def test_shared_registries_copied() -> None:
+    """Test remembered registries are handed out as fresh dictionaries."""
+    shared = Shared(remember=['areas'])
+    ctx = type('Ctx', (), {'server': 'http://localhost:8123'})()
+    areas = [{'area_id': 'kitchen', 'name': 'Kitchen'}]
+
+    assert shared.data('areas', ctx, lambda: areas) == areas
+    remembered = shared.data('areas', ctx, lambda: [])
+    assert remembered == areas
+    remembered[0]['area_name'] = 'changed'
+    assert shared.data('areas', ctx, lambda: []) == areas
@@ -0,0 +1,42 @@
+"""Tests for the indexed registries."""
+import homeassistant_cli.registry as registry
+
+DEVICES = [
+    {'id': 'd1', 'name': 'Lamp', 'area_id': 'kitchen'},
+    {'id': 'd2', 'name': 'Lamp', 'area_id': None},
+    {'id': 'Lamp', 'name': 'Odd', 'area_id': 'kitchen'},
+]
+
+
+def test_find_by_id_before_name() -> None:
+    """Test entries are found by id first, then by their first name."""
+    devices = registry.devices(DEVICES)
+
+    assert devices.find('d2')['id'] == 'd2'
+    assert devices.find('Lamp')['name'] == 'Odd'
+    assert devices.find('Odd')['id'] == 'Lamp'
+    assert devices.find('nothing') is None
+    assert devices.get(None) is None
+
+
+def test_lookup_by_field() -> None:
+    """Test entries are grouped by the value of any field."""
+    devices = registry.devices(DEVICES)
+
+    assert [d['id'] for d in devices.lookup('area_id', 'kitchen')] == [
+        'd1',
+        'Lamp',
+    ]
+    assert [d['id'] for d in devices.lookup('name', 'Lamp')] == ['d1', 'd2']
+    assert devices.lookup('area_id', 'garage') == []
+    assert len(devices) == 3
+    assert list(devices) == DEVICES
+
+
+def test_join_names(default_areas) -> None:
+    """Test names of areas are looked up by id."""
+    areas = registry.areas(default_areas)
+    area = default_areas[0]
+
+    assert areas.name(area['area_id']) == area['name']
+    assert areas.name('nosucharea') is None
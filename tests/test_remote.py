@@ -0,0 +1,346 @@
+"""Tests for the remote API helpers."""
+from datetime import datetime, timedelta, timezone
+import json
+from unittest.mock import patch
+
+import pytest
+import requests_mock
+
+from homeassistant_cli.config import Configuration
+from homeassistant_cli.exceptions import HomeAssistantCliError
+import homeassistant_cli.remote as api
+
+
+def _config(server: str, token: str = 'supersecret') -> Configuration:
+    """Return a configuration pointing at server."""
+    cfg = Configuration()
+    cfg.server = server
+    cfg.token = token
+    return cfg
+
+
+def test_wsapi_reuses_connection(ws_server) -> None:
+    """Test that consecutive calls share one authenticated connection."""
+    cfg = _config(ws_server.url)
+    try:
+        first = api.wsapi(cfg, {'type': 'config/area_registry/list'})
+        second = api.wsapi(cfg, {'type': 'config/device_registry/list'})
+    finally:
+        cfg.close()
+
+    assert first and first['success']
+    assert second and second['success']
+    assert ws_server.connections == 1
+    assert [f['id'] for f in ws_server.frames] == [1, 2]
+
+
+def test_wsapi_routes_results_by_id(ws_server) -> None:
+    """Test that out of order results reach the right caller."""
+    held = []
+
+    def responder(frame):
+        held.append(frame)
+        if len(held) < 2:
+            return []
+        # answer both requests in reverse order
+        return [
+            {'id': f['id'], 'type': 'result', 'success': True, 'result': f}
+            for f in reversed(held)
+        ]
+
+    ws_server.responder = responder
+    cfg = _config(ws_server.url)
+    client = api._wsclient(cfg)  # pylint: disable=protected-access
+
+    async def both():
+        import asyncio
+
+        return await asyncio.gather(
+            client.request({'type': 'first'}),
+            client.request({'type': 'second'}),
+        )
+
+    try:
+        first, second = client.run(both())
+    finally:
+        cfg.close()
+
+    assert first['result']['type'] == 'first'
+    assert second['result']['type'] == 'second'
+
+
+def test_wsapi_auth_invalid(ws_server) -> None:
+    """Test that invalid authentication raises an error."""
+    cfg = _config(ws_server.url, token='invalid')
+    try:
+        with pytest.raises(HomeAssistantCliError):
+            api.wsapi(cfg, {'type': 'config/area_registry/list'})
+    finally:
+        cfg.close()
+
+
+def test_restapi_reuses_session() -> None:
+    """Test that REST calls share the pooled session and its timeout."""
+    cfg = _config('http://localhost:8123')
+    cfg.timeout = 2
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            'http://localhost:8123/api/states/sun.sun',
+            json={'entity_id': 'sun.sun', 'state': 'above_horizon'},
+        )
+        mock.post(
+            'http://localhost:8123/api/states/sun.sun',
+            json={'entity_id': 'sun.sun', 'state': 'below_horizon'},
+        )
+
+        mock.get('http://localhost:8123/api/error_log', text='log')
+
+        api.get_state(cfg, 'sun.sun')
+        session = cfg.session
+        api.set_state(cfg, 'sun.sun', {'state': 'below_horizon'})
+        assert ''.join(api.iter_raw_error_log(cfg)) == 'log'
+
+        assert cfg.session is session
+        # streamed error logs may take long, other reads time out
+        assert [r.timeout for r in mock.request_history] == [
+            (2, 2),
+            (2, 2),
+            (2, None),
+        ]
+
+    adapter = session.get_adapter('http://localhost:8123')
+    assert adapter.max_retries.total == cfg.retries
+
+
+def test_wsapi_batch_window(ws_server) -> None:
+    """Test batched frames share a connection and keep their order."""
+    cfg = _config(ws_server.url)
+    try:
+        results = api.assign_entity_areas(
+            cfg, ['light.a', 'light.b', 'light.c'], 'kitchen', window=2
+        )
+    finally:
+        cfg.close()
+
+    assert ws_server.connections == 1
+    assert [r['id'] for r in results] == [1, 2, 3]
+    assert [f['entity_id'] for f in ws_server.frames] == [
+        'light.a',
+        'light.b',
+        'light.c',
+    ]
+
+
+def test_iter_json_array_split_chunks() -> None:
+    """Test elements are parsed across arbitrary chunk boundaries."""
+    doc = json.dumps(
+        [{'entity_id': 'sensor.ü', 'state': '12'}, 1234, "a]b", [1, 2], None]
+    )
+    for size in (1, 2, 3, 7, len(doc)):
+        chunks = [doc[i : i + size] for i in range(0, len(doc), size)]
+        assert list(api.iter_json_array(chunks)) == json.loads(doc)
+
+
+def test_iter_json_array_depth() -> None:
+    """Test nested arrays are flattened with a depth of two."""
+    chunks = ['[[{"a": 1}, {"a"', ': 2}], [], [{"a": 3}]]']
+    assert list(api.iter_json_array(chunks, depth=2)) == [
+        {'a': 1},
+        {'a': 2},
+        {'a': 3},
+    ]
+
+
+def test_iter_json_array_truncated() -> None:
+    """Test a truncated document raises an error."""
+    with pytest.raises(ValueError):
+        list(api.iter_json_array(['[{"a": 1}, {"a"']))
+
+
+def test_iter_states_streams() -> None:
+    """Test states are streamed from the response."""
+    cfg = _config('http://localhost:8123')
+    states = [{'entity_id': f'sensor.s{i}', 'state': i} for i in range(50)]
+    with requests_mock.Mocker() as mock:
+        mock.get('http://localhost:8123/api/states', json=states)
+
+        result = api.iter_states(cfg)
+        assert next(result) == states[0]
+        assert list(result) == states[1:]
+
+
+def test_iter_states_projected() -> None:
+    """Test states are cut down to the fields asked for."""
+    cfg = _config('http://localhost:8123')
+    states = [
+        {
+            'entity_id': 'weather.home',
+            'state': 'sunny',
+            'attributes': {'friendly_name': 'Home', 'forecast': [{}] * 100},
+        }
+    ]
+    with requests_mock.Mocker() as mock:
+        mock.get('http://localhost:8123/api/states', json=states)
+
+        result = list(
+            api.iter_states(cfg, ['entity_id', 'attributes.friendly_name'])
+        )
+
+    assert result == [
+        {'entity_id': 'weather.home', 'attributes': {'friendly_name': 'Home'}}
+    ]
+
+
+def test_iter_history_rows() -> None:
+    """Test history rows of all entities are yielded one at a time."""
+    cfg = _config('http://localhost:8123')
+    history = [
+        [{'entity_id': 'sun.sun', 'state': 'below_horizon'}],
+        [
+            {'entity_id': 'light.a', 'state': 'on'},
+            {'entity_id': 'light.a', 'state': 'off'},
+        ],
+    ]
+    with requests_mock.Mocker() as mock:
+        mock.get('http://localhost:8123/api/history/period', json=history)
+
+        assert list(api.iter_history(cfg)) == history[0] + history[1]
+
+
+def test_iter_states_connection_lost() -> None:
+    """Test errors while downloading are raised as our own errors."""
+    import requests
+
+    def iter_content(*_args):
+        yield b'[{"entity_id": "sun.sun"}, '
+        raise requests.exceptions.ConnectionError('Read timed out.')
+
+    cfg = _config('http://localhost:8123')
+    with requests_mock.Mocker() as mocked, patch.object(
+        requests.Response, 'iter_content', iter_content
+    ):
+        mocked.get('http://localhost:8123/api/states', text='[]')
+
+        result = api.iter_states(cfg)
+        assert next(result) == {'entity_id': 'sun.sun'}
+        with pytest.raises(HomeAssistantCliError, match='Read timed out'):
+            next(result)
+
+
+def test_history_slices() -> None:
+    """Test a period is split in slices per group of entities."""
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    end = start + timedelta(hours=5)
+    slices = api.history_slices(
+        ['a.a', 'b.b', 'c.c'], start, end, timedelta(hours=2), 2
+    )
+
+    assert [(s[0], s[1].hour, s[2].hour) for s in slices] == [
+        (['a.a', 'b.b'], 0, 2),
+        (['a.a', 'b.b'], 2, 4),
+        (['a.a', 'b.b'], 4, 5),
+        (['c.c'], 0, 2),
+        (['c.c'], 2, 4),
+        (['c.c'], 4, 5),
+    ]
+
+
+def test_history_sliced_merge_and_retry() -> None:
+    """Test slices are merged in order and a failing slice is retried."""
+    cfg = _config('http://localhost:8123')
+    cfg.retries = 1
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    first = [
+        [
+            {'entity_id': 'b.b', 'last_changed': '2020-01-01T00:10:00+00:00'},
+            {'entity_id': 'b.b', 'last_changed': '2020-01-01T00:50:00+00:00'},
+        ],
+        [{'entity_id': 'a.a', 'last_changed': '2020-01-01T00:20:00+00:00'}],
+    ]
+    second = [
+        [
+            # carried over from the first slice
+            {'entity_id': 'b.b', 'last_changed': '2020-01-01T00:50:00+00:00'},
+            {'entity_id': 'b.b', 'last_changed': '2020-01-01T01:30:00+00:00'},
+        ]
+    ]
+    slices = api.history_slices(
+        ['a.a', 'b.b'], start, start + timedelta(hours=2), timedelta(hours=1)
+    )
+    seen = []
+
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            'http://localhost:8123/api/history/period/'
+            '2020-01-01T00:00:00+00:00',
+            json=first,
+        )
+        later = mock.get(
+            'http://localhost:8123/api/history/period/'
+            '2020-01-01T01:00:00+00:00',
+            [{'status_code': 500, 'text': 'boom'}, {'json': second}],
+        )
+
+        rows = list(
+            api.get_history_sliced(
+                cfg, slices, 2, lambda *args: seen.append(args[:2])
+            )
+        )
+
+    assert later.call_count == 2
+    assert [(r['entity_id'], r['last_changed'][11:16]) for r in rows] == [
+        ('a.a', '00:20'),
+        ('b.b', '00:10'),
+        ('b.b', '00:50'),
+        ('b.b', '01:30'),
+    ]
+    assert sorted(seen) == [(1, 2), (2, 2)]
+
+
+def test_history_sliced_carried_state() -> None:
+    """Test carried over states are kept once, attribute changes all."""
+    cfg = _config('http://localhost:8123')
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    slices = api.history_slices(
+        ['climate.a'], start, start + timedelta(hours=3), timedelta(hours=1)
+    )
+
+    def row(changed: str, updated: str, target: int) -> dict:
+        return {
+            'entity_id': 'climate.a',
+            'state': 'heat',
+            'attributes': {'temperature': target},
+            'last_changed': f'2020-01-01T{changed}:00+00:00',
+            'last_updated': f'2020-01-01T{updated}:00+00:00',
+        }
+
+    with requests_mock.Mocker() as mock:
+        base = 'http://localhost:8123/api/history/period/2020-01-01T'
+        mock.get(
+            base + '00:00:00+00:00',
+            json=[[row('00:00', '00:00', 20), row('00:00', '00:30', 21)]],
+        )
+        # Home Assistant stamps the state at the start with its start
+        for hour in ('01', '02'):
+            mock.get(
+                f'{base}{hour}:00:00+00:00',
+                json=[[row(f'{hour}:00', f'{hour}:00', 21)]],
+            )
+
+        rows = list(api.get_history_sliced(cfg, slices))
+
+    assert [r['attributes']['temperature'] for r in rows] == [20, 21]
+
+
+def test_history_sliced_failure() -> None:
+    """Test slices failing every attempt are reported."""
+    cfg = _config('http://localhost:8123')
+    cfg.retries = 0
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    slices = api.history_slices(['a.a'], start, start + timedelta(hours=1))
+
+    with requests_mock.Mocker() as mock:
+        mock.get(requests_mock.ANY, status_code=500, text='boom')
+
+        with pytest.raises(HomeAssistantCliError, match='1 of 1 slices'):
+            list(api.get_history_sliced(cfg, slices))
@@ -242,6 +242,42 @@ def test_state_toggle(basic_entities_text, basic_entities) -> None:
         assert isinstance(data[0], dict)
 
 
+def test_state_toggle_parallel() -> None:
+    """Test toggle fans out one call per domain and merges the result."""
+    with requests_mock.Mocker() as mock:
+        post = mock.post(
+            "http://localhost:8123/api/services/homeassistant/toggle",
+            [
+                {'text': LIST_EDITED_ENTITY, 'status_code': 200},
+                {'text': LIST_EDITED_ENTITY, 'status_code': 200},
+            ],
+        )
+
+        runner = CliRunner()
+        result = runner.invoke(
+            cli.cli,
+            [
+                "--output=json",
+                "state",
+                "toggle",
+                "--parallel=2",
+                "light.one",
+                "switch.one",
+                "light.two",
+            ],
+            catch_exceptions=False,
+        )
+
+        assert result.exit_code == 0
+        assert post.call_count == 2
+
+        groups = sorted(r.json()['entity_id'] for r in post.request_history)
+        assert groups == [['light.one', 'light.two'], ['switch.one']]
+
+        data = json.loads(result.output)
+        assert len(data) == 2
+
+
 def test_state_filter(default_entities) -> None:
     """Test entities can be listed with filter."""
     with requests_mock.Mocker() as mock:
@@ -294,3 +330,65 @@ def test_state_filter(default_entities) -> None:
 #         )
 #         assert result.exit_code == 0
 #         # TODO: actually have history result testing
+
+
+def test_state_history_verbose() -> None:
+    """Test history rows are streamed and counted per entity."""
+    history = [
+        [{"entity_id": "sun.sun", "state": "below_horizon"}],
+        [
+            {"entity_id": "light.a", "state": "on"},
+            {"entity_id": "light.a", "state": "off"},
+        ],
+    ]
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            requests_mock.ANY,
+            json=history,
+            status_code=200,
+        )
+
+        runner = CliRunner()
+        result = runner.invoke(
+            cli.cli,
+            ["-v", "--output=ndjson", "state", "history", "sun.sun"],
+            catch_exceptions=False,
+        )
+        assert result.exit_code == 0
+
+        lines = result.output.splitlines()
+        rows = [json.loads(line) for line in lines if line.startswith('{')]
+        assert rows == history[0] + history[1]
+        assert 'History with 3 rows from 2 entities found.' in lines
+
+
+def test_state_list_where(basic_entities_text) -> None:
+    """Test states can be filtered by an expression."""
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            "http://localhost:8123/api/states",
+            text=basic_entities_text,
+            status_code=200,
+        )
+
+        runner = CliRunner()
+        result = runner.invoke(
+            cli.cli,
+            [
+                "--output=json",
+                "state",
+                "list",
+                "--where",
+                "attributes.event_data > 1000 and state == off",
+            ],
+            catch_exceptions=False,
+        )
+        assert result.exit_code == 0
+        data = json.loads(result.output)
+        assert [state['entity_id'] for state in data] == ['sensor.two']
+
+        result = runner.invoke(
+            cli.cli, ["state", "list", "--where", "state >"]
+        )
+        assert result.exit_code == 2
+        assert "--where" in result.output
@@ -0,0 +1,112 @@
+"""Tests for the filter expressions of --where."""
+from datetime import datetime, timedelta, timezone
+
+import click
+import pytest
+
+from homeassistant_cli.where import compile_where
+
+NOW = datetime.now(timezone.utc)
+STATES = [
+    {
+        'entity_id': 'sensor.outside',
+        'state': '31.5',
+        'attributes': {'unit_of_measurement': '°C'},
+        'last_changed': NOW.isoformat(),
+    },
+    {
+        'entity_id': 'sensor.remote_battery',
+        'state': 'unavailable',
+        'attributes': {'battery_level': 10},
+        'last_changed': (NOW - timedelta(days=2)).isoformat(),
+    },
+    {
+        'entity_id': 'light.kitchen_ceiling',
+        'state': 'on',
+        'attributes': {},
+        'last_changed': (NOW - timedelta(hours=3)).isoformat(),
+    },
+    {
+        'entity_id': 'group.all_lights',
+        'state': 'off',
+        'attributes': {'entity_id': ['light.kitchen_ceiling'], 'hidden': True},
+        'last_changed': '2020-01-01T00:00:00+00:00',
+    },
+]
+
+
+def _matching(expression: str):
+    test = compile_where(expression)
+    return [state['entity_id'] for state in STATES if test(state)]
+
+
+@pytest.mark.parametrize(
+    'expression,expected',
+    [
+        ('domain == sensor and state > 30', ['sensor.outside']),
+        ('state > 30 or state < 0', ['sensor.outside']),
+        ('state != 31.5', []),
+        (
+            'state != on',
+            ['sensor.outside', 'sensor.remote_battery', 'group.all_lights'],
+        ),
+        ('attributes.battery_level < 15', ['sensor.remote_battery']),
+        ('state in (unavailable, unknown)', ['sensor.remote_battery']),
+        (
+            'domain in (light, group)',
+            ['light.kitchen_ceiling', 'group.all_lights'],
+        ),
+        ("entity_id ~ '*.kitchen_*'", ['light.kitchen_ceiling']),
+        (
+            'entity_id !~ sensor.*',
+            ['light.kitchen_ceiling', 'group.all_lights'],
+        ),
+        ('entity_id =~ battery$', ['sensor.remote_battery']),
+        ('attributes.entity_id ~ light.*', ['group.all_lights']),
+        ('attributes.hidden == true', ['group.all_lights']),
+        ('attributes.unit_of_measurement', ['sensor.outside']),
+        ('last_changed > 1h ago', ['sensor.outside']),
+        (
+            'last_changed < 1d ago and last_changed > 2019-12-31',
+            ['sensor.remote_battery', 'group.all_lights'],
+        ),
+        ('not (domain == sensor or state == off)', ['light.kitchen_ceiling']),
+    ],
+)
+def test_where(expression, expected) -> None:
+    """Test expressions select the expected states."""
+    assert _matching(expression) == expected
+
+
+@pytest.mark.parametrize(
+    'expression',
+    [
+        'state >',
+        'state == on and',
+        '(state == on',
+        'last_changed > 5',
+        'state < true',
+        'entity_id =~ "("',
+        'state == on )',
+    ],
+)
+def test_where_invalid(expression) -> None:
+    """Test invalid expressions are reported."""
+    with pytest.raises(click.BadParameter):
+        compile_where(expression)
+
+
+def test_where_runs_cheap_tests_first() -> None:
+    """Test attributes are not looked up for states of other domains."""
+    looked_up = []
+
+    class Attributes(dict):
+        def __contains__(self, key):
+            looked_up.append(key)
+            return super().__contains__(key)
+
+    test = compile_where('attributes.battery_level < 15 and domain == light')
+    state = dict(STATES[1], attributes=Attributes(battery_level=10))
+
+    assert not test(state)
+    assert looked_up == []